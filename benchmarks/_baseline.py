@@ -0,0 +1,61 @@
+"""Leitura, gravação e comparação dos baselines em `benchmarks/baselines/`."""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+
+def save_baseline(path: str, results: Dict[str, float], params: Optional[Dict[str, Any]] = None) -> None:
+    """Grava os resultados com a máquina e os parâmetros usados (para reproduzir a medição)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    data = {
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        "params": params or {},
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, indent=2, ensure_ascii=False)
+        fh.write("\n")
+
+
+def load_baseline(path: str) -> Dict[str, float]:
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)["results"]
+
+
+def regressions(
+    results: Dict[str, float],
+    baseline: Dict[str, float],
+    tolerance: float,
+    higher_is_better: Iterable[str] = (),
+) -> List[str]:
+    """
+    Métricas piores que o baseline além de `tolerance` (1.3 = 30% de folga). Por
+    padrão menor é melhor (tempo); as de `higher_is_better` (vazão) são invertidas.
+    """
+    higher = set(higher_is_better)
+    out = []
+    for name, value in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        worse = base / value > tolerance if name in higher else value / base > tolerance
+        if worse:
+            out.append(f"{name}: {value:.2f} (baseline {base:.2f})")
+    return out
+
+
+def report_and_exit(failed: List[str]) -> None:
+    if failed:
+        print("\nRegressões acima da tolerância:", file=sys.stderr)
+        for line in failed:
+            print(f"  - {line}", file=sys.stderr)
+        sys.exit(1)
+    print("\nSem regressões em relação ao baseline.")
@@ -0,0 +1,112 @@
+"""
+Servidor falso do Ollama (`/api/chat` e `/api/tags`) para benchmarks sem GPU.
+
+    python -m benchmarks.fake_ollama --port 11500 --latency-ms 400 --jitter 0.5 --failure-rate 0.02
+
+A latência de cada geração segue uma lognormal com mediana `--latency-ms` e desvio
+`--jitter` (0 = fixa). `--failure-rate` devolve 500 nessa fração das chamadas e
+`--eval-tokens` controla o `eval_count` reportado e o número de fragmentos no modo
+streaming. Responde lotes do micro-batching (`N incidentes:`) com `{"resultados": [...]}`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import re
+from dataclasses import dataclass
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+INCIDENT = {
+    "data_ocorrencia": "2025-08-12 14:00",
+    "local": "São Paulo (SP)",
+    "tipo_incidente": "Falha no servidor",
+    "impacto": "Sistema de faturamento indisponível por 2 horas",
+}
+_BATCH_RE = re.compile(r"^(\d+) incidentes:")
+
+
+@dataclass
+class FakeOllamaConfig:
+    latency_ms: float = 300.0
+    jitter: float = 0.3
+    failure_rate: float = 0.0
+    eval_tokens: int = 60
+    prompt_tokens: int = 350
+    seed: int | None = None
+
+
+def create_app(config: FakeOllamaConfig) -> FastAPI:
+    app = FastAPI(title="fake-ollama")
+    rng = random.Random(config.seed)
+
+    def latency() -> float:
+        base = config.latency_ms / 1000.0
+        return base * rng.lognormvariate(0.0, config.jitter) if config.jitter > 0 else base
+
+    def content_for(body: dict) -> str:
+        user = next((m["content"] for m in body.get("messages", []) if m.get("role") == "user"), "")
+        batch = _BATCH_RE.match(user)
+        if batch:
+            return json.dumps({"resultados": [INCIDENT] * int(batch.group(1))}, ensure_ascii=False)
+        return json.dumps(INCIDENT, ensure_ascii=False)
+
+    def usage(duration: float) -> dict:
+        return {
+            "done": True,
+            "prompt_eval_count": config.prompt_tokens,
+            "eval_count": config.eval_tokens,
+            "eval_duration": int(duration * 0.8e9),
+            "prompt_eval_duration": int(duration * 0.2e9),
+        }
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": "fake"}]}
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        duration = latency()
+        if rng.random() < config.failure_rate:
+            await asyncio.sleep(duration / 2)
+            return JSONResponse({"error": "falha simulada"}, status_code=500)
+        content = content_for(body)
+
+        if not body.get("stream"):
+            await asyncio.sleep(duration)
+            return {"model": body.get("model"), "message": {"role": "assistant", "content": content}, **usage(duration)}
+
+        pieces = max(1, min(config.eval_tokens, len(content)))
+        step = -(-len(content) // pieces)
+
+        async def chunks():
+            for i in range(0, len(content), step):
+                await asyncio.sleep(duration / pieces)
+                msg = {"message": {"role": "assistant", "content": content[i:i + step]}, "done": False}
+                yield json.dumps(msg, ensure_ascii=False) + "\n"
+            yield json.dumps({"message": {"role": "assistant", "content": ""}, **usage(duration)}) + "\n"
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Ollama falso para benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--eval-tokens", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    cfg = FakeOllamaConfig(args.latency_ms, args.jitter, args.failure_rate, args.eval_tokens, seed=args.seed)
+    uvicorn.run(create_app(cfg), host=args.host, port=args.port, log_level="warning")
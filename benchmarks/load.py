@@ -0,0 +1,167 @@
+"""
+Gerador de carga para o `/extract`, com vazão e latência p50/p95/p99.
+
+    # API já rodando (ex.: apontada para um Ollama real ou para o fake)
+    python -m benchmarks.load --url http://localhost:8000 --concurrency 32 --requests 2000
+
+    # Sobe o Ollama falso e a API em subprocessos, mede e compara com baselines/load.json
+    python -m benchmarks.load --self-hosted --latency-ms 300
+
+Por padrão cada requisição recebe um sufixo único para não cair no cache de
+extrações; use `--allow-cache` para medir o caminho com cache.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import math
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+import httpx
+
+from ._baseline import BASELINE_DIR, load_baseline, regressions, report_and_exit, save_baseline
+
+TEXTOS = [
+    "Ontem às 14h, no escritório de São Paulo, houve uma falha no servidor principal que afetou o sistema de faturamento por 2 horas.",
+    "Hoje às 09:30 houve queda de energia em Recife que deixou o call center sem atendimento.",
+    "Anteontem ocorreu um ataque DDoS contra o portal em Curitiba que impactou o login de clientes.",
+    "Em 12/08/2024 às 22h houve vazamento de água na sala de servidores de Porto Alegre.",
+]
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Percentil `q` (0 a 1) pelo método nearest-rank sobre uma lista já ordenada."""
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(q * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+async def run_load(url: str, total: int, concurrency: int, unique: bool, timeout: float) -> Dict[str, float]:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+
+        async def worker() -> None:
+            for i in counter:
+                texto = TEXTOS[i % len(TEXTOS)]
+                if unique:
+                    texto = f"{texto} Registro {i}."
+                start = time.perf_counter()
+                try:
+                    r = await client.post("/extract", json={"texto": texto})
+                    statuses[r.status_code] += 1
+                except httpx.HTTPError as exc:
+                    statuses[type(exc).__name__] += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ok = statuses.get(200, 0)
+    print(f"requisições: {total}  concorrência: {concurrency}  duração: {elapsed:.2f}s")
+    print(f"status: {dict(statuses)}")
+    results = {
+        "throughput_rps": round(ok / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "error_rate": round(1 - ok / total, 4) if total else 0.0,
+    }
+    for name, value in results.items():
+        print(f"{name:>15}: {value}")
+    return results
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, path: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Processo terminou antes de responder em {url}{path}")
+        try:
+            if httpx.get(f"{url}{path}", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timeout aguardando {url}{path}")
+
+
+@contextmanager
+def self_hosted(args: argparse.Namespace) -> Iterator[str]:
+    """Sobe o Ollama falso e a API (uvicorn) em subprocessos e devolve a URL da API."""
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    api_url = f"http://127.0.0.1:{args.api_port}"
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_ollama", "--port", str(args.fake_port),
+         "--latency-ms", str(args.latency_ms), "--jitter", str(args.jitter),
+         "--failure-rate", str(args.failure_rate), "--seed", "42"],
+    )
+    env = dict(os.environ, OLLAMA_HOST=fake_url, LOG_LEVEL="WARNING")
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(args.api_port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        _wait_ready(fake_url, fake, "/api/tags")
+        _wait_ready(api_url, api, "/healthz")
+        yield api_url
+    finally:
+        for proc in (api, fake):
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga no /extract com p50/p95/p99")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--allow-cache", action="store_true")
+    parser.add_argument("--self-hosted", action="store_true")
+    parser.add_argument("--fake-port", type=int, default=11500)
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--baseline", default=os.path.join(BASELINE_DIR, "load.json"))
+    parser.add_argument("--tolerance", type=float, default=1.3)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    def measure(url: str) -> Dict[str, float]:
+        return asyncio.run(run_load(url, args.requests, args.concurrency, not args.allow_cache, args.timeout))
+
+    if args.self_hosted:
+        with self_hosted(args) as api_url:
+            results = measure(api_url)
+    else:
+        results = measure(args.url)
+
+    if args.update_baseline:
+        params = {k: getattr(args, k) for k in ("requests", "concurrency", "self_hosted", "latency_ms", "jitter", "failure_rate")}
+        save_baseline(args.baseline, results, params)
+        print(f"\nBaseline gravado em {args.baseline}")
+    elif os.path.exists(args.baseline):
+        base = load_baseline(args.baseline)
+        # error_rate parte de zero: comparada à parte, sem razão.
+        failed = regressions(
+            {k: v for k, v in results.items() if k != "error_rate"}, base, args.tolerance, {"throughput_rps"}
+        )
+        if results["error_rate"] > base.get("error_rate", 0.0) + 0.01:
+            failed.append(f"error_rate: {results['error_rate']} (baseline {base.get('error_rate', 0.0)})")
+        report_and_exit(failed)
@@ -0,0 +1,81 @@
+"""
+Micro-benchmarks das funções do caminho quente (sem rede nem LLM).
+
+    python -m benchmarks.micro                      # compara com baselines/micro.json
+    python -m benchmarks.micro --update-baseline    # grava novo baseline
+
+Resultados em microssegundos por chamada (melhor de `--repeat` rodadas). Sai com
+código 1 se alguma função ficar mais lenta que o baseline além de `--tolerance`.
+Baselines dependem da máquina: regrave-os ao trocar o runner de CI.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import timeit
+from typing import Callable, Dict
+
+from src.extractors import _parse_datetime_cached, fallback_extract, parse_datetime_pt
+from src.localities import detect_localidade
+from src.preprocess import preprocess_text
+from src.schema import validate_incident_payload
+
+from ._baseline import BASELINE_DIR, load_baseline, regressions, report_and_exit, save_baseline
+
+REF = "2024-08-10T10:00:00-03:00"
+TEXTO = (
+    "Ontem às 14h, no escritório de São Paulo, houve uma falha no servidor principal que "
+    "afetou o sistema de faturamento por 2 horas."
+)
+TEXTO_RUIDOSO = "  Ontem   às 14 h ,no escritório de  São Paulo ,houve  falha 14 : 30 no servidor .  "
+PAYLOAD = {
+    "data_ocorrencia": "2024-08-09 14:00",
+    "local": "São Paulo (SP)",
+    "tipo_incidente": "Falha no servidor",
+    "impacto": "Sistema de faturamento indisponível por 2 horas",
+}
+
+
+def _parse_datetime_cold() -> None:
+    _parse_datetime_cached.cache_clear()
+    parse_datetime_pt("ontem às 14h", REF)
+
+
+CASES: Dict[str, Callable[[], object]] = {
+    "preprocess_text": lambda: preprocess_text(TEXTO_RUIDOSO),
+    "fallback_extract": lambda: fallback_extract(TEXTO, REF),
+    "detect_localidade": lambda: detect_localidade(TEXTO),
+    "parse_datetime_pt_cold": _parse_datetime_cold,
+    "parse_datetime_pt_warm": lambda: parse_datetime_pt("ontem às 14h", REF),
+    "parse_datetime_pt_dateparser": lambda: (_parse_datetime_cached.cache_clear(), parse_datetime_pt("semana passada", REF)),
+    "validate_incident_payload": lambda: validate_incident_payload(PAYLOAD),
+}
+
+
+def run(repeat: int) -> Dict[str, float]:
+    results = {}
+    for name, func in CASES.items():
+        func()  # aquecimento (imports tardios, caches de regex)
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=repeat, number=number)) / number
+        results[name] = round(best * 1e6, 3)
+        print(f"{name:>30}: {results[name]:10.2f} µs")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks do caminho quente")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=os.path.join(BASELINE_DIR, "micro.json"))
+    parser.add_argument("--tolerance", type=float, default=1.3)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    if args.update_baseline:
+        save_baseline(args.baseline, results)
+        print(f"\nBaseline gravado em {args.baseline}")
+    elif os.path.exists(args.baseline):
+        report_and_exit(regressions(results, load_baseline(args.baseline), args.tolerance))
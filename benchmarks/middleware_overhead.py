@@ -0,0 +1,87 @@
+"""
+Compara o custo por requisição do middleware de métricas antigo (`@app.middleware("http")`,
+isto é, `BaseHTTPMiddleware`) com o `MetricsMiddleware` ASGI puro.
+
+    python -m benchmarks.middleware_overhead --requests 5000
+
+Cada variante atende o mesmo endpoint trivial via `httpx.ASGITransport` (sem rede);
+a diferença para a variante sem middleware é o overhead de cada um.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import time
+
+import httpx
+from prometheus_client import CollectorRegistry, Counter, Histogram
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from src.middleware import MetricsMiddleware
+
+# Réplica do middleware anterior, com métricas num registry separado.
+_registry = CollectorRegistry()
+_COUNT = Counter("legacy_requests_total", "", labelnames=("method", "path", "status"), registry=_registry)
+_LATENCY = Histogram("legacy_request_duration_seconds", "", labelnames=("method", "path"), registry=_registry)
+_logger = logging.getLogger("incidente_llm_api")
+
+
+async def legacy_metrics_and_logging(request, call_next):
+    start = time.perf_counter()
+    path = request.url.path
+    method = request.method
+    response = await call_next(request)
+    duration = time.perf_counter() - start
+    _COUNT.labels(method, path, str(response.status_code)).inc()
+    _LATENCY.labels(method, path).observe(duration)
+    _logger.info(
+        "request_completed",
+        extra={"path": path, "method": method, "status": response.status_code, "duration_ms": duration * 1000},
+    )
+    return response
+
+
+async def _endpoint(request):
+    return JSONResponse({"ok": True})
+
+
+def build_app(variant: str) -> Starlette:
+    app = Starlette(routes=[Route("/items/{item_id}", _endpoint)])
+    if variant == "base_http":
+        app.add_middleware(BaseHTTPMiddleware, dispatch=legacy_metrics_and_logging)
+    elif variant == "pure_asgi":
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def measure(variant: str, requests: int) -> float:
+    """Microssegundos por requisição (média)."""
+    transport = httpx.ASGITransport(app=build_app(variant))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(200):  # aquecimento
+            await client.get(f"/items/{i}")
+        start = time.perf_counter()
+        for i in range(requests):
+            await client.get(f"/items/{i}")
+        return (time.perf_counter() - start) / requests * 1e6
+
+
+async def main(requests: int) -> None:
+    results = {v: await measure(v, requests) for v in ("none", "base_http", "pure_asgi")}
+    for variant, us in results.items():
+        overhead = us - results["none"]
+        print(f"{variant:>10}: {us:8.1f} µs/req  (overhead {overhead:+7.1f} µs)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    # Mede o custo das métricas/instrumentação, não do stdout.
+    _logger.setLevel(logging.WARNING)
+    asyncio.run(main(args.requests))
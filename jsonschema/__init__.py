@@ -13,7 +13,9 @@ __all__ = ["ValidationError", "Draft202012Validator"]
 
 
 class ValidationError(Exception):
-    pass
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
 
 
 class Draft202012Validator:
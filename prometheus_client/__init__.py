@@ -1,32 +1,448 @@
-"""Implementação local mínima do cliente Prometheus para uso em ambiente offline."""
+"""
+Implementação local e enxuta do subset do cliente Prometheus usado pelo projeto,
+para rodar os testes sem a dependência instalada. Segue a API pública do
+`prometheus-client` (Counter, Gauge, Histogram, CollectorRegistry,
+`generate_latest` e `multiprocess`), que é o pacote usado em produção.
+
+Atualizações são protegidas por um lock por série, então podem vir de threads
+do pool de regras. Com `PROMETHEUS_MULTIPROC_DIR` definido antes do import, como
+no pacote oficial, cada processo grava seus valores em arquivos próprios nesse
+diretório a cada atualização, e `multiprocess.MultiProcessCollector` os agrega.
+"""
 
 from __future__ import annotations
 
+import atexit
+import bisect
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+__all__ = [
+    "CONTENT_TYPE_LATEST",
+    "REGISTRY",
+    "CollectorRegistry",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "generate_latest",
+]
+
 CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
 
+INF = float("inf")
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0, INF)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Sample(NamedTuple):
+    name: str
+    labels: Labels
+    value: float
+
+
+class Metric(NamedTuple):
+    """Família de métricas já coletada, pronta para exposição."""
+
+    name: str
+    documentation: str
+    type: str
+    samples: List[Sample]
+
+
+def _fmt(value: float) -> str:
+    if value == INF:
+        return "+Inf"
+    if value == -INF:
+        return "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if float(value).is_integer():
+        return f"{value:.1f}"
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _escape_help(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+class CollectorRegistry:
+    """Registro de coletores: métricas ou qualquer objeto com `collect()`."""
+
+    def __init__(self) -> None:
+        self._collectors: List[object] = []
+        self._names: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, collector) -> None:
+        with self._lock:
+            name = getattr(collector, "name", None)
+            if name is not None:
+                if name in self._names:
+                    raise ValueError(f"Métrica duplicada: {name}")
+                self._names[name] = collector
+            self._collectors.append(collector)
+
+    def unregister(self, collector) -> None:
+        with self._lock:
+            self._collectors.remove(collector)
+            self._names.pop(getattr(collector, "name", None), None)
+
+    def collect(self) -> List[Metric]:
+        with self._lock:
+            collectors = list(self._collectors)
+        families: List[Metric] = []
+        for collector in collectors:
+            families.extend(collector.collect())
+        return families
+
+
+REGISTRY = CollectorRegistry()
+
+# Modo multiprocesso: lido no import, como no pacote oficial.
+_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR", "")
+# Todas as métricas do processo (inclusive fora de registros), para os arquivos por pid.
+_ALL_METRICS: List["_Metric"] = []
+_all_lock = threading.Lock()
+
+
+class _Child:
+    __slots__ = ("_lock",)
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+
+
+class _ValueChild(_Child):
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.value = 0.0
+
+    def reset(self) -> None:
+        self.value = 0.0
+
+
+class _CounterChild(_ValueChild):
+    __slots__ = ()
+
+    def inc(self, amount: float = 1.0) -> None:
+        if amount < 0:
+            raise ValueError("Counter só pode ser incrementado")
+        with self._lock:
+            self.value += amount
+        _changed()
+
+
+class _GaugeChild(_ValueChild):
+    __slots__ = ()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+        _changed()
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+        _changed()
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = float(value)
+        _changed()
+
+
+class _HistogramChild(_Child):
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        super().__init__()
+        self.bounds = bounds
+        self.reset()
+
+    def reset(self) -> None:
+        self.counts = [0.0] * len(self.bounds)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        # Contagem por faixa (não cumulativa); acumulada só na exposição.
+        idx = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.sum += value
+        _changed()
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        registry: Optional[CollectorRegistry] = REGISTRY,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], _Child] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        if registry is not None:
+            registry.register(self)
+        with _all_lock:
+            _ALL_METRICS.append(self)
+
+    def _new_child(self) -> _Child:
+        raise NotImplementedError
+
+    def labels(self, *values: object, **kwvalues: object):
+        if kwvalues:
+            values = tuple(kwvalues[name] for name in self.labelnames)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: esperava rótulos {self.labelnames}")
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name}: métrica com rótulos requer .labels()")
+        return self._children[()]
+
+    def _items(self) -> List[Tuple[Tuple[str, ...], _Child]]:
+        with self._lock:
+            return list(self._children.items())
+
+    def _labels(self, key: Sequence[str]) -> Labels:
+        return _labels_from(self.labelnames, key)
+
+    def _reset(self) -> None:
+        for _, child in self._items():
+            with child._lock:
+                child.reset()
+
+    def _state(self) -> Dict[str, object]:
+        """Valores e metadados serializáveis, para o arquivo do processo."""
+        raise NotImplementedError
+
+    def collect(self) -> List[Metric]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        # Como no pacote oficial: a amostra sempre termina em `_total`.
+        name = name[:-6] if name.endswith("_total") else name
+        super().__init__(name + "_total", documentation, labelnames, registry)
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def _state(self):
+        return {
+            "type": self.type_name, "help": self.documentation, "labelnames": list(self.labelnames),
+            "values": [[list(k), c.value] for k, c in self._items()],
+        }
+
+    def collect(self):
+        samples = [Sample(self.name, self._labels(k), c.value) for k, c in self._items()]
+        return [Metric(self.name, self.documentation, self.type_name, samples)]
+
+
+class Gauge(_Metric):
+    """
+    `multiprocess_mode` (só no modo multiprocesso): "all"/"liveall" (um valor por
+    pid), "sum"/"livesum", "max"/"livemax" ou "min"/"livemin". Os modos "live*"
+    descartam os valores de processos marcados com `mark_process_dead`.
+    """
+
+    type_name = "gauge"
+    _MODES = ("all", "liveall", "sum", "livesum", "max", "livemax", "min", "livemin")
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY, multiprocess_mode: str = "all"):
+        if multiprocess_mode not in self._MODES:
+            raise ValueError(f"multiprocess_mode inválido: {multiprocess_mode}")
+        self.multiprocess_mode = multiprocess_mode
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default().dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+    def _state(self):
+        return {
+            "type": self.type_name, "help": self.documentation, "labelnames": list(self.labelnames),
+            "mode": self.multiprocess_mode, "values": [[list(k), c.value] for k, c in self._items()],
+        }
+
+    def collect(self):
+        samples = [Sample(self.name, self._labels(k), c.value) for k, c in self._items()]
+        return [Metric(self.name, self.documentation, self.type_name, samples)]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        bounds = sorted(float(b) for b in buckets)
+        if not bounds or bounds[-1] != INF:
+            bounds.append(INF)
+        self.buckets = tuple(bounds)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def _state(self):
+        values = []
+        for key, child in self._items():
+            with child._lock:
+                values.append([list(key), {"counts": list(child.counts), "sum": child.sum}])
+        return {
+            "type": self.type_name, "help": self.documentation, "labelnames": list(self.labelnames),
+            "buckets": list(self.buckets), "values": values,
+        }
+
+    def collect(self):
+        samples: List[Sample] = []
+        for key, child in sorted(self._items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            samples.extend(histogram_samples(self.name, self._labels(key), self.buckets, counts, total))
+        return [Metric(self.name, self.documentation, self.type_name, samples)]
+
+
+def _labels_from(names: Sequence[str], key: Sequence[str]) -> Labels:
+    return tuple(zip(names, key))
+
+
+def histogram_samples(name: str, labels: Labels, buckets, counts, total) -> List[Sample]:
+    out: List[Sample] = []
+    cumulative = 0.0
+    for bound, count in zip(buckets, counts):
+        cumulative += count
+        out.append(Sample(name + "_bucket", labels + (("le", _fmt(bound)),), cumulative))
+    out.append(Sample(name + "_count", labels, cumulative))
+    out.append(Sample(name + "_sum", labels, total))
+    return out
+
+
+# -- modo multiprocesso ------------------------------------------------------
+#
+# As atualizações só mexem na memória e marcam o processo como "sujo". O arquivo
+# do processo é regravado por uma thread a cada `_FLUSH_INTERVAL` segundos, na
+# coleta (para o próprio processo) e na saída. O pacote oficial grava cada série
+# num arquivo mmap; aqui o custo de I/O sai do caminho quente da mesma forma.
+
+_FLUSH_INTERVAL = 1.0
+_write_lock = threading.Lock()
+_dirty = False
+_flusher_pid = 0
+_stopped = False
+
+
+def _changed() -> None:
+    global _dirty
+    if _MULTIPROC_DIR:
+        _dirty = True
+        if _flusher_pid != os.getpid():
+            _start_flusher()
+
+
+def _start_flusher() -> None:
+    global _flusher_pid
+    with _write_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name="prometheus-multiproc-flush", daemon=True).start()
+
+
+def _flush_loop() -> None:
+    while not _stopped:
+        time.sleep(_FLUSH_INTERVAL)
+        _flush()
 
-class _BaseMetric:
-    def __init__(self, *args, **kwargs):
-        pass
 
-    def labels(self, *args, **kwargs):
-        return self
+def _flush() -> None:
+    """Grava o arquivo deste processo se houve atualização desde a última gravação."""
+    global _dirty
+    if not _MULTIPROC_DIR:
+        return
+    from .multiprocess import write_process_file
 
-    def inc(self, amount: float = 1.0):
-        return self
+    with _write_lock:
+        if _stopped or not _dirty:
+            return
+        _dirty = False
+        write_process_file(_MULTIPROC_DIR, [(m.name, m._state()) for m in list(_ALL_METRICS)])
 
-    def observe(self, value: float):
-        return self
 
+def _stop_writing() -> None:
+    """Última gravação do processo; depois dela o arquivo não é mais tocado."""
+    global _stopped
+    _flush()
+    with _write_lock:
+        _stopped = True
 
-class Counter(_BaseMetric):
-    pass
 
+def _after_fork() -> None:
+    # Como no pacote oficial, cada worker começa do zero no seu próprio arquivo.
+    # A thread de gravação não sobrevive ao fork e o lock pode ter ficado preso.
+    global _write_lock, _dirty, _flusher_pid
+    _write_lock = threading.Lock()
+    _dirty = False
+    _flusher_pid = 0
+    for metric in list(_ALL_METRICS):
+        metric._reset()
 
-class Histogram(_BaseMetric):
-    pass
 
+if _MULTIPROC_DIR:
+    atexit.register(_flush)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_after_fork)
 
-def generate_latest():
-    return b""
 
+def generate_latest(registry: CollectorRegistry = REGISTRY) -> bytes:
+    lines: List[str] = []
+    for family in registry.collect():
+        lines.append(f"# HELP {family.name} {_escape_help(family.documentation)}")
+        lines.append(f"# TYPE {family.name} {family.type}")
+        for name, labels, value in family.samples:
+            if labels:
+                rendered = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels)
+                lines.append(f"{name}{{{rendered}}} {_fmt(value)}")
+            else:
+                lines.append(f"{name} {_fmt(value)}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
@@ -0,0 +1,133 @@
+"""
+Agregação entre processos, com a API de `prometheus_client.multiprocess`:
+`MultiProcessCollector(registry, path=None)` e `mark_process_dead(pid, path=None)`.
+
+Cada processo mantém um arquivo `metrics_<pid>.json` no diretório, regravado
+periodicamente, na coleta e na saída (o pacote oficial usa arquivos mmap, também
+por pid).
+"""
+
+from __future__ import annotations
+
+import glob
+import json
+import os
+from typing import Dict, List, Tuple
+
+from . import Metric, Sample, _flush, _labels_from, _stop_writing, histogram_samples
+
+_PREFIX = "metrics_"
+
+
+def _path_for(directory: str, pid: int) -> str:
+    return os.path.join(directory, f"{_PREFIX}{pid}.json")
+
+
+def _resolve(path) -> str:
+    path = path or os.environ.get("PROMETHEUS_MULTIPROC_DIR", "")
+    if not path or not os.path.isdir(path):
+        raise ValueError(f"env PROMETHEUS_MULTIPROC_DIR não aponta para um diretório: {path!r}")
+    return path
+
+
+def write_process_file(directory: str, states: List[Tuple[str, Dict[str, object]]], pid: int = 0) -> None:
+    path = _path_for(directory, pid or os.getpid())
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(dict(states), fh)
+    os.replace(tmp, path)
+
+
+def _read_files(directory: str) -> List[Tuple[int, Dict[str, Dict[str, object]]]]:
+    out = []
+    for path in glob.glob(os.path.join(directory, f"{_PREFIX}*.json")):
+        try:
+            pid = int(os.path.basename(path)[len(_PREFIX):-len(".json")])
+            with open(path, encoding="utf-8") as fh:
+                out.append((pid, json.load(fh)))
+        except (OSError, ValueError):
+            continue
+    return sorted(out, key=lambda item: item[0])
+
+
+def mark_process_dead(pid: int, path=None) -> None:
+    """
+    Chamado quando um worker termina: descarta os gauges "live*" dele. Contadores
+    e histogramas continuam somados, para não regredirem no Prometheus.
+    """
+    directory = _resolve(path)
+    if pid == os.getpid():
+        # O próprio processo encerrando: grava o estado final e para de regravar.
+        _stop_writing()
+    file_path = _path_for(directory, pid)
+    try:
+        with open(file_path, encoding="utf-8") as fh:
+            states = json.load(fh)
+    except (OSError, ValueError):
+        return
+    kept = [
+        (name, state) for name, state in states.items()
+        if not (state["type"] == "gauge" and str(state.get("mode", "")).startswith("live"))
+    ]
+    write_process_file(directory, kept, pid)
+
+
+class MultiProcessCollector:
+    """Soma os valores gravados por todos os processos no diretório multiprocesso."""
+
+    def __init__(self, registry=None, path=None) -> None:
+        self._path = _resolve(path)
+        if registry is not None:
+            registry.register(self)
+
+    def collect(self) -> List[Metric]:
+        # Os demais processos podem estar até `_FLUSH_INTERVAL` atrasados; este, não.
+        _flush()
+        merged: Dict[str, Dict[str, object]] = {}
+        for pid, states in _read_files(self._path):
+            for name, state in states.items():
+                family = merged.setdefault(name, {"state": state, "values": {}})
+                if family["state"]["type"] != state["type"]:
+                    continue
+                self._merge(family, state, pid)
+        families = []
+        for name, family in sorted(merged.items()):
+            state = family["state"]
+            labelnames = state["labelnames"]
+            samples: List[Sample] = []
+            for key, value in sorted(family["values"].items()):
+                labels = _labels_from(labelnames, key[0]) + key[1]
+                if state["type"] == "histogram":
+                    samples.extend(histogram_samples(name, labels, state["buckets"], value["counts"], value["sum"]))
+                else:
+                    samples.append(Sample(name, labels, value))
+            families.append(Metric(name, state["help"], state["type"], samples))
+        return families
+
+    @staticmethod
+    def _merge(family: Dict[str, object], state: Dict[str, object], pid: int) -> None:
+        values = family["values"]
+        mode = str(state.get("mode", "")).replace("live", "")
+        for key, value in state["values"]:
+            if state["type"] == "histogram":
+                if len(value["counts"]) != len(family["state"]["buckets"]):
+                    continue  # arquivo de uma versão com outros buckets
+                k = (tuple(key), ())
+                acc = values.get(k)
+                if acc is None:
+                    values[k] = {"counts": list(value["counts"]), "sum": value["sum"]}
+                else:
+                    acc["counts"] = [a + b for a, b in zip(acc["counts"], value["counts"])]
+                    acc["sum"] += value["sum"]
+            elif state["type"] == "gauge" and mode == "all":
+                values[(tuple(key), (("pid", str(pid)),))] = value
+            else:
+                k = (tuple(key), ())
+                if k not in values:
+                    values[k] = value
+                elif mode == "max":
+                    values[k] = max(values[k], value)
+                elif mode == "min":
+                    values[k] = min(values[k], value)
+                else:
+                    values[k] += value
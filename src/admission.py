@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from prometheus_client import Counter, Gauge
+
+from .settings import LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT_MS
+
+LLM_ACTIVE = Gauge(
+    "incidente_llm_api_llm_active",
+    "Chamadas ao LLM com vaga de execução",
+)
+LLM_QUEUE_DEPTH = Gauge(
+    "incidente_llm_api_llm_queue_depth",
+    "Requisições aguardando vaga para chamar o LLM",
+)
+LLM_SHED = Counter(
+    "incidente_llm_api_llm_shed_total",
+    "Requisições que não obtiveram vaga no LLM a tempo",
+    labelnames=("reason",),
+)
+
+
+class Overloaded(Exception):
+    """Não havia vaga no LLM dentro do prazo da requisição."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Limita as chamadas simultâneas ao LLM e o tamanho da fila de espera. Quem não
+    consegue vaga antes do próprio prazo (ou encontra a fila cheia) recebe
+    `Overloaded`, para ser atendido pelas regras ou rejeitado com 503.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.active = 0
+        self.waiting = 0
+
+    def _shed(self, reason: str) -> Overloaded:
+        LLM_SHED.labels(reason).inc()
+        return Overloaded(reason)
+
+    @asynccontextmanager
+    async def slot(self, deadline: Optional[float] = None, patient: bool = False) -> AsyncIterator[None]:
+        """
+        `deadline` é um instante de `time.monotonic()` até o qual a vaga serve.
+        `patient=True` (trabalho de fundo) espera o quanto for preciso e fora do
+        limite da fila, que fica reservada às requisições interativas.
+        """
+        if patient:
+            await self._semaphore.acquire()
+        else:
+            await self._acquire(deadline)
+
+        self.active += 1
+        LLM_ACTIVE.set(self.active)
+        try:
+            yield
+        finally:
+            self.active -= 1
+            LLM_ACTIVE.set(self.active)
+            self._semaphore.release()
+
+    async def _acquire(self, deadline: Optional[float]) -> None:
+        timeout = self.queue_timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            raise self._shed("deadline")
+
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                raise self._shed("queue_full")
+            self.waiting += 1
+            LLM_QUEUE_DEPTH.set(self.waiting)
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout)
+            except asyncio.TimeoutError:
+                raise self._shed("deadline") from None
+            finally:
+                self.waiting -= 1
+                LLM_QUEUE_DEPTH.set(self.waiting)
+        else:
+            await self._semaphore.acquire()
+
+
+_controller: AdmissionController | None = None
+_controller_loop: asyncio.AbstractEventLoop | None = None
+
+
+def configure_admission_controller(
+    max_concurrency: int, max_queue: int, queue_timeout: float
+) -> AdmissionController:
+    """Instala um controlador com outros limites no event loop atual (ex.: a CLI, sem descarte)."""
+    global _controller, _controller_loop
+    _controller = AdmissionController(max_concurrency, max_queue, queue_timeout)
+    _controller_loop = asyncio.get_running_loop()
+    return _controller
+
+
+def get_admission_controller() -> AdmissionController | None:
+    """Controlador do event loop atual; None se LLM_MAX_CONCURRENCY <= 0 (sem limite)."""
+    global _controller, _controller_loop
+    loop = asyncio.get_running_loop()
+    if _controller is not None and _controller_loop is loop:
+        return _controller
+    if LLM_MAX_CONCURRENCY <= 0:
+        return None
+    _controller = AdmissionController(LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT_MS / 1000.0)
+    _controller_loop = loop
+    return _controller
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+import httpx
+from prometheus_client import Counter, Gauge, Histogram
+
+from .settings import (
+    OLLAMA_BACKENDS,
+    OLLAMA_HOST,
+    OLLAMA_MODEL,
+    OLLAMA_BACKEND_EJECT_AFTER,
+    OLLAMA_HEALTH_INTERVAL,
+    LLM_LATENCY_WINDOW,
+)
+from .latency import LatencyTracker
+
+logger = logging.getLogger("incidente_llm_api")
+
+BACKEND_INFLIGHT = Gauge(
+    "incidente_llm_api_backend_inflight",
+    "Requisições em andamento por backend do Ollama",
+    labelnames=("backend",),
+)
+BACKEND_LATENCY = Histogram(
+    "incidente_llm_api_backend_latency_seconds",
+    "Latência das chamadas por backend do Ollama",
+    labelnames=("backend",),
+)
+BACKEND_REQUESTS = Counter(
+    "incidente_llm_api_backend_requests_total",
+    "Chamadas por backend do Ollama e resultado",
+    labelnames=("backend", "outcome"),
+)
+BACKEND_HEALTHY = Gauge(
+    "incidente_llm_api_backend_healthy",
+    "1 se o backend do Ollama está recebendo tráfego, 0 se foi ejetado",
+    labelnames=("backend",),
+)
+
+
+@dataclass
+class Backend:
+    url: str
+    model: str
+    weight: float = 1.0
+    inflight: int = 0
+    healthy: bool = True
+    consecutive_failures: int = 0
+
+    @property
+    def key(self) -> str:
+        return f"{self.url}|{self.model}"
+
+    def load(self) -> float:
+        """Carga relativa: requisições em andamento (incluindo a próxima) por peso."""
+        return (self.inflight + 1) / self.weight
+
+
+def parse_backends(spec: str, default_host: str, default_model: str) -> List[Backend]:
+    """
+    Lê a lista de backends no formato `url[;model=...][;weight=...]`, separados por
+    vírgula. Ex.: `http://gpu1:11434;weight=2,http://cpu1:11434;model=llama3.2:1b`.
+    Vazio: um único backend em `default_host`.
+    """
+    backends: List[Backend] = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        url, *opts = [part.strip() for part in item.split(";")]
+        backend = Backend(url=url.rstrip("/"), model=default_model)
+        for opt in opts:
+            key, _, value = opt.partition("=")
+            if key == "model" and value:
+                backend.model = value
+            elif key == "weight" and value:
+                backend.weight = max(float(value), 0.001)
+        backends.append(backend)
+    return backends or [Backend(url=default_host.rstrip("/"), model=default_model)]
+
+
+class BackendPool:
+    """
+    Distribui chamadas entre backends do Ollama pelo menor número de requisições em
+    andamento (ponderado por `weight`). Backends com falhas consecutivas são
+    ejetados e voltam quando a sondagem periódica de saúde responder.
+    """
+
+    def __init__(self, backends: Iterable[Backend], eject_after: int = 3, latency_window: int = 200):
+        self.backends = list(backends)
+        self.eject_after = max(1, eject_after)
+        # Latências de chamadas concluídas (e estouros de timeout), por backend/modelo.
+        self.latency = LatencyTracker(latency_window)
+        self._health_task: Optional[asyncio.Task] = None
+        for backend in self.backends:
+            BACKEND_HEALTHY.labels(backend.url).set(1)
+
+    def choose(self, exclude: Iterable[Backend] = ()) -> Optional[Backend]:
+        excluded = {id(b) for b in exclude}
+        candidates = [b for b in self.backends if id(b) not in excluded]
+        healthy = [b for b in candidates if b.healthy]
+        # Todos ejetados: melhor tentar do que desistir (o circuit breaker cuida da queda total).
+        pool = healthy or candidates
+        if not pool:
+            return None
+        return min(pool, key=Backend.load)
+
+    def acquire(self, backend: Backend) -> float:
+        backend.inflight += 1
+        BACKEND_INFLIGHT.labels(backend.url).set(backend.inflight)
+        return time.perf_counter()
+
+    def release(self, backend: Backend, started: float, ok: Optional[bool], track_latency: bool = True) -> None:
+        """
+        Encerra uma chamada; `ok=None` indica cancelamento (não afeta a saúde).
+        Com `track_latency=False` a duração não entra na janela usada pelo timeout
+        adaptativo e pelo hedging (ex.: gerações em lote, bem mais longas).
+        """
+        backend.inflight -= 1
+        BACKEND_INFLIGHT.labels(backend.url).set(backend.inflight)
+        if ok is None:
+            return
+        elapsed = time.perf_counter() - started
+        BACKEND_LATENCY.labels(backend.url).observe(elapsed)
+        if ok and track_latency:
+            self.latency.record(backend.key, elapsed)
+        BACKEND_REQUESTS.labels(backend.url, "success" if ok else "error").inc()
+        if ok:
+            backend.consecutive_failures = 0
+            self._set_healthy(backend, True)
+            return
+        backend.consecutive_failures += 1
+        if backend.consecutive_failures >= self.eject_after:
+            self._set_healthy(backend, False)
+
+    def _set_healthy(self, backend: Backend, healthy: bool) -> None:
+        if backend.healthy != healthy:
+            logger.warning(
+                "ollama_backend_health_changed", extra={"backend": backend.url, "healthy": healthy}
+            )
+        backend.healthy = healthy
+        BACKEND_HEALTHY.labels(backend.url).set(1 if healthy else 0)
+
+    async def probe(self, client: httpx.AsyncClient, backend: Backend) -> bool:
+        try:
+            r = await client.get(f"{backend.url}/api/tags", timeout=2.0)
+            ok = r.status_code == 200
+        except Exception:
+            ok = False
+        if ok:
+            backend.consecutive_failures = 0
+        self._set_healthy(backend, ok)
+        return ok
+
+    async def _health_loop(self, client_factory, interval: float) -> None:
+        while True:
+            await asyncio.gather(*(self.probe(client_factory(), b) for b in self.backends))
+            await asyncio.sleep(interval)
+
+    def start_health_checks(self, client_factory, interval: float = OLLAMA_HEALTH_INTERVAL) -> None:
+        # Com um único backend não há para onde desviar tráfego; o breaker basta.
+        if self._health_task is None and len(self.backends) > 1 and interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop(client_factory, interval))
+
+    async def stop_health_checks(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    def snapshot(self) -> List[dict]:
+        return [
+            {"url": b.url, "model": b.model, "weight": b.weight, "inflight": b.inflight, "healthy": b.healthy}
+            for b in self.backends
+        ]
+
+
+backend_pool = BackendPool(
+    parse_backends(OLLAMA_BACKENDS, OLLAMA_HOST, OLLAMA_MODEL),
+    eject_after=OLLAMA_BACKEND_EJECT_AFTER,
+    latency_window=LLM_LATENCY_WINDOW,
+)
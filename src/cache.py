@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+
+from .settings import (
+    EXTRACT_CACHE_ENABLED,
+    EXTRACT_CACHE_MAX_ENTRIES,
+    EXTRACT_CACHE_TTL_SECONDS,
+    EXTRACT_CACHE_SQLITE_PATH,
+)
+
+CACHE_HITS = Counter(
+    "incidente_llm_api_cache_hits_total",
+    "Acertos no cache de extrações",
+    labelnames=("tier",),
+)
+CACHE_MISSES = Counter(
+    "incidente_llm_api_cache_misses_total",
+    "Falhas (misses) no cache de extrações",
+)
+CACHE_ENTRIES = Gauge(
+    "incidente_llm_api_cache_entries",
+    "Entradas no cache de extrações em memória",
+)
+
+# Remove entradas expiradas do SQLite a cada N gravações.
+_SQLITE_PURGE_EVERY = 256
+
+
+def make_cache_key(texto: str, referencia: str, model: str) -> str:
+    """
+    Chave endereçada por conteúdo: texto já normalizado por `preprocess_text`,
+    referência temporal resolvida e modelo do Ollama.
+    """
+    raw = json.dumps([texto, referencia, model], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _SQLiteTier:
+    """Camada persistente em SQLite (modo WAL), compartilhada entre processos."""
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extraction_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM extraction_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Dict[str, str]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + self.ttl_seconds),
+            )
+            self._writes += 1
+            if self._writes % _SQLITE_PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM extraction_cache WHERE expires_at <= ?", (now,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ExtractionCache:
+    """
+    Cache LRU com TTL para resultados de extração. A camada em memória é consultada
+    primeiro; a camada SQLite (opcional) sobrevive a reinícios e é vista por todos
+    os workers do uvicorn.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, sqlite_path: str = ""):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._sqlite = _SQLiteTier(sqlite_path, ttl_seconds) if sqlite_path else None
+
+    def _get_memory(self, key: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                CACHE_ENTRIES.set(len(self._entries))
+                return None
+            self._entries.move_to_end(key)
+            return dict(value)
+
+    def _set_memory(self, key: str, value: Dict[str, str]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            CACHE_ENTRIES.set(len(self._entries))
+
+    async def get(self, key: str) -> Optional[Dict[str, str]]:
+        value = self._get_memory(key)
+        if value is not None:
+            CACHE_HITS.labels("memory").inc()
+            return value
+        if self._sqlite is not None:
+            value = await asyncio.to_thread(self._sqlite.get, key)
+            if value is not None:
+                CACHE_HITS.labels("sqlite").inc()
+                self._set_memory(key, value)
+                return value
+        CACHE_MISSES.inc()
+        return None
+
+    async def set(self, key: str, value: Dict[str, str]) -> None:
+        self._set_memory(key, value)
+        if self._sqlite is not None:
+            await asyncio.to_thread(self._sqlite.set, key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            CACHE_ENTRIES.set(0)
+
+    def close(self) -> None:
+        if self._sqlite is not None:
+            self._sqlite.close()
+            self._sqlite = None
+
+
+_cache: ExtractionCache | None = None
+
+
+def get_extraction_cache() -> ExtractionCache | None:
+    """Retorna o cache global (criado sob demanda) ou None se desabilitado."""
+    global _cache
+    if not EXTRACT_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = ExtractionCache(
+            EXTRACT_CACHE_MAX_ENTRIES, EXTRACT_CACHE_TTL_SECONDS, EXTRACT_CACHE_SQLITE_PATH
+        )
+    return _cache
+
+
+def close_extraction_cache() -> None:
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Callable, Deque
+
+from prometheus_client import Counter, Gauge
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_STATE = Gauge(
+    "incidente_llm_api_circuit_state",
+    "Estado do circuit breaker (0=fechado, 1=meio-aberto, 2=aberto)",
+    labelnames=("name",),
+)
+CIRCUIT_REJECTED = Counter(
+    "incidente_llm_api_circuit_rejected_total",
+    "Chamadas recusadas imediatamente pelo circuit breaker aberto",
+    labelnames=("name",),
+)
+CIRCUIT_TRANSITIONS = Counter(
+    "incidente_llm_api_circuit_transitions_total",
+    "Mudanças de estado do circuit breaker",
+    labelnames=("name", "state"),
+)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por janela deslizante das últimas chamadas. Chamadas lentas
+    (acima de `slow_call_seconds`) contam como falha. Aberto, recusa chamadas
+    por `open_seconds`; depois, meio-aberto, libera até `half_open_probes`
+    chamadas de sondagem: sucesso fecha o circuito, falha reabre.
+
+    Não é thread-safe: deve ser usado a partir do event loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 10.0,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.min_calls = max(1, min_calls)
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self._clock = clock
+        self._outcomes: Deque[bool] = deque(maxlen=max(1, window))
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        CIRCUIT_STATE.labels(name).set(_STATE_VALUES[CLOSED])
+
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        self._state = state
+        if state == OPEN:
+            self._opened_at = self._clock()
+        if state in (OPEN, CLOSED):
+            self._outcomes.clear()
+        self._probes_in_flight = 0
+        CIRCUIT_STATE.labels(self.name).set(_STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS.labels(self.name, state).inc()
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+            self._probes_in_flight += 1
+            return True
+        CIRCUIT_REJECTED.labels(self.name).inc()
+        return False
+
+    def release(self) -> None:
+        """Devolve uma vaga de sondagem quando a chamada foi cancelada sem resultado."""
+        if self._state == HALF_OPEN and self._probes_in_flight > 0:
+            self._probes_in_flight -= 1
+
+    def record_success(self, duration: float) -> None:
+        if duration > self.slow_call_seconds:
+            self.record_failure()
+            return
+        if self._state == HALF_OPEN:
+            self._transition(CLOSED)
+            return
+        self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        if self._state == HALF_OPEN:
+            self._transition(OPEN)
+            return
+        self._outcomes.append(False)
+        if len(self._outcomes) >= self.min_calls:
+            failures = self._outcomes.count(False)
+            if failures / len(self._outcomes) >= self.failure_rate:
+                self._transition(OPEN)
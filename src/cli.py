@@ -0,0 +1,283 @@
+"""
+Reprocessamento em lote pela linha de comando, sem passar pelo HTTP.
+
+    python -m src.cli arquivo.ndjson -o resultados.ndjson --checkpoint resultados.ckpt
+    python -m src.cli historico.csv --text-column descricao -o out.ndjson --llm-concurrency 4
+    cat incidentes.txt | python -m src.cli --format text --no-llm > out.ndjson
+
+Entradas NDJSON (`{"texto", "referencia_datahora", "id"}`), CSV (mesmas colunas) ou
+texto (um incidente por linha), de arquivos ou da entrada padrão (`-`), lidas em
+streaming. Cada item passa pelo mesmo pipeline do `/extract` (`src.pipeline`):
+as regras rodam num pool de processos e as chamadas ao Ollama ficam limitadas a
+`--llm-concurrency`. A saída é NDJSON na ordem de entrada; com `--checkpoint` o
+processamento pode ser interrompido e retomado do último ponto gravado.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+from jsonschema import ValidationError
+from pydantic import ValidationError as RequestValidationError
+
+from .admission import Overloaded, configure_admission_controller
+from .cache import close_extraction_cache
+from .llm_client import close_client
+from .models import IncidentRequest
+from .pipeline import ExtractionOutcome, extract_many
+from .rules_executor import configure_rules_executor, shutdown_rules_executor
+
+Record = Tuple[Optional[Any], Union[IncidentRequest, Exception]]
+
+FORMATS = ("auto", "ndjson", "csv", "text")
+
+
+class InputError(ValueError):
+    """Linha de entrada que não pôde ser convertida num incidente."""
+
+
+def _format_for(path: str, first_line: str, fmt: str) -> str:
+    if fmt != "auto":
+        return fmt
+    lower = path.lower()
+    if lower.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if lower.endswith(".csv"):
+        return "csv"
+    if lower.endswith(".txt"):
+        return "text"
+    return "ndjson" if first_line.lstrip().startswith("{") else "text"
+
+
+def _from_mapping(data: Dict[str, Any], text_column: str) -> Record:
+    ident = data.get("id")
+    try:
+        return ident, IncidentRequest(
+            texto=data.get(text_column) or "",
+            referencia_datahora=data.get("referencia_datahora") or None,
+        )
+    except RequestValidationError as exc:
+        return ident, InputError(str(exc))
+
+
+def _read_stream(fh: TextIO, fmt: str, text_column: str) -> Iterator[Record]:
+    if fmt == "csv":
+        for row in csv.DictReader(fh):
+            yield _from_mapping(row, text_column)
+        return
+    for line in fh:
+        line = line.strip()
+        if not line:
+            continue
+        if fmt == "text":
+            yield None, IncidentRequest(texto=line)
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as exc:
+            yield None, InputError(f"JSON inválido: {exc}")
+            continue
+        if not isinstance(data, dict):
+            yield None, InputError("Cada linha NDJSON deve ser um objeto")
+            continue
+        yield _from_mapping(data, text_column)
+
+
+def read_records(paths: List[str], fmt: str = "auto", text_column: str = "texto") -> Iterator[Record]:
+    """Lê `(id, item)` de cada arquivo (ou stdin para `-`), sob demanda."""
+    for path in paths:
+        fh = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+        try:
+            first = fh.readline()
+            resolved = _format_for("" if path == "-" else path, first, fmt)
+            yield from _read_stream(itertools.chain([first], fh), resolved, text_column)
+        finally:
+            if fh is not sys.stdin:
+                fh.close()
+
+
+def _result_line(index: int, ident: Any, result: Union[ExtractionOutcome, Exception]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"index": index}
+    if ident is not None:
+        out["id"] = ident
+    if isinstance(result, ExtractionOutcome):
+        out.update(result=result.payload, has_llm=result.has_llm, error=None)
+    elif isinstance(result, ValidationError):
+        out.update(result=None, error="Resposta não atende ao schema JSON")
+    elif isinstance(result, Overloaded):
+        out.update(result=None, error="LLM sobrecarregado")
+    else:
+        out.update(result=None, error=f"{type(result).__name__}: {result}")
+    return out
+
+
+def load_checkpoint(path: Optional[str]) -> Dict[str, int]:
+    if not path or not os.path.exists(path):
+        return {"done": 0, "output_offset": 0}
+    with open(path, encoding="utf-8") as fh:
+        data = json.load(fh)
+    return {"done": int(data.get("done", 0)), "output_offset": int(data.get("output_offset", 0))}
+
+
+def save_checkpoint(path: str, done: int, output_offset: int) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump({"done": done, "output_offset": output_offset, "updated": time.time()}, fh)
+    os.replace(tmp, path)
+
+
+class Stats:
+    """Contadores do processamento e a linha de progresso na saída de erro."""
+
+    def __init__(self, already_done: int = 0) -> None:
+        self.start = time.perf_counter()
+        self.already_done = already_done
+        self.done = 0
+        self.llm = 0
+        self.errors = 0
+
+    def add(self, line: Dict[str, Any]) -> None:
+        self.done += 1
+        if line.get("error"):
+            self.errors += 1
+        elif line.get("has_llm"):
+            self.llm += 1
+
+    def summary(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        rate = self.done / elapsed
+        llm_pct = 100.0 * self.llm / self.done if self.done else 0.0
+        return (
+            f"processados={self.already_done + self.done} nesta_execucao={self.done} "
+            f"taxa={rate:.1f}/s com_llm={llm_pct:.1f}% erros={self.errors} tempo={elapsed:.1f}s"
+        )
+
+
+async def process(
+    records: Iterable[Record],
+    out,
+    concurrency: int,
+    use_llm: bool = True,
+    start_index: int = 0,
+    checkpoint: Optional[str] = None,
+    checkpoint_every: int = 100,
+    stats: Optional[Stats] = None,
+    stats_interval: float = 10.0,
+) -> Stats:
+    """
+    Executa o pipeline sobre `records` e grava uma linha NDJSON por item em `out`
+    (binário), na ordem de entrada. Os resultados que terminam fora de ordem ficam
+    num buffer limitado pela concorrência.
+    """
+    stats = stats or Stats(start_index)
+    ids: Dict[int, Any] = {}
+
+    def items() -> Iterator[Union[IncidentRequest, Exception]]:
+        for i, (ident, item) in enumerate(records):
+            if ident is not None:
+                ids[i] = ident
+            yield item
+
+    pending: Dict[int, Union[ExtractionOutcome, Exception]] = {}
+    next_index = 0
+    last_report = time.perf_counter()
+
+    async for index, result in extract_many(items(), concurrency, use_llm=use_llm):
+        pending[index] = result
+        while next_index in pending:
+            line = _result_line(start_index + next_index, ids.pop(next_index, None), pending.pop(next_index))
+            out.write((json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8"))
+            stats.add(line)
+            next_index += 1
+            if checkpoint and next_index % checkpoint_every == 0:
+                out.flush()
+                save_checkpoint(checkpoint, start_index + next_index, out.tell())
+        if stats_interval > 0 and time.perf_counter() - last_report >= stats_interval:
+            last_report = time.perf_counter()
+            print(stats.summary(), file=sys.stderr, flush=True)
+
+    out.flush()
+    if checkpoint:
+        save_checkpoint(checkpoint, start_index + next_index, out.tell())
+    return stats
+
+
+async def _run(args: argparse.Namespace) -> Stats:
+    state = load_checkpoint(args.checkpoint)
+    if state["done"]:
+        print(f"Retomando após {state['done']} itens", file=sys.stderr)
+
+    if args.output == "-":
+        out = sys.stdout.buffer
+    else:
+        offset = state["output_offset"] if args.checkpoint else 0
+        out = open(args.output, "r+b" if offset else "wb")
+        # Descarta o que foi escrito depois do último checkpoint (será refeito) e
+        # continua dali: `truncate` não move a posição do arquivo.
+        out.truncate(offset)
+        out.seek(offset)
+
+    configure_rules_executor(args.rules_executor, args.workers)
+    if not args.no_llm:
+        # Sem descarte por prazo: na CLI a fila espera o Ollama o tempo que for preciso.
+        configure_admission_controller(args.llm_concurrency, args.concurrency, float("inf"))
+    records = itertools.islice(read_records(args.inputs, args.format, args.text_column), state["done"], None)
+    try:
+        return await process(
+            records,
+            out,
+            args.concurrency,
+            use_llm=not args.no_llm,
+            start_index=state["done"],
+            checkpoint=args.checkpoint,
+            checkpoint_every=args.checkpoint_every,
+            stats_interval=args.stats_interval,
+        )
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+        await close_client()
+        shutdown_rules_executor()
+        close_extraction_cache()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="Extração de incidentes em lote")
+    parser.add_argument("inputs", nargs="*", default=["-"], help="Arquivos de entrada ('-' = stdin)")
+    parser.add_argument("-o", "--output", default="-", help="Arquivo NDJSON de saída ('-' = stdout)")
+    parser.add_argument("--format", choices=FORMATS, default="auto")
+    parser.add_argument("--text-column", default="texto", help="Campo/coluna com o texto do incidente")
+    parser.add_argument("--workers", type=int, default=cpus, help="Processos para as regras")
+    parser.add_argument("--rules-executor", choices=("process", "thread"), default="process")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="Chamadas simultâneas ao Ollama")
+    parser.add_argument("--concurrency", type=int, default=None, help="Itens em andamento (padrão: 2x o maior limite)")
+    parser.add_argument("--no-llm", action="store_true", help="Só regras, sem chamar o Ollama")
+    parser.add_argument("--checkpoint", default=None, help="Arquivo de checkpoint para retomar")
+    parser.add_argument("--checkpoint-every", type=int, default=100)
+    parser.add_argument("--stats-interval", type=float, default=10.0, help="Segundos entre linhas de progresso")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.checkpoint and args.output == "-":
+        print("--checkpoint requer --output em arquivo", file=sys.stderr)
+        return 2
+    if args.concurrency is None:
+        args.concurrency = 2 * max(args.workers, 1 if args.no_llm else args.llm_concurrency)
+    stats = asyncio.run(_run(args))
+    print(stats.summary(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
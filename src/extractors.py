@@ -1,9 +1,11 @@
 from __future__ import annotations
-import re, datetime, zoneinfo
-from typing import Optional, Dict
+import re, datetime, functools, time, zoneinfo
+from typing import Optional, Dict, Tuple
 import dateparser
-from .settings import TZ
-from .localities import detect_localidade
+from .settings import TZ, DATE_CACHE_SIZE
+from .incident_types import get_incident_type_index
+from .localities import detect_localidade_scored
+from .tracing import lap
 
 def _now_tz() -> datetime.datetime:
     try:
@@ -11,124 +13,248 @@ def _now_tz() -> datetime.datetime:
     except Exception:
         return datetime.datetime.now(zoneinfo.ZoneInfo("America/Sao_Paulo"))
 
-def parse_datetime_pt(texto: str, referencia_iso: Optional[str] = None) -> Optional[datetime.datetime]:
-    settings = {
-        "PREFER_DATES_FROM": "past",
-        "TIMEZONE": TZ,
-        "RETURN_AS_TIMEZONE_AWARE": True,
-        "DATE_ORDER": "DMY",
-        "LANGUAGE_DETECTION_CONFIDENCE_THRESHOLD": 0.0,
-    }
-    if referencia_iso:
+_DATEPARSER_SETTINGS = {
+    "PREFER_DATES_FROM": "past",
+    "TIMEZONE": TZ,
+    "RETURN_AS_TIMEZONE_AWARE": True,
+    "DATE_ORDER": "DMY",
+    "LANGUAGE_DETECTION_CONFIDENCE_THRESHOLD": 0.0,
+}
+
+# Padrões pré-compilados das formas mais comuns em português.
+_REL_DAYS = {"anteontem": 2, "ontem": 1, "hoje": 0}
+_REL_RE = re.compile(r"\b(anteontem|ontem|hoje)\b", re.IGNORECASE)
+_TIME_RE = re.compile(r"\b(\d{1,2}):(\d{2})\b")
+_HOUR_RE = re.compile(r"\b(\d{1,2})h(\d{2})?\b", re.IGNORECASE)
+_DATE_RE = re.compile(r"\b(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})\b")
+_MONTHS = {
+    "janeiro": 1, "fevereiro": 2, "marco": 3, "março": 3, "abril": 4, "maio": 5, "junho": 6,
+    "julho": 7, "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12,
+}
+_MONTH_DATE_RE = re.compile(
+    r"\b(\d{1,2})\s+de\s+(" + "|".join(_MONTHS) + r")(?:\s+de\s+(\d{4}))?\b", re.IGNORECASE
+)
+# Expressão curta inteira: "ontem", "hoje às 14h", "anteontem 09:30", "às 14h30"...
+_SHORT_EXPR_RE = re.compile(
+    r"^\s*(anteontem|ontem|hoje)?\s*(?:(?:às|as|a partir das)\s*)?"
+    r"(?:(\d{1,2})(?::(\d{2})|h(\d{2})?))?\s*$",
+    re.IGNORECASE,
+)
+
+# Heurísticas de local, tipo genérico e impacto
+_LOCAL_RE = re.compile(
+    r"\b(?:no|na|em)\s+(?:escritório\s+de\s+)?([A-ZÁÉÍÓÚÂÊÔÃÕÇ][^,.;]*?)(?=,|\s+houve|\s+ocorreu|\.|$)"
+)
+_LOCAL_SUFFIX_RE = re.compile(r"\b(da|de|do)\b\s*$")
+_GENERIC_EVENT_RE = re.compile(r"houve|ocorreu", re.IGNORECASE)
+_IMPACT_RE = re.compile(r"\b(?:que\s+)?(?:afetou|impactou|deixou)\s+(.*?)(?:\.\s*|$)", re.IGNORECASE)
+
+# Sinais das heurísticas acima, para quem só precisa saber se um trecho os contém
+# (ex.: a janela de relevância do LLM).
+def has_datetime_cue(texto: str) -> bool:
+    return any(p.search(texto) for p in (_REL_RE, _TIME_RE, _HOUR_RE, _DATE_RE, _MONTH_DATE_RE))
+
+def has_location_cue(texto: str) -> bool:
+    return _LOCAL_RE.search(texto) is not None
+
+def has_impact_cue(texto: str) -> bool:
+    return _IMPACT_RE.search(texto) is not None
+
+@functools.lru_cache(maxsize=256)
+def _parse_reference(referencia_iso: str) -> Optional[datetime.datetime]:
+    try:
+        ref = datetime.datetime.fromisoformat(referencia_iso)
+    except ValueError:
         try:
             ref = dateparser.parse(referencia_iso)
-            if ref:
-                settings["RELATIVE_BASE"] = ref
         except Exception:
-            pass
+            return None
+        if ref is None:
+            return None
+    if ref.tzinfo is None:
+        ref = ref.replace(tzinfo=_tzinfo())
+    return ref
+
+def _tzinfo() -> datetime.tzinfo:
+    try:
+        return zoneinfo.ZoneInfo(TZ)
+    except Exception:
+        return zoneinfo.ZoneInfo("America/Sao_Paulo")
+
+def _reference_dt(referencia_iso: Optional[str]) -> datetime.datetime:
+    ref = _parse_reference(referencia_iso) if referencia_iso else None
+    return ref or _now_tz()
+
+def _resolve_short_expression(texto: str, ref: datetime.datetime) -> Optional[datetime.datetime]:
+    '''
+    Resolve sem dateparser as formas curtas mais frequentes (hoje/ontem/anteontem,
+    "às 14h", "14:30"). Retorna None se a expressão não for uma delas.
+    '''
+    m = _SHORT_EXPR_RE.match(texto)
+    if not m or not (m.group(1) or m.group(2)):
+        return None
+    dt = ref - datetime.timedelta(days=_REL_DAYS[m.group(1).lower()]) if m.group(1) else ref
+    if m.group(2):
+        horas, mins = int(m.group(2)), int(m.group(3) or m.group(4) or 0)
+        if horas > 23 or mins > 59:
+            return None
+        dt = dt.replace(hour=horas, minute=mins, second=0, microsecond=0)
+    return dt
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse_datetime_cached(texto: str, referencia_iso: Optional[str], tz: str) -> Optional[datetime.datetime]:
+    ref = _reference_dt(referencia_iso)
+    dt = _resolve_short_expression(texto, ref)
+    if dt is not None:
+        return dt
+    # Último recurso: dateparser completo (caro).
+    settings = dict(_DATEPARSER_SETTINGS, TIMEZONE=tz, RELATIVE_BASE=ref)
     return dateparser.parse(texto, languages=["pt"], settings=settings)
 
+def parse_datetime_pt(texto: str, referencia_iso: Optional[str] = None) -> Optional[datetime.datetime]:
+    '''
+    Resolve uma expressão de data/hora em português relativa a `referencia_iso`.
+    Formas comuns são resolvidas por padrões pré-compilados; o dateparser fica como
+    último recurso. Resultados são memoizados por (expressão, referência, TZ); sem
+    referência usa "agora" truncado ao minuto para que o cache não congele o tempo.
+    '''
+    if not referencia_iso:
+        referencia_iso = _now_tz().replace(second=0, microsecond=0).isoformat()
+    return _parse_datetime_cached(texto.strip(), referencia_iso, TZ)
+
 def normalize_dt(dt: datetime.datetime) -> str:
     # Retorna "YYYY-MM-DD HH:MM"
     dt = dt.astimezone(zoneinfo.ZoneInfo(TZ))
     return dt.strftime("%Y-%m-%d %H:%M")
 
+FIELDS = ("data_ocorrencia", "local", "tipo_incidente", "impacto")
+
 def fallback_extract(texto: str, referencia_iso: Optional[str] = None) -> Dict[str, str]:
     '''
     Heurísticas simples para extrair campos quando o LLM falhar ou vier incompleto.
     '''
+    return fallback_extract_scored(texto, referencia_iso)[0]
+
+def fallback_extract_scored(
+    texto: str, referencia_iso: Optional[str] = None
+) -> Tuple[Dict[str, str], Dict[str, float]]:
+    '''
+    Mesmas heurísticas de `fallback_extract`, retornando também a confiança (0 a 1)
+    de cada campo conforme a evidência encontrada no texto.
+    '''
     t = texto
+    confianca: Dict[str, float] = dict.fromkeys(FIELDS, 0.0)
+    inicio = time.perf_counter()
 
     # Identifica pistas relativas para reutilizar em mais de uma heurística.
-    rel_hint = None
-    for palavra in ["anteontem", "ontem", "hoje"]:
-        if re.search(rf"\b{palavra}\b", t, re.IGNORECASE):
-            rel_hint = palavra
-            break
+    achados = {m.group(1).lower() for m in _REL_RE.finditer(t)}
+    rel_hint = next((palavra for palavra in _REL_DAYS if palavra in achados), None)
 
     # === data/hora ===
-    # Primeiro tenta um parse completo com dateparser (cobre casos como "ontem às 14h").
-    dt = parse_datetime_pt(t, referencia_iso)
+    # Padrões explícitos resolvidos de forma determinística a partir da referência;
+    # o dateparser só é chamado se nenhum deles aparecer no texto.
+    ref = _reference_dt(referencia_iso)
+    base = ref - datetime.timedelta(days=_REL_DAYS[rel_hint]) if rel_hint else ref
+    dt = None
+    conf_data = 0.0
 
     # procura por padrões explícitos: "às 14h30", "14:00", "14h"
-    if not dt:
-        m_time = re.search(r"\b(\d{1,2}):(\d{2})\b", t)
-        if m_time:
-            horas, mins = int(m_time.group(1)), int(m_time.group(2))
-            base = parse_datetime_pt(rel_hint or "hoje", referencia_iso) or _now_tz()
-            dt = base.replace(hour=horas, minute=mins, second=0, microsecond=0)
-        else:
-            m_h = re.search(r"\b(\d{1,2})h\b", t, re.IGNORECASE)
-            if m_h:
-                horas = int(m_h.group(1))
-                base = parse_datetime_pt(rel_hint or "hoje", referencia_iso) or _now_tz()
-                dt = base.replace(hour=horas, minute=0, second=0, microsecond=0)
-
-    # procura datas explícitas dd/mm/aaaa
-    m_date = re.search(r"\b(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})\b", t)
+    hora = None
+    m_time = _TIME_RE.search(t)
+    if m_time:
+        hora = int(m_time.group(1)), int(m_time.group(2))
+    else:
+        m_h = _HOUR_RE.search(t)
+        if m_h:
+            hora = int(m_h.group(1)), int(m_h.group(2) or 0)
+    if hora and hora[0] <= 23 and hora[1] <= 59:
+        dt = base.replace(hour=hora[0], minute=hora[1], second=0, microsecond=0)
+        # horário explícito; sem dia relativo assume "hoje", o que é menos seguro
+        conf_data = 0.9 if rel_hint else 0.6
+
+    # procura datas explícitas dd/mm/aaaa ou "12 de agosto [de 2024]"
+    data = None
+    m_date = _DATE_RE.search(t)
     if m_date:
         d, m, y = int(m_date.group(1)), int(m_date.group(2)), int(m_date.group(3))
         if y < 100: y += 2000
+        data = y, m, d
+    else:
+        m_month = _MONTH_DATE_RE.search(t)
+        if m_month:
+            y = int(m_month.group(3)) if m_month.group(3) else ref.year
+            data = y, _MONTHS[m_month.group(2).lower()], int(m_month.group(1))
+    if data:
+        y, m, d = data
         try:
             if dt:
                 dt = dt.replace(year=y, month=m, day=d)
+                conf_data = 1.0
             else:
                 dt = datetime.datetime(y, m, d, tzinfo=zoneinfo.ZoneInfo(TZ))
+                conf_data = 0.7
         except Exception:
             dt = None
+            conf_data = 0.0
 
     # termos relativos: hoje, ontem, anteontem
     if not dt and rel_hint:
-        dt = parse_datetime_pt(rel_hint, referencia_iso)
+        dt = base
+        # dia conhecido, horário não
+        conf_data = 0.5
+
+    # último recurso: dateparser no texto completo
+    if not dt:
+        dt = parse_datetime_pt(t, referencia_iso)
+        conf_data = 0.8 if dt else 0.0
 
     data_ocorrencia = normalize_dt(dt) if dt else ""
+    confianca["data_ocorrencia"] = conf_data
+    inicio = lap("rules_date", inicio)
 
     # === local ===
-    local = detect_localidade(t)
+    local, confianca["local"] = detect_localidade_scored(t)
     if not local:
         # heurística: após "no|na|em|no escritório de" capturar sequência até vírgula/ponto/ "houve"
-        m_loc = re.search(r"\b(?:no|na|em)\s+(?:escritório\s+de\s+)?([A-ZÁÉÍÓÚÂÊÔÃÕÇ][^,.;]*?)(?=,|\s+houve|\s+ocorreu|\.|$)", t)
+        m_loc = _LOCAL_RE.search(t)
         if m_loc:
             local = m_loc.group(1).strip()
             # limpar sufixos comuns
-            local = re.sub(r"\b(da|de|do)\b\s*$", "", local).strip()
+            local = _LOCAL_SUFFIX_RE.sub("", local).strip()
+            confianca["local"] = 0.5 if local else 0.0
+
+    inicio = lap("rules_locality", inicio)
 
     # === tipo_incidente ===
-    tipo_incidente = ""
-    CANDIDATOS = [
-        r"falha no servidor", r"falha (?:geral|total)",
-        r"queda de energia", r"pane elétrica", r"intermitência",
-        r"incêndio", r"vazamento", r"ataque ddos", r"ataque de ddos",
-        r"indisponibilidade", r"erro de aplicação", r"parada programada",
-        r"problema de rede", r"congestionamento de rede", r"falha de banco de dados"
-    ]
-    for pat in CANDIDATOS:
-        m = re.search(pat, t, re.IGNORECASE)
-        if m:
-            tipo_incidente = m.group(0).strip().capitalize()
-            break
-    if not tipo_incidente:
+    # taxonomia em src/data/incident_types.json (INCIDENT_TYPES_PATH), compilada uma vez
+    tipo_incidente = get_incident_type_index().match(t) or ""
+    if tipo_incidente:
+        confianca["tipo_incidente"] = 0.9
+    else:
         # fallback genérico
-        if "houve" in t.lower() or "ocorreu" in t.lower():
+        if _GENERIC_EVENT_RE.search(t):
             tipo_incidente = "Incidente reportado"
+            confianca["tipo_incidente"] = 0.2
 
     # === impacto ===
     impacto = ""
     # após "que" ou "afetou" capturar até ponto final
-    m_imp = re.search(r"\b(?:que\s+)?(?:afetou|impactou|deixou)\s+(.*?)(?:\.\s*|$)", t, re.IGNORECASE)
+    m_imp = _IMPACT_RE.search(t)
     if m_imp:
         impacto = m_imp.group(1).strip().capitalize()
+        confianca["impacto"] = 0.8 if impacto else 0.0
+    lap("rules_type_impact", inicio)
 
     return {
         "data_ocorrencia": data_ocorrencia,
         "local": local,
         "tipo_incidente": tipo_incidente,
         "impacto": impacto
-    }
+    }, confianca
 
 def merge_dicts(primary: Dict[str, str], fallback: Dict[str, str]) -> Dict[str, str]:
     out = {}
-    for k in ["data_ocorrencia", "local", "tipo_incidente", "impacto"]:
+    for k in FIELDS:
         v = (primary or {}).get(k, "") if primary else ""
         if not v or not str(v).strip():
             v = fallback.get(k, "")
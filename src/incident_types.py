@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+from .settings import INCIDENT_TYPES_PATH
+from .text_utils import TOKEN_RE, normalize_text
+
+DEFAULT_INCIDENT_TYPES_PATH = os.path.join(os.path.dirname(__file__), "data", "incident_types.json")
+
+# Chave do nó da trie que guarda o índice do tipo quando um sinônimo termina ali.
+_TERMINAL = ""
+
+
+class IncidentTypeIndex:
+    """
+    Taxonomia de tipos de incidente compilada uma única vez:
+
+    - `sinonimos` (frases literais) vão para uma trie de tokens normalizados (sem
+      acento, minúsculos), percorrida numa passada sobre o texto, com custo
+      independente do número de tipos;
+    - `padroes` (regex, escritas para o texto normalizado) são unidos numa única
+      alternância com grupos nomeados, resolvidos por `lastgroup`.
+
+    Entre os tipos encontrados vence a maior `prioridade`; empate, o que aparece
+    primeiro no texto e, na mesma posição, a frase mais longa.
+    """
+
+    def __init__(self, entries: List[Dict[str, Any]]) -> None:
+        self.tipos: List[str] = []
+        self._prioridades: List[int] = []
+        self._root: Dict[str, dict] = {}
+        self._group_tipo: Dict[str, int] = {}
+        patterns: List[str] = []
+        for entry in entries:
+            idx = len(self.tipos)
+            self.tipos.append(entry["tipo"])
+            self._prioridades.append(int(entry.get("prioridade", 0)))
+            for sinonimo in list(entry.get("sinonimos") or []) + [entry["tipo"]]:
+                self._add_phrase(sinonimo, idx)
+            for pattern in entry.get("padroes") or []:
+                group = f"t{len(patterns)}"
+                self._group_tipo[group] = idx
+                patterns.append(f"(?P<{group}>{pattern})")
+        self._pattern: Optional[Pattern[str]] = re.compile("|".join(patterns)) if patterns else None
+
+    def _add_phrase(self, phrase: str, idx: int) -> None:
+        tokens = TOKEN_RE.findall(normalize_text(phrase))
+        if not tokens:
+            return
+        node = self._root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        # Primeira definição de uma frase prevalece.
+        node.setdefault(_TERMINAL, idx)
+
+    def match(self, texto: str) -> Optional[str]:
+        norm = normalize_text(texto)
+        # Melhor candidato como (prioridade, -posição, tamanho, índice do tipo).
+        best: Optional[Tuple[int, int, int, int]] = None
+
+        tokens = [(m.group(0), m.start(), m.end()) for m in TOKEN_RE.finditer(norm)]
+        root = self._root
+        for start in range(len(tokens)):
+            node = root.get(tokens[start][0])
+            pos = start
+            while node is not None:
+                idx = node.get(_TERMINAL)
+                if idx is not None:
+                    begin = tokens[start][1]
+                    cand = (self._prioridades[idx], -begin, tokens[pos][2] - begin, idx)
+                    if best is None or cand > best:
+                        best = cand
+                pos += 1
+                if pos >= len(tokens):
+                    break
+                node = node.get(tokens[pos][0])
+
+        if self._pattern is not None:
+            for m in self._pattern.finditer(norm):
+                idx = self._group_tipo[m.lastgroup]
+                cand = (self._prioridades[idx], -m.start(), m.end() - m.start(), idx)
+                if best is None or cand > best:
+                    best = cand
+
+        return self.tipos[best[3]] if best is not None else None
+
+
+def load_incident_types(path: str) -> List[Dict[str, Any]]:
+    """Lê a taxonomia (JSON com a lista `tipos` de objetos `tipo`, `prioridade`, `sinonimos`, `padroes`)."""
+    with open(path, encoding="utf-8") as fh:
+        data = json.load(fh)
+    return data["tipos"] if isinstance(data, dict) else data
+
+
+def build_incident_type_index(path: str = INCIDENT_TYPES_PATH) -> IncidentTypeIndex:
+    return IncidentTypeIndex(load_incident_types(path or DEFAULT_INCIDENT_TYPES_PATH))
+
+
+_index: IncidentTypeIndex | None = None
+
+
+def get_incident_type_index() -> IncidentTypeIndex:
+    """Índice global, construído na primeira chamada."""
+    global _index
+    if _index is None:
+        _index = build_incident_type_index()
+    return _index
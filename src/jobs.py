@@ -0,0 +1,412 @@
+"""
+Jobs assíncronos (`POST /jobs`): os itens vão para uma fila durável em SQLite e
+são processados em background pelo mesmo pipeline do `/extract`, sem segurar a
+conexão HTTP do cliente. A vazão de ingestão fica desacoplada da do Ollama.
+
+Cada item é reservado por um tempo (lease), renovado enquanto o item está em
+processamento; se o processo morrer no meio, o item
+volta para a fila quando o lease expira e é reprocessado (até JOBS_MAX_ATTEMPTS
+tentativas). Vários workers do uvicorn podem compartilhar o mesmo arquivo.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from jsonschema import ValidationError
+from prometheus_client import Counter, Gauge
+
+from .models import JobItem, JobRequest
+from .pipeline import run_extraction
+from .settings import (
+    JOBS_CONCURRENCY,
+    JOBS_DB_PATH,
+    JOBS_LEASE_SECONDS,
+    JOBS_MAX_ATTEMPTS,
+    JOBS_POLL_INTERVAL,
+    JOBS_RETENTION_SECONDS,
+)
+
+logger = logging.getLogger("incidente_llm_api")
+
+JOBS_SUBMITTED = Counter(
+    "incidente_llm_api_jobs_submitted_total",
+    "Jobs aceitos no POST /jobs",
+)
+JOB_ITEMS_PROCESSED = Counter(
+    "incidente_llm_api_job_items_processed_total",
+    "Itens de jobs processados",
+    labelnames=("result",),
+)
+JOB_ITEMS_IN_FLIGHT = Gauge(
+    "incidente_llm_api_job_items_in_flight",
+    "Itens de jobs em processamento neste processo",
+)
+
+# Remove jobs expirados a cada N itens concluídos.
+_PURGE_EVERY = 1000
+# Espera máxima entre tentativas de um worker depois de erro na fila (ex.: banco travado).
+_ERROR_BACKOFF_MAX = 30.0
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    "id TEXT PRIMARY KEY, created_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+    "total INTEGER NOT NULL, done INTEGER NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0)",
+    "CREATE TABLE IF NOT EXISTS job_items ("
+    "job_id TEXT NOT NULL, idx INTEGER NOT NULL, ext_id TEXT, texto TEXT NOT NULL, referencia TEXT, "
+    "status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, lease_until REAL, "
+    "result TEXT, error TEXT, PRIMARY KEY (job_id, idx))",
+    "CREATE INDEX IF NOT EXISTS job_items_queue ON job_items (status, lease_until)",
+)
+
+
+def job_status(job: Dict[str, Any]) -> str:
+    if job["done"] + job["failed"] >= job["total"]:
+        return "completed"
+    return "running" if job["started_at"] is not None else "queued"
+
+
+def _error_message(exc: BaseException) -> str:
+    if isinstance(exc, ValidationError):
+        return "Resposta não atende ao schema JSON"
+    return "Falha interna na extração"
+
+
+class JobStore:
+    """Fila durável de itens em SQLite (modo WAL), segura entre threads e processos."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._completed = 0
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+
+    def create_job(self, items: Iterable[JobItem]) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        rows = [
+            (job_id, i, None if item.id is None else json.dumps(item.id), item.texto, item.referencia_datahora)
+            for i, item in enumerate(items)
+        ]
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, created_at, total) VALUES (?, ?, ?)", (job_id, now, len(rows))
+                )
+                self._conn.executemany(
+                    "INSERT INTO job_items (job_id, idx, ext_id, texto, referencia) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        JOBS_SUBMITTED.inc()
+        return {"id": job_id, "created_at": now, "started_at": None, "finished_at": None,
+                "total": len(rows), "done": 0, "failed": 0}
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, created_at, started_at, finished_at, total, done, failed FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "created_at", "started_at", "finished_at", "total", "done", "failed")
+        return dict(zip(keys, row))
+
+    def results(self, job_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Itens concluídos do job, na ordem de entrada (`index`), a partir de `offset`."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, ext_id, result, error FROM job_items "
+                "WHERE job_id = ? AND idx >= ? AND status IN ('done', 'error') ORDER BY idx LIMIT ?",
+                (job_id, offset, -1 if limit is None else limit),
+            ).fetchall()
+        out = []
+        for idx, ext_id, result, error in rows:
+            line: Dict[str, Any] = {"index": idx}
+            if ext_id is not None:
+                line["id"] = json.loads(ext_id)
+            line.update(result=json.loads(result) if result is not None else None, error=error)
+            out.append(line)
+        return out
+
+    def claim(self, lease_seconds: float, max_attempts: int) -> Optional[Tuple[int, str, Optional[str]]]:
+        """
+        Reserva o próximo item pendente (ou com lease vencido) e devolve
+        `(rowid, texto, referencia)`. Itens que já esgotaram as tentativas são
+        encerrados com erro em vez de voltar ao processamento.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._conn.execute(
+                        "SELECT rowid, job_id, texto, referencia, attempts FROM job_items "
+                        "WHERE status = 'pending' OR (status = 'running' AND lease_until < ?) "
+                        "ORDER BY rowid LIMIT 1",
+                        (now,),
+                    ).fetchone()
+                    if row is None:
+                        self._conn.execute("COMMIT")
+                        return None
+                    rowid, job_id, texto, referencia, attempts = row
+                    if attempts >= max_attempts:
+                        self._finish(rowid, job_id, None, "Tentativas esgotadas", now)
+                        continue
+                    self._conn.execute(
+                        "UPDATE job_items SET status = 'running', lease_until = ?, attempts = attempts + 1 "
+                        "WHERE rowid = ?",
+                        (now + lease_seconds, rowid),
+                    )
+                    self._conn.execute(
+                        "UPDATE jobs SET started_at = COALESCE(started_at, ?) WHERE id = ?", (now, job_id)
+                    )
+                    self._conn.execute("COMMIT")
+                    return rowid, texto, referencia
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def renew(self, rowid: int, lease_seconds: float) -> bool:
+        """Estende o lease de um item ainda em processamento; False se ele já não está reservado."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE job_items SET lease_until = ? WHERE rowid = ? AND status = 'running'",
+                (time.time() + lease_seconds, rowid),
+            )
+        return cursor.rowcount > 0
+
+    def _finish(self, rowid: int, job_id: str, result: Optional[dict], error: Optional[str], now: float) -> None:
+        self._conn.execute(
+            "UPDATE job_items SET status = ?, result = ?, error = ?, lease_until = NULL WHERE rowid = ?",
+            ("error" if error else "done", None if result is None else json.dumps(result, ensure_ascii=False),
+             error, rowid),
+        )
+        column = "failed" if error else "done"
+        self._conn.execute(
+            f"UPDATE jobs SET {column} = {column} + 1, "
+            "finished_at = CASE WHEN done + failed + 1 >= total THEN ? ELSE finished_at END WHERE id = ?",
+            (now, job_id),
+        )
+
+    def complete(self, rowid: int, result: Optional[dict], error: Optional[str] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT job_id FROM job_items WHERE rowid = ? AND status = 'running'", (rowid,)
+                ).fetchone()
+                # Lease vencido e item já concluído por outro worker: não conta duas vezes.
+                if row is not None:
+                    self._finish(rowid, row[0], result, error, now)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._completed += 1
+            purge = self._completed % _PURGE_EVERY == 0
+        if purge:
+            self.purge(JOBS_RETENTION_SECONDS)
+
+    def purge(self, retention_seconds: float) -> int:
+        """Apaga jobs concluídos há mais de `retention_seconds` (0 = nunca)."""
+        if retention_seconds <= 0:
+            return 0
+        cutoff = time.time() - retention_seconds
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [r[0] for r in self._conn.execute(
+                    "SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,)
+                )]
+                for job_id in ids:
+                    self._conn.execute("DELETE FROM job_items WHERE job_id = ?", (job_id,))
+                    self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(ids)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def parse_ndjson(lines: Iterable[str]) -> Iterator[JobItem]:
+    """
+    Converte linhas NDJSON (`{"texto", "referencia_datahora", "id"}`) em itens.
+    Levanta ValueError com o número da linha na primeira entrada inválida: o job
+    é aceito inteiro ou recusado.
+    """
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+            if not isinstance(data, dict):
+                raise ValueError("esperado um objeto")
+            yield JobItem.model_validate(data)
+        except ValueError as exc:  # inclui a ValidationError do pydantic
+            raise ValueError(f"Linha {number} inválida: {exc}") from exc
+
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "text/plain")
+
+
+class TooManyItems(ValueError):
+    """Job com mais itens que o limite configurado."""
+
+
+def parse_job_body(body: bytes, content_type: str, max_items: int) -> List[JobItem]:
+    """
+    Decodifica e valida o corpo do `POST /jobs` (JSON `{"items": [...]}` ou NDJSON).
+    Pesado para lotes grandes: deve rodar fora do event loop. O limite de itens é
+    verificado antes de validar o restante (no NDJSON, antes até de ler as linhas
+    seguintes), levantando `TooManyItems`.
+    """
+    if content_type in NDJSON_CONTENT_TYPES:
+        lines = (line.decode("utf-8") for line in io.BytesIO(body))
+        items = list(itertools.islice(parse_ndjson(lines), max_items + 1))
+    else:
+        data = json.loads(body)
+        raw = data.get("items") if isinstance(data, dict) else None
+        if isinstance(raw, list) and len(raw) > max_items:
+            raise TooManyItems(f"Job excede o limite de {max_items} itens")
+        items = JobRequest.model_validate(data).items
+    if len(items) > max_items:
+        raise TooManyItems(f"Job excede o limite de {max_items} itens")
+    return items
+
+
+class JobWorkers:
+    """Corrotinas que consomem a fila de jobs no event loop do app."""
+
+    def __init__(self, store: JobStore, concurrency: int = JOBS_CONCURRENCY):
+        self.store = store
+        self.concurrency = max(1, concurrency)
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        backoff = JOBS_POLL_INTERVAL
+        while True:
+            try:
+                claimed = await asyncio.to_thread(self.store.claim, JOBS_LEASE_SECONDS, JOBS_MAX_ATTEMPTS)
+                if claimed is None:
+                    # Fila vazia: acorda com um novo job deste processo ou sonda de tempos em tempos
+                    # (jobs recebidos por outros workers do uvicorn).
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), JOBS_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._process(*claimed)
+                backoff = JOBS_POLL_INTERVAL
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # Erro da fila (ex.: "database is locked"): o worker não pode morrer em
+                # silêncio. Um item reservado volta à fila quando o lease vencer.
+                logger.error("job_worker_error", extra={"error": repr(exc), "retry_in": backoff})
+                await asyncio.sleep(backoff)
+                backoff = min(_ERROR_BACKOFF_MAX, backoff * 2)
+
+    async def _keep_lease(self, rowid: int) -> None:
+        """Renova o lease enquanto o item espera/roda, para outro worker não pegá-lo de novo."""
+        while True:
+            await asyncio.sleep(JOBS_LEASE_SECONDS / 3)
+            try:
+                if not await asyncio.to_thread(self.store.renew, rowid, JOBS_LEASE_SECONDS):
+                    return
+            except Exception as exc:
+                logger.warning("job_lease_renew_failed", extra={"rowid": rowid, "error": repr(exc)})
+
+    async def _process(self, rowid: int, texto: str, referencia: Optional[str]) -> None:
+        JOB_ITEMS_IN_FLIGHT.inc()
+        heartbeat = asyncio.create_task(self._keep_lease(rowid))
+        try:
+            # Espera vaga no LLM sem prazo: sob carga o job anda mais devagar, mas não
+            # termina com resultados só das regras.
+            outcome = await run_extraction(texto, referencia, patient=True)
+        except asyncio.CancelledError:
+            # Desligamento: o item fica reservado e volta à fila quando o lease vencer.
+            raise
+        except Exception as exc:
+            logger.error("job_item_failed", extra={"rowid": rowid, "error": repr(exc)})
+            await asyncio.to_thread(self.store.complete, rowid, None, _error_message(exc))
+            JOB_ITEMS_PROCESSED.labels("error").inc()
+            return
+        finally:
+            heartbeat.cancel()
+            JOB_ITEMS_IN_FLIGHT.dec()
+        await asyncio.to_thread(self.store.complete, rowid, outcome.payload)
+        JOB_ITEMS_PROCESSED.labels("llm" if outcome.has_llm else "rules").inc()
+
+_store: Optional[JobStore] = None
+_workers: Optional[JobWorkers] = None
+
+
+def get_job_store() -> Optional[JobStore]:
+    """Retorna a fila global (criada sob demanda) ou None sem JOBS_DB_PATH (jobs desabilitados)."""
+    global _store
+    if not JOBS_DB_PATH:
+        return None
+    if _store is None:
+        _store = JobStore(JOBS_DB_PATH)
+    return _store
+
+
+def start_job_workers() -> None:
+    global _workers
+    store = get_job_store()
+    if store is None or _workers is not None:
+        return
+    _workers = JobWorkers(store)
+    _workers.start()
+
+
+def notify_job_workers() -> None:
+    if _workers is not None:
+        _workers.notify()
+
+
+async def stop_job_workers() -> None:
+    global _workers, _store
+    if _workers is not None:
+        await _workers.stop()
+        _workers = None
+    if _store is not None:
+        _store.close()
+        _store = None
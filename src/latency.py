@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import math
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class LatencyTracker:
+    """
+    Janela deslizante das últimas latências por chave (ex.: backend + modelo), usada
+    para derivar percentis recentes sem manter histórico ilimitado.
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = max(1, window)
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, key: str, seconds: float) -> None:
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def count(self, key: str) -> int:
+        samples = self._samples.get(key)
+        return len(samples) if samples else 0
+
+    def percentile(self, key: str, q: float) -> Optional[float]:
+        """Percentil `q` (0 a 1) pelo método nearest-rank; None sem amostras."""
+        samples = self._samples.get(key)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        rank = max(1, math.ceil(q * len(ordered)))
+        return ordered[min(rank, len(ordered)) - 1]
@@ -1,7 +1,120 @@
 from __future__ import annotations
-import httpx, json, datetime, zoneinfo
-from typing import Optional
-from .settings import OLLAMA_HOST, OLLAMA_MODEL, TZ
+import asyncio, httpx, json, datetime, logging, re, time, zoneinfo
+from typing import Any, Dict, List, Optional, Tuple
+from jsonschema import ValidationError
+from prometheus_client import Counter, Gauge, Histogram
+from .backends import Backend, backend_pool
+from .circuit_breaker import CircuitBreaker
+from .schema import INCIDENT_SCHEMA, validate_incident_payload
+from .settings import (
+    OLLAMA_MODEL,
+    TZ,
+    OLLAMA_MAX_CONNECTIONS,
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+    OLLAMA_KEEPALIVE_EXPIRY,
+    OLLAMA_HTTP2,
+    OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_READ_TIMEOUT,
+    LLM_CB_ENABLED,
+    LLM_CB_WINDOW,
+    LLM_CB_MIN_CALLS,
+    LLM_CB_FAILURE_RATE,
+    LLM_CB_SLOW_CALL_SECONDS,
+    LLM_CB_OPEN_SECONDS,
+    LLM_CB_HALF_OPEN_PROBES,
+    OLLAMA_STREAM,
+    OLLAMA_NUM_PREDICT,
+    OLLAMA_FORMAT,
+    OLLAMA_PROMPT_STYLE,
+    LLM_BATCH_ENABLED,
+    LLM_BATCH_WINDOW_MS,
+    LLM_BATCH_MAX_SIZE,
+    LLM_TIMEOUT_ADAPTIVE,
+    LLM_TIMEOUT_PERCENTILE,
+    LLM_TIMEOUT_MULTIPLIER,
+    LLM_TIMEOUT_MIN,
+    LLM_TIMEOUT_MAX,
+    LLM_TIMEOUT_MIN_SAMPLES,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_PERCENTILE,
+    OLLAMA_KEEP_ALIVE,
+)
+
+logger = logging.getLogger("incidente_llm_api")
+
+# Cliente HTTP compartilhado por toda a aplicação; aberto/fechado pelo lifespan do FastAPI.
+_client: httpx.AsyncClient | None = None
+_client_loop: asyncio.AbstractEventLoop | None = None
+
+# Protege as requisições contra um Ollama lento ou fora do ar.
+llm_breaker: CircuitBreaker | None = (
+    CircuitBreaker(
+        "ollama",
+        window=LLM_CB_WINDOW,
+        min_calls=LLM_CB_MIN_CALLS,
+        failure_rate=LLM_CB_FAILURE_RATE,
+        slow_call_seconds=LLM_CB_SLOW_CALL_SECONDS,
+        open_seconds=LLM_CB_OPEN_SECONDS,
+        half_open_probes=LLM_CB_HALF_OPEN_PROBES,
+    )
+    if LLM_CB_ENABLED
+    else None
+)
+
+LLM_COALESCED_TOTAL = Counter(
+    "incidente_llm_api_llm_coalesced_total",
+    "Chamadas ao LLM atendidas por uma requisição idêntica já em andamento",
+)
+LLM_COALESCED_WAITERS = Gauge(
+    "incidente_llm_api_llm_coalesced_waiters",
+    "Requisições aguardando uma chamada idêntica ao LLM em andamento",
+)
+
+LLM_STREAM_EARLY_STOP = Counter(
+    "incidente_llm_api_llm_stream_early_stop_total",
+    "Gerações em streaming interrompidas logo após o fechamento do objeto JSON",
+)
+
+_TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+LLM_PROMPT_TOKENS = Histogram(
+    "incidente_llm_api_llm_prompt_tokens",
+    "Tokens de prompt avaliados pelo Ollama (prompt_eval_count)",
+    buckets=_TOKEN_BUCKETS,
+)
+LLM_EVAL_TOKENS = Histogram(
+    "incidente_llm_api_llm_eval_tokens",
+    "Tokens gerados pelo Ollama (eval_count)",
+    buckets=_TOKEN_BUCKETS,
+)
+LLM_EVAL_DURATION = Histogram(
+    "incidente_llm_api_llm_eval_duration_seconds",
+    "Tempo de geração reportado pelo Ollama (eval_duration)",
+)
+LLM_PROMPT_EVAL_DURATION = Histogram(
+    "incidente_llm_api_llm_prompt_eval_duration_seconds",
+    "Tempo de avaliação do prompt reportado pelo Ollama (prompt_eval_duration)",
+)
+
+LLM_BATCH_SIZE = Histogram(
+    "incidente_llm_api_llm_batch_size",
+    "Incidentes enviados por geração pelo micro-batcher",
+    buckets=(1, 2, 4, 8, 16, 32),
+)
+LLM_BATCH_FALLBACK = Counter(
+    "incidente_llm_api_llm_batch_fallback_total",
+    "Itens de um lote refeitos individualmente por resposta inválida",
+)
+
+LLM_TIMEOUT_SECONDS = Gauge(
+    "incidente_llm_api_llm_timeout_seconds",
+    "Timeout atual das chamadas ao LLM, derivado da latência recente",
+    labelnames=("backend",),
+)
+LLM_HEDGED = Counter(
+    "incidente_llm_api_llm_hedged_total",
+    "Requisições de hedging ao LLM: enviadas e qual chamada venceu",
+    labelnames=("outcome",),
+)
 
 SYS_PROMPT = (
     "Você é um extrator de informações. "
@@ -10,6 +123,52 @@ SYS_PROMPT = (
     "Responda SOMENTE um objeto JSON válido, sem comentários, sem texto extra."
 )
 
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def build_client() -> httpx.AsyncClient:
+    '''
+    Cria o AsyncClient com pool de conexões, keep-alive e timeouts configuráveis.
+    HTTP/2 só é habilitado se o pacote opcional `h2` estiver instalado.
+    '''
+    http2 = OLLAMA_HTTP2
+    if http2 and not _http2_available():
+        logger.warning("ollama_http2_unavailable", extra={"reason": "pacote h2 não instalado"})
+        http2 = False
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+        ),
+        http2=http2,
+    )
+
+async def close_client() -> None:
+    global _client, _client_loop
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _client_loop = None
+
+def get_client() -> httpx.AsyncClient:
+    '''
+    Retorna o cliente compartilhado. Fora do lifespan (ex.: TestClient sem `with`)
+    o cliente é criado sob demanda e reutilizado pelas chamadas seguintes; se o event
+    loop mudou, um novo cliente é criado, pois conexões do pool ficam presas ao loop.
+    '''
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = build_client()
+        _client_loop = loop
+    return _client
+
 def now_tz() -> datetime.datetime:
     try:
         tz = zoneinfo.ZoneInfo(TZ)
@@ -17,12 +176,84 @@ def now_tz() -> datetime.datetime:
         tz = zoneinfo.ZoneInfo("America/Sao_Paulo")
     return datetime.datetime.now(tz)
 
+def resolve_reference(referencia_iso: Optional[str] = None) -> str:
+    '''
+    Resolve a referência temporal usada no prompt e nas chaves de cache/coalescência.
+    Sem referência explícita usa "agora" truncado ao minuto (a granularidade da saída).
+    '''
+    if referencia_iso:
+        return referencia_iso
+    return now_tz().replace(second=0, microsecond=0).isoformat()
+
+class _Flight:
+    '''Chamada ao LLM em andamento compartilhada por requisições idênticas.'''
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+# Chamadas em andamento, indexadas por (texto normalizado, referência, modelo).
+_inflight: Dict[Tuple[str, str, str], _Flight] = {}
+
+def is_inflight(texto: str, referencia_iso: Optional[str] = None) -> bool:
+    '''Indica se uma chamada idêntica já está em andamento (e seria compartilhada).'''
+    return (texto, resolve_reference(referencia_iso), OLLAMA_MODEL) in _inflight
+
 async def extract_with_llm(texto: str, referencia_iso: Optional[str] = None) -> dict | None:
     '''
     Usa Ollama /api/chat com format=json para extrair os campos.
     Retorna dict (se JSON válido) ou None se falhar.
+
+    Requisições concorrentes com mesmo texto/referência/modelo aguardam uma única
+    chamada ao Ollama (single-flight). A chamada só é cancelada quando todas as
+    requisições que a aguardam desistem.
     '''
-    ref = referencia_iso or now_tz().isoformat()
+    ref = resolve_reference(referencia_iso)
+    key = (texto, ref, OLLAMA_MODEL)
+    flight = _inflight.get(key)
+    if flight is None:
+        flight = _Flight(asyncio.create_task(_extract_uncoalesced(texto, ref)))
+        _inflight[key] = flight
+        flight.task.add_done_callback(
+            lambda t, k=key: _inflight.pop(k) if k in _inflight and _inflight[k].task is t else None
+        )
+        leader = True
+    else:
+        LLM_COALESCED_TOTAL.inc()
+        LLM_COALESCED_WAITERS.inc()
+        leader = False
+
+    flight.waiters += 1
+    try:
+        result = await asyncio.shield(flight.task)
+    except asyncio.CancelledError:
+        if flight.waiters == 1 and not flight.task.done():
+            flight.task.cancel()
+        raise
+    finally:
+        flight.waiters -= 1
+        if not leader:
+            LLM_COALESCED_WAITERS.dec()
+    return dict(result) if isinstance(result, dict) else result
+
+# Variante compacta: todo o formato fica no system prompt, que é idêntico em todas
+# as chamadas; assim o Ollama reaproveita o prefixo já avaliado (KV cache) e o
+# conteúdo variável (referência + texto) fica no fim.
+SYS_PROMPT_COMPACT = (
+    "Extraia de um relato de incidente em português um objeto JSON com exatamente as chaves "
+    'data_ocorrencia ("YYYY-MM-DD HH:MM"), local, tipo_incidente e impacto. '
+    'Use "" para campos ausentes. Responda só o JSON.'
+)
+
+def _build_messages(texto: str, ref: str) -> list:
+    if OLLAMA_PROMPT_STYLE == "compact":
+        return [
+            {"role": "system", "content": SYS_PROMPT_COMPACT},
+            {"role": "user", "content": f"Referência: {ref}\nTexto: {texto}"},
+        ]
+
     user_prompt = (
         f"Hoje é {ref}. Leia a descrição e extraia os 4 campos. "
         "Se um campo não existir no texto, retorne string vazia para ele.\n\n"
@@ -36,36 +267,430 @@ async def extract_with_llm(texto: str, referencia_iso: Optional[str] = None) ->
         '"impacto": "string"'
         '}'
     )
+    return [
+        {"role": "system", "content": SYS_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
 
-    payload = {
+def _build_payload(texto: str, ref: str) -> dict:
+    return {
         "model": OLLAMA_MODEL,
-        "format": "json",
-        "messages": [
-            {"role": "system", "content": SYS_PROMPT},
-            {"role": "user", "content": user_prompt},
-        ],
-        "options": {"temperature": 0},
-        "stream": False,
+        # "schema": saída restrita pelo próprio INCIDENT_SCHEMA (structured outputs do Ollama)
+        "format": INCIDENT_SCHEMA if OLLAMA_FORMAT == "schema" else "json",
+        "messages": _build_messages(texto, ref),
+        "options": _options(),
+        "stream": OLLAMA_STREAM,
+        **_keep_alive(),
     }
 
-    url = f"{OLLAMA_HOST}/api/chat"
+def _keep_alive() -> dict:
+    # Mantém o modelo carregado no Ollama entre chamadas (padrão do Ollama: 5m).
+    return {"keep_alive": OLLAMA_KEEP_ALIVE} if OLLAMA_KEEP_ALIVE else {}
+
+def _options() -> dict:
+    options: dict = {"temperature": 0}
+    if OLLAMA_NUM_PREDICT > 0:
+        # Teto de tokens gerados: o objeto de 4 campos cabe folgado nisso.
+        options["num_predict"] = OLLAMA_NUM_PREDICT
+    return options
+
+def _parse_content(data: dict) -> dict | None:
+    content = data.get("message", {}).get("content") or data.get("response")
+    if not content:
+        return None
+    # tentar parsear JSON diretamente (format=json deve garantir)
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            r = await client.post(url, json=payload)
-            r.raise_for_status()
-            data = r.json()
-            content = data.get("message", {}).get("content") or data.get("response")
-            if not content:
-                return None
-            # tentar parsear JSON diretamente (format=json deve garantir)
+        return json.loads(content)
+    except json.JSONDecodeError:
+        # fallback: tentar encontrar um bloco JSON
+        m = re.search(r"\{.*\}", content, re.DOTALL)
+        if m:
             try:
-                return json.loads(content)
+                return json.loads(m.group(0))
             except json.JSONDecodeError:
-                # fallback: tentar encontrar um bloco JSON
-                import re
-                m = re.search(r"\{.*\}", content, re.DOTALL)
-                if m:
-                    return json.loads(m.group(0))
                 return None
+        return None
+
+class _JSONObjectScanner:
+    '''
+    Acompanha o texto gerado em streaming e detecta, sem re-parsear o buffer a cada
+    pedaço, quando o primeiro objeto JSON de nível superior foi fechado.
+    '''
+
+    __slots__ = ("text", "_pos", "_start", "_depth", "_in_string", "_escape")
+
+    def __init__(self) -> None:
+        self.text = ""
+        self._pos = 0
+        self._start = -1
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, piece: str) -> str | None:
+        '''Acrescenta `piece`; retorna o objeto completo assim que a chave final chega.'''
+        self.text += piece
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                if self._depth:
+                    self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch == "}" and self._depth:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._pos = i + 1
+                    return text[self._start:i + 1]
+        self._pos = len(text)
+        return None
+
+async def _stream_chat(url: str, payload: dict) -> dict:
+    '''
+    Consome o /api/chat em streaming e encerra a leitura assim que o objeto JSON
+    se fecha. Fechar a resposta derruba a conexão, o que faz o Ollama interromper
+    a geração em vez de continuar produzindo texto que será descartado.
+    '''
+    scanner = _JSONObjectScanner()
+    async with get_client().stream("POST", url, json=payload) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            piece = chunk.get("message", {}).get("content") or chunk.get("response") or ""
+            obj = scanner.feed(piece)
+            if obj is not None:
+                if not chunk.get("done"):
+                    LLM_STREAM_EARLY_STOP.inc()
+                return {**chunk, "message": {"content": obj}}
+            if chunk.get("done"):
+                return {**chunk, "message": {"content": scanner.text}}
+    return {"message": {"content": scanner.text}}
+
+async def _send_chat(url: str, payload: dict) -> dict:
+    if payload.get("stream"):
+        return await _stream_chat(url, payload)
+    r = await get_client().post(url, json=payload)
+    r.raise_for_status()
+    return r.json()
+
+async def preload_model(backend: Backend, timeout: float) -> bool:
+    '''
+    Carrega o modelo do `backend` na memória do Ollama (chat sem mensagens), para
+    que a primeira extração não pague o carregamento. Retorna se deu certo.
+    '''
+    payload = {"model": backend.model, "messages": [], **_keep_alive()}
+    try:
+        r = await get_client().post(f"{backend.url}/api/chat", json=payload, timeout=timeout)
+        r.raise_for_status()
+        return True
+    except Exception as exc:
+        logger.warning("ollama_preload_failed", extra={"backend": backend.url, "error": repr(exc)})
+        return False
+
+def llm_timeout(backend: Backend) -> float:
+    '''
+    Timeout total de uma chamada ao `backend`: múltiplo do percentil recente de
+    latência (LLM_TIMEOUT_PERCENTILE × LLM_TIMEOUT_MULTIPLIER), limitado entre
+    LLM_TIMEOUT_MIN e LLM_TIMEOUT_MAX. Sem amostras suficientes usa o máximo.
+    '''
+    timeout = LLM_TIMEOUT_MAX
+    tracker = backend_pool.latency
+    if LLM_TIMEOUT_ADAPTIVE and tracker.count(backend.key) >= LLM_TIMEOUT_MIN_SAMPLES:
+        pct = tracker.percentile(backend.key, LLM_TIMEOUT_PERCENTILE)
+        timeout = min(LLM_TIMEOUT_MAX, max(LLM_TIMEOUT_MIN, pct * LLM_TIMEOUT_MULTIPLIER))
+    LLM_TIMEOUT_SECONDS.labels(backend.url).set(timeout)
+    return timeout
+
+def current_llm_timeout() -> float:
+    '''
+    Maior tempo que uma extração pode levar, para quem espera o resultado de fora.
+    Com micro-batching inclui a janela do lote, a geração de um lote cheio (cujo
+    timeout escala com o tamanho) e o refazimento individual de itens inválidos.
+    '''
+    timeout = max(llm_timeout(b) for b in backend_pool.backends)
+    if LLM_BATCH_ENABLED and LLM_BATCH_MAX_SIZE > 1:
+        return LLM_BATCH_WINDOW_MS / 1000.0 + timeout * LLM_BATCH_MAX_SIZE + timeout
+    return timeout
+
+def _hedge_delay(backend: Backend) -> float | None:
+    if not LLM_HEDGE_ENABLED or len(backend_pool.backends) < 2:
+        return None
+    if backend_pool.latency.count(backend.key) < LLM_TIMEOUT_MIN_SAMPLES:
+        return None
+    return backend_pool.latency.percentile(backend.key, LLM_HEDGE_PERCENTILE)
+
+async def _call_backend(backend: Backend, payload: dict, batch_size: int = 1) -> dict:
+    # Um lote de N incidentes gera ~N vezes mais tokens: o timeout escala com o
+    # tamanho e a duração não entra na janela de latência das chamadas individuais.
+    timeout = llm_timeout(backend) * batch_size
+    single = batch_size == 1
+    started = backend_pool.acquire(backend)
+    ok = None
+    try:
+        data = await asyncio.wait_for(
+            _send_chat(f"{backend.url}/api/chat", {**payload, "model": backend.model}), timeout
+        )
+        ok = True
+        return data
+    except asyncio.CancelledError:
+        raise
+    except asyncio.TimeoutError:
+        ok = False
+        # Estouro entra na janela como amostra censurada, para o timeout não encolher
+        # só porque as chamadas lentas foram cortadas.
+        if single:
+            backend_pool.latency.record(backend.key, timeout)
+        raise
     except Exception:
+        ok = False
+        raise
+    finally:
+        backend_pool.release(backend, started, ok, track_latency=single)
+
+async def _first_success(tasks: List[asyncio.Task]) -> Tuple[asyncio.Task, dict]:
+    '''Retorna a primeira task bem-sucedida (cancelando as demais) ou propaga o último erro.'''
+    pending = set(tasks)
+    error: BaseException | None = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task, task.result()
+                error = task.exception()
+        assert error is not None
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def _post_chat(payload: dict, batch_size: int = 1) -> dict:
+    '''
+    Envia a requisição ao backend do Ollama com menos requisições em andamento;
+    erros de rede/HTTP são propagados. Com hedging, se a resposta passar do p95
+    recente do backend, uma segunda requisição vai para outro backend e vale a
+    que terminar primeiro. Lotes não são duplicados: o p95 é de chamadas individuais.
+    '''
+    primary = backend_pool.choose()
+    delay = _hedge_delay(primary) if batch_size == 1 else None
+    if delay is None:
+        return await _call_backend(primary, payload, batch_size)
+
+    first = asyncio.create_task(_call_backend(primary, payload))
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+    except asyncio.CancelledError:
+        first.cancel()
+        raise
+    secondary = None if done else backend_pool.choose(exclude=[primary])
+    if secondary is None:
+        return await first
+
+    LLM_HEDGED.labels("sent").inc()
+    hedge = asyncio.create_task(_call_backend(secondary, payload))
+    winner, data = await _first_success([first, hedge])
+    LLM_HEDGED.labels("hedge_won" if winner is hedge else "primary_won").inc()
+    return data
+
+def _observe_usage(data: dict) -> None:
+    '''Registra contagem de tokens e tempos reportados pelo Ollama (quando presentes).'''
+    if "prompt_eval_count" in data:
+        LLM_PROMPT_TOKENS.observe(data["prompt_eval_count"])
+    if "eval_count" in data:
+        LLM_EVAL_TOKENS.observe(data["eval_count"])
+    if "eval_duration" in data:
+        LLM_EVAL_DURATION.observe(data["eval_duration"] / 1e9)
+    if "prompt_eval_duration" in data:
+        LLM_PROMPT_EVAL_DURATION.observe(data["prompt_eval_duration"] / 1e9)
+
+async def _call_llm(payload: dict, batch_size: int = 1) -> dict | None:
+    '''
+    Chamada ao /api/chat protegida pelo circuit breaker. Retorna a resposta do
+    Ollama ou None se o circuito estiver aberto ou a chamada falhar. Para um lote
+    de `batch_size` incidentes, timeout e limite de chamada lenta escalam com o tamanho.
+    '''
+    # Com o circuito aberto, nem tenta: o chamador segue só com as regras.
+    if llm_breaker is not None and not llm_breaker.allow_request():
+        return None
+
+    start = time.perf_counter()
+    try:
+        data = await _post_chat(payload, batch_size)
+    except asyncio.CancelledError:
+        if llm_breaker is not None:
+            # Quem desistiu depois do limite de chamada lenta esperou um Ollama travado:
+            # conta como falha, senão prazos curtos nunca deixariam o circuito abrir.
+            if (time.perf_counter() - start) / batch_size > llm_breaker.slow_call_seconds:
+                llm_breaker.record_failure()
+            else:
+                llm_breaker.release()
+        raise
+    except Exception:
+        if llm_breaker is not None:
+            llm_breaker.record_failure()
         return None
+
+    if llm_breaker is not None:
+        # Duração por incidente, comparada ao `slow_call_seconds` de uma chamada individual.
+        llm_breaker.record_success((time.perf_counter() - start) / batch_size)
+    _observe_usage(data)
+    return data
+
+async def _extract_single(texto: str, ref: str) -> dict | None:
+    data = await _call_llm(_build_payload(texto, ref))
+    # Resposta sem JSON válido não indica indisponibilidade do Ollama.
+    return _parse_content(data) if data is not None else None
+
+SYS_PROMPT_BATCH = (
+    "Você é um extrator de informações. "
+    "Você receberá vários incidentes numerados, em português. Para cada um, extraia EXATAMENTE os campos: "
+    'data_ocorrencia ("YYYY-MM-DD HH:MM"), local, tipo_incidente, impacto; use "" para campos ausentes. '
+    'Responda SOMENTE um objeto JSON {"resultados": [...]} com um objeto por incidente, na mesma ordem.'
+)
+
+def _build_batch_payload(itens: List[Tuple[str, str]]) -> dict:
+    partes = [
+        f"Incidente {n} (referência: {ref}):\n{texto}"
+        for n, (texto, ref) in enumerate(itens, start=1)
+    ]
+    user_prompt = f"{len(itens)} incidentes:\n\n" + "\n\n".join(partes)
+    if OLLAMA_FORMAT == "schema":
+        item_schema = {k: v for k, v in INCIDENT_SCHEMA.items() if k not in ("$schema", "title")}
+        fmt: Any = {
+            "type": "object",
+            "required": ["resultados"],
+            "properties": {
+                "resultados": {
+                    "type": "array",
+                    "items": item_schema,
+                    "minItems": len(itens),
+                    "maxItems": len(itens),
+                }
+            },
+        }
+    else:
+        fmt = "json"
+    options = _options()
+    if "num_predict" in options:
+        options["num_predict"] *= len(itens)
+    return {
+        "model": OLLAMA_MODEL,
+        "format": fmt,
+        "messages": [
+            {"role": "system", "content": SYS_PROMPT_BATCH},
+            {"role": "user", "content": user_prompt},
+        ],
+        "options": options,
+        "stream": OLLAMA_STREAM,
+        **_keep_alive(),
+    }
+
+def _split_batch(data: dict | None, size: int) -> List[dict | None]:
+    '''Separa a resposta em lote por item; itens fora do schema viram None.'''
+    parsed = _parse_content(data) if data is not None else None
+    resultados = parsed.get("resultados") if isinstance(parsed, dict) else None
+    if not isinstance(resultados, list):
+        return [None] * size
+    out: List[dict | None] = []
+    for i in range(size):
+        item = resultados[i] if i < len(resultados) else None
+        try:
+            validate_incident_payload(item)
+        except ValidationError:
+            item = None
+        out.append(item)
+    return out
+
+class _MicroBatcher:
+    '''
+    Junta requisições que chegam dentro de uma janela curta (ou até `max_size`) e
+    as envia numa única geração pedindo um array de objetos. Itens que voltarem
+    inválidos são refeitos individualmente. Deve ser usado a partir do event loop.
+    '''
+
+    def __init__(self, window_seconds: float, max_size: int):
+        self.window_seconds = window_seconds
+        self.max_size = max(1, max_size)
+        self._pending: List[Tuple[str, str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set = set()
+
+    async def submit(self, texto: str, ref: str) -> dict | None:
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((texto, ref, fut))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window_seconds, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        lote, self._pending = self._pending, []
+        if lote:
+            task = asyncio.create_task(self._run(lote))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            # Se todos que aguardam o lote desistirem, a geração não tem mais leitor.
+            futuros = [fut for _, _, fut in lote]
+            for fut in futuros:
+                fut.add_done_callback(
+                    lambda _, fs=futuros, t=task: t.cancel() if all(f.cancelled() for f in fs) else None
+                )
+
+    async def _run(self, lote: List[Tuple[str, str, asyncio.Future]]) -> None:
+        try:
+            LLM_BATCH_SIZE.observe(len(lote))
+            if len(lote) == 1:
+                texto, ref, _ = lote[0]
+                resultados = [await _extract_single(texto, ref)]
+            else:
+                data = await _call_llm(_build_batch_payload([(t, r) for t, r, _ in lote]), len(lote))
+                resultados = _split_batch(data, len(lote))
+                # Falha parcial: refaz só os itens que faltaram, um a um.
+                refazer = [i for i, item in enumerate(resultados) if item is None]
+                if refazer and data is not None:
+                    LLM_BATCH_FALLBACK.inc(len(refazer))
+                    refeitos = await asyncio.gather(
+                        *(_extract_single(lote[i][0], lote[i][1]) for i in refazer)
+                    )
+                    for i, item in zip(refazer, refeitos):
+                        resultados[i] = item
+        except Exception as exc:
+            for _, _, fut in lote:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+        for (_, _, fut), item in zip(lote, resultados):
+            if not fut.done():
+                fut.set_result(item)
+
+_batcher: _MicroBatcher | None = None
+_batcher_loop: asyncio.AbstractEventLoop | None = None
+
+def _get_batcher() -> _MicroBatcher:
+    global _batcher, _batcher_loop
+    loop = asyncio.get_running_loop()
+    if _batcher is None or _batcher_loop is not loop:
+        _batcher = _MicroBatcher(LLM_BATCH_WINDOW_MS / 1000.0, LLM_BATCH_MAX_SIZE)
+        _batcher_loop = loop
+    return _batcher
+
+async def _extract_uncoalesced(texto: str, ref: str) -> dict | None:
+    if LLM_BATCH_ENABLED:
+        return await _get_batcher().submit(texto, ref)
+    return await _extract_single(texto, ref)
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import csv
+import json
 import re
-import unicodedata
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+from .settings import LOCALITIES_GAZETTEER_PATH
+from .text_utils import TOKEN_RE, normalize_text
 
-LOCALITY_DICTIONARY: List[Dict[str, str]] = [
+
+LOCALITY_DICTIONARY: List[Dict[str, Any]] = [
     {"name": "São Paulo", "uf": "SP", "aliases": ["sao paulo", "sp", "sampa"]},
     {"name": "Rio de Janeiro", "uf": "RJ", "aliases": ["rio de janeiro", "rj", "rio"]},
     {"name": "Belo Horizonte", "uf": "MG", "aliases": ["belo horizonte", "bh", "bhz"]},
@@ -23,50 +27,146 @@ LOCALITY_DICTIONARY: List[Dict[str, str]] = [
     {"name": "Belém", "uf": "PA", "aliases": ["belem"]},
 ]
 
+_CAPITALIZED_RE = re.compile(r"\b(?:[A-ZÁÉÍÓÚÂÊÔÃÕÇ][\wÁÉÍÓÚÂÊÔÃÕÇãõçáéíóúâêôç-]+(?:\s+|$)){1,3}")
+# Preposição imediatamente antes de uma entidade (buscada com `endpos` no início dela).
+_PREPOSITION_BEFORE_RE = re.compile(r"\b(?:no|na|em)\s+$", re.IGNORECASE)
 
-def _normalize(text: str) -> str:
-    normalized = unicodedata.normalize("NFD", text)
-    normalized = "".join(ch for ch in normalized if unicodedata.category(ch) != "Mn")
-    return normalized.lower()
+# Chave do nó da trie que guarda (rótulo, tamanho do alias) quando um alias termina ali.
+_TERMINAL = ""
 
 
-def _match_dictionary(texto: str) -> Optional[str]:
-    norm = _normalize(texto)
-    best_match = None
+class LocalityIndex:
+    """
+    Índice de localidades em trie de tokens, construído uma única vez. Os aliases
+    são normalizados (sem acento, minúsculos) e quebrados em palavras; a busca faz
+    uma passada sobre as palavras do texto e retorna o alias mais longo encontrado
+    (empate: o que aparece primeiro no texto). Equivale a procurar `\\balias\\b`
+    para cada alias, mas com custo independente do tamanho do dicionário.
+    """
+
+    def __init__(self) -> None:
+        self._root: Dict[str, dict] = {}
+        self.size = 0
+
+    def add(self, alias: str, label: str) -> None:
+        tokens = TOKEN_RE.findall(normalize_text(alias))
+        if not tokens:
+            return
+        node = self._root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        # Primeira definição de um alias prevalece (dicionário embutido antes do gazetteer).
+        if _TERMINAL not in node:
+            node[_TERMINAL] = (label, len(" ".join(tokens)))
+            self.size += 1
+
+    def add_entry(self, entry: Dict[str, Any]) -> None:
+        name = entry["name"]
+        uf = entry.get("uf") or ""
+        label = f"{name} ({uf})" if uf else name
+        for alias in list(entry.get("aliases") or []) + [name]:
+            self.add(alias, label)
+
+    def match(self, texto: str) -> Optional[str]:
+        tokens = TOKEN_RE.findall(normalize_text(texto))
+        best_label, best_len = None, 0
+        root = self._root
+        for start in range(len(tokens)):
+            node = root.get(tokens[start])
+            pos = start
+            while node is not None:
+                terminal = node.get(_TERMINAL)
+                if terminal is not None and terminal[1] > best_len:
+                    best_label, best_len = terminal
+                pos += 1
+                if pos >= len(tokens):
+                    break
+                node = node.get(tokens[pos])
+        return best_label
+
+
+def load_gazetteer(path: str) -> List[Dict[str, Any]]:
+    """
+    Carrega localidades extras de um arquivo JSON (lista de objetos com `name`,
+    `uf` e `aliases`) ou CSV (colunas `name`/`nome`/`municipio`, `uf`/`sigla_uf`
+    e `aliases` separados por `|`). Serve para a lista de municípios do IBGE,
+    bairros ou nomes de escritórios/sites.
+    """
+    if path.lower().endswith(".json"):
+        with open(path, encoding="utf-8") as fh:
+            return [
+                {"name": e["name"], "uf": e.get("uf", ""), "aliases": e.get("aliases", [])}
+                for e in json.load(fh)
+            ]
+
+    entries: List[Dict[str, Any]] = []
+    with open(path, encoding="utf-8", newline="") as fh:
+        for row in csv.DictReader(fh):
+            row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+            name = row.get("name") or row.get("nome") or row.get("municipio")
+            if not name:
+                continue
+            aliases = [a.strip() for a in row.get("aliases", "").split("|") if a.strip()]
+            entries.append({"name": name, "uf": row.get("uf") or row.get("sigla_uf", ""), "aliases": aliases})
+    return entries
+
+
+def build_locality_index(gazetteer_path: str = LOCALITIES_GAZETTEER_PATH) -> LocalityIndex:
+    index = LocalityIndex()
     for entry in LOCALITY_DICTIONARY:
-        for alias in entry["aliases"] + [entry["name"]]:
-            alias_norm = _normalize(alias)
-            if re.search(rf"\b{re.escape(alias_norm)}\b", norm):
-                candidate = f"{entry['name']} ({entry['uf']})"
-                if not best_match or len(alias_norm) > len(_normalize(best_match)):
-                    best_match = candidate
-    return best_match
+        index.add_entry(entry)
+    if gazetteer_path:
+        for entry in load_gazetteer(gazetteer_path):
+            index.add_entry(entry)
+    return index
 
 
-def _simple_capitalized_entities(texto: str) -> List[str]:
-    pattern = re.compile(r"\b(?:[A-ZÁÉÍÓÚÂÊÔÃÕÇ][\wÁÉÍÓÚÂÊÔÃÕÇãõçáéíóúâêôç-]+(?:\s+|$)){1,3}")
-    return [m.group(0).strip() for m in pattern.finditer(texto)]
+_index: LocalityIndex | None = None
 
 
-def detect_localidade(texto: str) -> str:
+def get_locality_index() -> LocalityIndex:
+    """Índice global, construído na primeira chamada (ou no import do app)."""
+    global _index
+    if _index is None:
+        _index = build_locality_index()
+    return _index
+
+
+def _match_dictionary(texto: str) -> Optional[str]:
+    return get_locality_index().match(texto)
+
+
+def _simple_capitalized_entities(texto: str) -> List[Tuple[str, int]]:
+    return [(m.group(0).strip(), m.start()) for m in _CAPITALIZED_RE.finditer(texto)]
+
+
+def detect_localidade_scored(texto: str) -> Tuple[str, float]:
     """
-    Detecta localidades usando dicionário estático e um NER leve baseado em padrões
-    de palavras capitalizadas. Retorna string vazia se nada for encontrado.
+    Igual a `detect_localidade`, mas retorna também a confiança da detecção:
+    1.0 para o dicionário, 0.5 para entidade após preposição e 0.3 para a
+    primeira palavra capitalizada (frequentemente um falso positivo).
     """
     if not texto:
-        return ""
+        return "", 0.0
 
     dic_match = _match_dictionary(texto)
     if dic_match:
-        return dic_match
+        return dic_match, 1.0
 
     entities = _simple_capitalized_entities(texto)
     if entities:
         # Prioriza a primeira entidade após preposições comuns.
-        for ent in entities:
-            if re.search(rf"\b(?:no|na|em)\s+{re.escape(ent)}\b", texto, re.IGNORECASE):
-                return ent
-        return entities[0]
+        for ent, start in entities:
+            if _PREPOSITION_BEFORE_RE.search(texto, max(0, start - 8), start):
+                return ent, 0.5
+        return entities[0][0], 0.3
+
+    return "", 0.0
 
-    return ""
 
+def detect_localidade(texto: str) -> str:
+    """
+    Detecta localidades usando dicionário estático e um NER leve baseado em padrões
+    de palavras capitalizadas. Retorna string vazia se nada for encontrado.
+    """
+    return detect_localidade_scored(texto)[0]
@@ -1,19 +1,30 @@
 from __future__ import annotations
 
+import atexit
 import json
 import logging
+import logging.handlers
 import os
+import queue
 import sys
 from datetime import datetime, timezone
 from typing import Any, Dict
 
+from .settings import LOG_ASYNC
+
+# Atributos padrão do LogRecord; o que sobrar em record.__dict__ veio de `extra`.
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str)
+
 
 class JSONFormatter(logging.Formatter):
     """Formatter that renders log records as single-line JSON strings."""
 
     def format(self, record: logging.LogRecord) -> str:  # pragma: no cover - formatting only
         log: Dict[str, Any] = {
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            # Instante do evento, não da formatação (que pode ocorrer depois, em outra thread).
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
             "level": record.levelname.lower(),
             "message": record.getMessage(),
             "logger": record.name,
@@ -21,35 +32,23 @@ class JSONFormatter(logging.Formatter):
 
         # Capture optional contextual fields
         for key, value in record.__dict__.items():
-            if key in {
-                "name",
-                "msg",
-                "args",
-                "levelname",
-                "levelno",
-                "pathname",
-                "filename",
-                "module",
-                "exc_info",
-                "exc_text",
-                "stack_info",
-                "lineno",
-                "funcName",
-                "created",
-                "msecs",
-                "relativeCreated",
-                "thread",
-                "threadName",
-                "processName",
-                "process",
-            }:
-                continue
-            log[key] = value
+            if key not in _RESERVED_ATTRS:
+                log[key] = value
 
         if record.exc_info:
             log["error"] = self.formatException(record.exc_info)
 
-        return json.dumps(log, ensure_ascii=False)
+        return _encoder.encode(log)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enfileira o LogRecord sem formatá-lo: a mensagem, o JSON e o traceback são
+    montados na thread do QueueListener, fora do event loop.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
 
 
 def configure_logging() -> logging.Logger:
@@ -61,7 +60,15 @@ def configure_logging() -> logging.Logger:
     handler = logging.StreamHandler(sys.stdout)
     handler.setFormatter(JSONFormatter())
     logger.setLevel(level)
-    logger.addHandler(handler)
     logger.propagate = False
-    return logger
 
+    if LOG_ASYNC:
+        # Formatação e escrita no stdout numa thread de fundo.
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        logger.addHandler(_DeferredQueueHandler(log_queue))
+    else:
+        logger.addHandler(handler)
+    return logger
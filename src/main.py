@@ -1,74 +1,146 @@
 from __future__ import annotations
 
 import asyncio
+import json
+import logging
+import os
+import random
 import time
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from jsonschema import ValidationError
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
-from starlette.requests import Request
-
-from .models import IncidentRequest, IncidentResponse
-from .preprocess import preprocess_text
-from .llm_client import extract_with_llm
-from .extractors import fallback_extract, merge_dicts
-from .settings import APP_PORT, TZ
-from .schema import validate_incident_payload
-from .logging_utils import configure_logging
-
-logger = configure_logging()
+from pydantic import ValidationError as RequestValidationError
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
 
-REQUEST_COUNT = Counter(
-    "incidente_llm_api_requests_total",
-    "Total de requisições HTTP",
-    labelnames=("method", "path", "status"),
+from .models import (
+    BatchIncidentRequest,
+    BatchIncidentResponse,
+    IncidentRequest,
+    IncidentResponse,
+    JobStatus,
 )
-REQUEST_LATENCY = Histogram(
-    "incidente_llm_api_request_duration_seconds",
-    "Duração das requisições HTTP",
-    labelnames=("method", "path"),
+from .llm_client import get_client, close_client, llm_breaker
+from .backends import backend_pool
+from .rules_executor import get_rules_executor, shutdown_rules_executor
+from .settings import (
+    APP_PORT,
+    TZ,
+    BATCH_CONCURRENCY,
+    BATCH_MAX_ITEMS,
+    JOBS_MAX_ITEMS,
+    JOBS_PAGE_SIZE,
+    LOG_EXTRACTION_SAMPLE_RATE,
+    OVERLOAD_RETRY_AFTER,
+    PROFILE_ENABLED,
+    PROMETHEUS_MULTIPROC_DIR,
+    SERVER_TIMING_ENABLED,
+    WARMUP_ENABLED,
+    WARMUP_ON_IMPORT,
+)
+from .admission import Overloaded
+from .cache import close_extraction_cache, get_extraction_cache
+from .jobs import (
+    TooManyItems,
+    get_job_store,
+    job_status,
+    notify_job_workers,
+    parse_job_body,
+    start_job_workers,
+    stop_job_workers,
+)
+from .pipeline import extract_many, run_extraction, stage
+from .profiling import RequestProfile, get_profile, list_profiles, should_profile
+from .tracing import server_timing, trace
+from .logging_utils import configure_logging
+from .middleware import MetricsMiddleware
+from .warmup import (
+    is_ready,
+    record_first_request,
+    run_warmup,
+    warm_before_fork,
+    warm_cpu_state,
+    warmup_status,
 )
 
-app = FastAPI(title="Incidente LLM API", version="1.1.0")
+logger = configure_logging()
 
+if WARMUP_ON_IMPORT:
+    # Com gunicorn --preload o import acontece no master, antes do fork dos workers.
+    warm_before_fork()
 
-@app.middleware("http")
-async def metrics_and_logging(request: Request, call_next):
-    start = time.perf_counter()
-    path = request.url.path
-    method = request.method
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # Cliente HTTP do Ollama compartilhado (pool + keep-alive) durante toda a vida do app.
+    get_client()
+    # Pool das heurísticas criado antes de receber tráfego.
+    get_rules_executor()
+    get_extraction_cache()
+    if WARMUP_ENABLED:
+        # Índices e dateparser prontos antes de aceitar conexões (no-op se já aquecido no import).
+        warm_cpu_state()
+    backend_pool.start_health_checks(get_client)
+    # Jobs pendentes (inclusive de antes de um reinício) voltam a ser processados.
+    start_job_workers()
+    # Modelo do Ollama e pool de processos aquecem em background; /readyz responde ao final.
+    warmup_task = asyncio.create_task(run_warmup(started))
     try:
-        response = await call_next(request)
-        status = response.status_code
-    except Exception:
-        status = 500
-        REQUEST_COUNT.labels(method, path, str(status)).inc()
-        logger.exception("request_error", extra={"path": path, "method": method})
-        raise
-
-    duration = time.perf_counter() - start
-    REQUEST_COUNT.labels(method, path, str(status)).inc()
-    REQUEST_LATENCY.labels(method, path).observe(duration)
-    logger.info(
-        "request_completed",
-        extra={
-            "path": path,
-            "method": method,
-            "status": status,
-            "duration_ms": round(duration * 1000, 2),
-        },
-    )
-    return response
+        yield
+    finally:
+        warmup_task.cancel()
+        try:
+            await warmup_task
+        except asyncio.CancelledError:
+            pass
+        await stop_job_workers()
+        await backend_pool.stop_health_checks()
+        await close_client()
+        shutdown_rules_executor()
+        close_extraction_cache()
+        if PROMETHEUS_MULTIPROC_DIR:
+            # Descarta os gauges "live*" deste worker; contadores continuam somados.
+            multiprocess.mark_process_dead(os.getpid())
+
+
+app = FastAPI(title="Incidente LLM API", version="1.1.0", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/healthz")
 async def healthz():
-    return {"status": "ok", "tz": TZ, "app_port": APP_PORT}
+    llm_circuit = llm_breaker.state if llm_breaker is not None else "disabled"
+    return {
+        "status": "ok",
+        "tz": TZ,
+        "app_port": APP_PORT,
+        "llm_circuit": llm_circuit,
+        "llm_backends": backend_pool.snapshot(),
+        "ready": is_ready(),
+    }
+
+
+@app.get("/readyz")
+async def readyz():
+    """Prontidão: 200 só depois do aquecimento (modelo carregado, regras e índices prontos)."""
+    status = warmup_status()
+    return JSONResponse(content=status, status_code=200 if status["ready"] else 503)
+
+
+def _metrics_registry():
+    """Com vários workers, agrega os arquivos de todos (o registro global só tem este processo)."""
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
 
 
 @app.get("/metrics")
 async def metrics():
-    return PlainTextResponse(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    return PlainTextResponse(generate_latest(_metrics_registry()), media_type=CONTENT_TYPE_LATEST)
 
 
 @app.get("/example")
@@ -80,33 +152,194 @@ async def example():
     return {"texto": texto}
 
 
+def _deadline_from_header(deadline_ms: Optional[int]) -> Optional[float]:
+    """Converte o orçamento em ms enviado pelo cliente num instante de `time.monotonic()`."""
+    if deadline_ms is None:
+        return None
+    return time.monotonic() + max(deadline_ms, 0) / 1000.0
+
+
+def _sample_extraction_log() -> bool:
+    """O payload completo por requisição pesa em RPS alto: loga só uma amostra."""
+    if not logger.isEnabledFor(logging.INFO):
+        return False
+    return LOG_EXTRACTION_SAMPLE_RATE >= 1.0 or random.random() < LOG_EXTRACTION_SAMPLE_RATE
+
+
 @app.post("/extract", response_model=IncidentResponse)
-async def extract(payload: IncidentRequest):
-    # 1) Preprocess
-    texto = preprocess_text(payload.texto)
+async def extract(
+    payload: IncidentRequest,
+    deadline_ms: Optional[int] = Header(default=None, alias="X-Request-Deadline-Ms"),
+    profile: Optional[str] = Header(default=None, alias="X-Profile"),
+):
+    start = time.perf_counter()
+    profiler = RequestProfile() if should_profile(profile) else None
+    if profiler is not None and not profiler.start():
+        profiler = None  # já há outra requisição sendo perfilada
+    profile_id = None
+    with trace() as spans:
+        try:
+            outcome = await run_extraction(
+                payload.texto, payload.referencia_datahora, _deadline_from_header(deadline_ms)
+            )
+        except ValidationError:
+            raise HTTPException(status_code=422, detail="Resposta não atende ao schema JSON")
+        except Overloaded as exc:
+            raise HTTPException(
+                status_code=503,
+                detail="LLM sobrecarregado, tente novamente",
+                headers={"Retry-After": str(OVERLOAD_RETRY_AFTER)},
+            ) from exc
+        finally:
+            if profiler is not None:
+                profile_id = profiler.finish("/extract", spans)
+
+        if _sample_extraction_log():
+            logger.info(
+                "extraction_completed",
+                extra={"has_llm": outcome.has_llm, "cached": outcome.cached, "payload": outcome.payload},
+            )
+        with stage("serialization"):
+            response = JSONResponse(content=outcome.payload, status_code=200)
 
-    # 2) LLM
-    llm_task = extract_with_llm(texto, payload.referencia_datahora)
+    elapsed = time.perf_counter() - start
+    record_first_request(elapsed)
+    if SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = server_timing(spans, elapsed)
+    if profile_id is not None:
+        response.headers["X-Profile-Id"] = str(profile_id)
+    return response
 
-    # 3) Fallback por regras
-    rb = fallback_extract(texto, payload.referencia_datahora)
 
-    # 4) Tenta primeiro o LLM (com timeout)
-    try:
-        llm = await asyncio.wait_for(llm_task, timeout=35.0)
-    except asyncio.TimeoutError:
-        llm = None
+def _batch_item(index: int, result) -> dict:
+    if isinstance(result, ValidationError):
+        return {"index": index, "result": None, "error": "Resposta não atende ao schema JSON"}
+    if isinstance(result, Overloaded):
+        return {"index": index, "result": None, "error": "LLM sobrecarregado, tente novamente"}
+    if isinstance(result, Exception):
+        logger.error("batch_item_failed", extra={"index": index, "error": repr(result)})
+        return {"index": index, "result": None, "error": "Falha interna na extração"}
+    return {"index": index, "result": result.payload, "error": None}
+
+
+def _check_batch_size(payload: BatchIncidentRequest) -> None:
+    if len(payload.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413, detail=f"Lote excede o limite de {BATCH_MAX_ITEMS} itens"
+        )
+
+
+@app.post("/extract/batch", response_model=BatchIncidentResponse)
+async def extract_batch(payload: BatchIncidentRequest):
+    _check_batch_size(payload)
+    results = [_batch_item(i, r) async for i, r in extract_many(payload.items, BATCH_CONCURRENCY)]
+    results.sort(key=lambda item: item["index"])
+    logger.info("batch_completed", extra={"items": len(results)})
+    return JSONResponse(content={"results": results}, status_code=200)
+
+
+@app.post("/extract/batch/stream")
+async def extract_batch_stream(payload: BatchIncidentRequest):
+    """Mesmo que /extract/batch, mas devolve uma linha NDJSON por item assim que fica pronto."""
+    _check_batch_size(payload)
+
+    async def lines():
+        async for index, result in extract_many(payload.items, BATCH_CONCURRENCY):
+            yield json.dumps(_batch_item(index, result), ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def _job_store():
+    store = get_job_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="Jobs desabilitados (defina JOBS_DB_PATH)")
+    return store
 
-    final = merge_dicts(llm or {}, rb or {})
 
+async def _read_job_items(request: Request) -> list:
+    body = await request.body()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
     try:
-        validate_incident_payload(final)
-    except ValidationError as exc:
-        logger.warning("schema_validation_failed", extra={"error": str(exc), "payload": final})
-        raise HTTPException(status_code=422, detail="Resposta não atende ao schema JSON")
+        # Decodificar e validar milhares de itens bloquearia o event loop.
+        return await asyncio.to_thread(parse_job_body, body, content_type, JOBS_MAX_ITEMS)
+    except TooManyItems as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Corpo deve estar em UTF-8")
+    except RequestValidationError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors(include_url=False, include_context=False))
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+
+@app.post("/jobs", status_code=202, response_model=JobStatus)
+async def create_job(request: Request):
+    """
+    Enfileira um lote grande para processamento em background. Aceita JSON
+    (`{"items": [...]}`) ou NDJSON (`Content-Type: application/x-ndjson`, uma linha
+    `{"texto", "referencia_datahora", "id"}` por item, ex.: `curl --data-binary @arquivo`).
+    """
+    store = _job_store()
+    items = await _read_job_items(request)
+    if not items:
+        raise HTTPException(status_code=422, detail="Job sem itens")
+    job = await asyncio.to_thread(store.create_job, items)
+    notify_job_workers()
+    logger.info("job_created", extra={"job_id": job["id"], "items": job["total"]})
+    return JSONResponse(
+        content={**job, "status": job_status(job)},
+        status_code=202,
+        headers={"Location": f"/jobs/{job['id']}"},
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=JOBS_PAGE_SIZE, ge=0, le=max(JOBS_PAGE_SIZE, 1000)),
+):
+    """Progresso do job e uma página de resultados já concluídos (`offset`/`limit` sobre `index`)."""
+    store = _job_store()
+    job = await asyncio.to_thread(store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    results = await asyncio.to_thread(store.results, job_id, offset, limit) if limit else []
+    next_offset = results[-1]["index"] + 1 if len(results) == limit and limit else None
+    return {**job, "status": job_status(job), "results": results, "next_offset": next_offset}
+
+
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str, offset: int = Query(default=0, ge=0)):
+    """Todos os resultados já concluídos em NDJSON, lidos do SQLite em páginas."""
+    store = _job_store()
+    if await asyncio.to_thread(store.get_job, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+
+    async def lines():
+        start = offset
+        while True:
+            page = await asyncio.to_thread(store.results, job_id, start, JOBS_PAGE_SIZE)
+            for line in page:
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+            if len(page) < JOBS_PAGE_SIZE:
+                return
+            start = page[-1]["index"] + 1
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/debug/profiles")
+async def debug_profiles():
+    if not PROFILE_ENABLED:
+        raise HTTPException(status_code=404, detail="Perfilamento desabilitado")
+    return {"profiles": list_profiles()}
 
-    # Garante chaves esperadas
-    resp = IncidentResponse(**final)
-    logger.info("extraction_completed", extra={"has_llm": bool(llm), "payload": resp.model_dump()})
-    return JSONResponse(content=resp.model_dump(), status_code=200)
 
+@app.get("/debug/profiles/{profile_id}")
+async def debug_profile(profile_id: int):
+    found = get_profile(profile_id) if PROFILE_ENABLED else None
+    if found is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    return PlainTextResponse(str(found["report"]))
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Awaitable, Callable, MutableMapping
+
+from prometheus_client import Counter, Histogram
+
+from .settings import METRICS_LATENCY_BUCKETS
+
+logger = logging.getLogger("incidente_llm_api")
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+# Rótulo fixo para caminhos sem rota (404 de varreduras não criam séries novas).
+UNMATCHED_ROUTE = "<unmatched>"
+
+REQUEST_COUNT = Counter(
+    "incidente_llm_api_requests_total",
+    "Total de requisições HTTP",
+    labelnames=("method", "path", "status"),
+)
+REQUEST_LATENCY = Histogram(
+    "incidente_llm_api_request_duration_seconds",
+    "Duração das requisições HTTP",
+    labelnames=("method", "path"),
+    buckets=METRICS_LATENCY_BUCKETS,
+)
+REQUEST_TTFB = Histogram(
+    "incidente_llm_api_request_ttfb_seconds",
+    "Tempo até o início da resposta HTTP (status e cabeçalhos enviados)",
+    labelnames=("method", "path"),
+    buckets=METRICS_LATENCY_BUCKETS,
+)
+
+
+def route_template(scope: Scope) -> str:
+    """Template da rota que atendeu a requisição (ex.: `/debug/profiles/{profile_id}`)."""
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path if isinstance(path, str) else UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI puro de métricas e log por requisição. Diferente do
+    `BaseHTTPMiddleware`, não cria tasks nem streams intermediários: apenas observa
+    as mensagens `http.response.start`/`http.response.body` enviadas pela aplicação.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        ttfb = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, ttfb
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                ttfb = time.perf_counter() - start
+            await send(message)
+
+        method = scope["method"]
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            REQUEST_COUNT.labels(method, route_template(scope), "500").inc()
+            logger.exception("request_error", extra={"path": scope["path"], "method": method})
+            raise
+
+        duration = time.perf_counter() - start
+        route = route_template(scope)
+        REQUEST_COUNT.labels(method, route, str(status)).inc()
+        REQUEST_LATENCY.labels(method, route).observe(duration)
+        if ttfb is not None:
+            REQUEST_TTFB.labels(method, route).observe(ttfb)
+        logger.info(
+            "request_completed",
+            extra={
+                "path": scope["path"],
+                "route": route,
+                "method": method,
+                "status": status,
+                "duration_ms": round(duration * 1000, 2),
+                "ttfb_ms": round(ttfb * 1000, 2) if ttfb is not None else None,
+            },
+        )
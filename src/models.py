@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional, Union
 
 class IncidentRequest(BaseModel):
     texto: str = Field(..., description="Descrição textual do incidente")
@@ -13,3 +13,30 @@ class IncidentResponse(BaseModel):
     local: str = ""
     tipo_incidente: str = ""
     impacto: str = ""
+
+class BatchIncidentRequest(BaseModel):
+    items: List[IncidentRequest] = Field(..., description="Incidentes a extrair, processados em paralelo")
+
+class BatchItemResult(BaseModel):
+    index: int = Field(..., description="Posição do item em `items`")
+    result: Optional[IncidentResponse] = None
+    error: Optional[str] = None
+
+class BatchIncidentResponse(BaseModel):
+    results: List[BatchItemResult]
+
+class JobItem(IncidentRequest):
+    id: Optional[Union[int, str]] = Field(default=None, description="Identificador do cliente, devolvido no resultado")
+
+class JobRequest(BaseModel):
+    items: List[JobItem] = Field(..., description="Incidentes enfileirados e processados em background")
+
+class JobStatus(BaseModel):
+    id: str
+    status: str = Field(..., description="queued, running ou completed")
+    total: int
+    done: int
+    failed: int
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
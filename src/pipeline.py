@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterable, Iterator, Optional, Set, Tuple, Union
+
+from jsonschema import ValidationError
+from prometheus_client import Counter, Histogram
+
+from .admission import Overloaded, get_admission_controller
+from .cache import get_extraction_cache, make_cache_key
+from .extractors import FIELDS, fallback_extract, fallback_extract_scored, merge_dicts
+from .llm_client import current_llm_timeout, extract_with_llm, is_inflight, resolve_reference
+from .models import IncidentRequest, IncidentResponse
+from .preprocess import preprocess_text
+from .relevance import estimate_tokens, record_llm_input, select_relevant
+from .rules_executor import run_rules
+from .schema import validate_incident_payload
+from .tracing import record as record_span
+from .settings import (
+    EXTRACT_ROUTING,
+    LLM_INPUT_TOKEN_BUDGET,
+    METRICS_LATENCY_BUCKETS,
+    OLLAMA_MODEL,
+    OVERLOAD_POLICY,
+    RULES_CONFIDENCE_THRESHOLD,
+)
+
+logger = logging.getLogger("incidente_llm_api")
+
+# Folga sobre o timeout do LLM para cobrir espera por vaga e serialização.
+_LLM_WAIT_MARGIN = 5.0
+
+EXTRACT_ROUTE = Counter(
+    "incidente_llm_api_extract_route_total",
+    "Extrações por rota: 'rules' (sem LLM) ou 'llm'",
+    labelnames=("route",),
+)
+EXTRACT_STAGE_LATENCY = Histogram(
+    "incidente_llm_api_extract_stage_seconds",
+    "Duração de cada etapa da extração",
+    labelnames=("stage",),
+    buckets=METRICS_LATENCY_BUCKETS,
+)
+EXTRACT_LLM_RESULT = Counter(
+    "incidente_llm_api_extract_llm_result_total",
+    "Extrações que consultaram o LLM: 'used' (resposta aproveitada) ou 'fallback' (só regras)",
+    labelnames=("result",),
+)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Mede a duração de uma etapa da extração (histograma e, se ativo, Server-Timing)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        EXTRACT_STAGE_LATENCY.labels(name).observe(elapsed)
+        record_span(name, elapsed)
+
+
+@dataclass
+class ExtractionOutcome:
+    payload: Dict[str, str]
+    has_llm: bool
+    cached: bool = False
+
+
+async def run_extraction(
+    texto_bruto: str,
+    referencia_datahora: Optional[str] = None,
+    deadline: Optional[float] = None,
+    use_llm: bool = True,
+    patient: bool = False,
+) -> ExtractionOutcome:
+    """
+    Pipeline completo de uma extração: preprocess → cache → LLM ∥ regras → merge → schema.
+    `deadline` (instante de `time.monotonic()`) limita a espera por vaga e pelo LLM;
+    `use_llm=False` responde só com as regras (o cache ainda é consultado);
+    `patient=True` (trabalho de fundo, ex.: jobs) espera vaga no LLM sem prazo nem
+    limite de fila, em vez de cair nas regras quando o Ollama está saturado.
+    Levanta `ValidationError` se o resultado final não atender ao schema e
+    `Overloaded` se não houver vaga no LLM com OVERLOAD_POLICY=reject.
+    """
+    # 1) Preprocess
+    with stage("preprocess"):
+        texto = preprocess_text(texto_bruto)
+        referencia = resolve_reference(referencia_datahora)
+
+    # Cache endereçado por conteúdo (texto normalizado + referência + modelo)
+    cache = get_extraction_cache()
+    cache_key = make_cache_key(texto, referencia, OLLAMA_MODEL)
+    if cache is not None:
+        with stage("cache"):
+            cached = await cache.get(cache_key)
+        if cached is not None:
+            return ExtractionOutcome(cached, has_llm=True, cached=True)
+
+    if not use_llm:
+        with stage("rules"):
+            final, llm = await run_rules(fallback_extract, texto, referencia), None
+        EXTRACT_ROUTE.labels("rules").inc()
+    elif EXTRACT_ROUTING == "rules_first":
+        final, llm = await _extract_rules_first(texto, referencia, deadline, patient)
+    else:
+        final, llm = await _extract_parallel(texto, referencia, deadline, patient)
+
+    with stage("validation"):
+        try:
+            validate_incident_payload(final)
+        except ValidationError as exc:
+            logger.warning("schema_validation_failed", extra={"error": str(exc), "payload": final})
+            raise
+
+        # Garante chaves esperadas
+        payload = IncidentResponse(**final).model_dump()
+    # Só resultados com LLM são cacheados: o caminho só-regras já é barato e não
+    # deve fixar uma resposta degradada durante todo o TTL.
+    if cache is not None and llm:
+        await cache.set(cache_key, payload)
+    return ExtractionOutcome(payload, has_llm=bool(llm))
+
+
+async def _llm_input(texto: str) -> str:
+    """Relatos acima do orçamento de tokens vão ao LLM só com a janela de relevância."""
+    enviado = texto
+    if LLM_INPUT_TOKEN_BUDGET > 0 and estimate_tokens(texto) > LLM_INPUT_TOKEN_BUDGET:
+        with stage("relevance"):
+            enviado = await run_rules(select_relevant, texto, LLM_INPUT_TOKEN_BUDGET)
+    record_llm_input(texto, enviado)
+    return enviado
+
+
+async def _guarded_llm(
+    texto: str, referencia: str, deadline: Optional[float], patient: bool = False
+) -> Optional[dict]:
+    """Chama o LLM só se houver vaga antes do prazo (controle de admissão)."""
+    texto = await _llm_input(texto)
+    controller = get_admission_controller()
+    # Requisição idêntica já em andamento: só aguarda o resultado, sem ocupar vaga.
+    if controller is None or is_inflight(texto, referencia):
+        return await extract_with_llm(texto, referencia)
+    queued = time.perf_counter()
+    try:
+        async with controller.slot(deadline, patient=patient):
+            record_span("llm_queue", time.perf_counter() - queued)
+            return await extract_with_llm(texto, referencia)
+    except Overloaded:
+        if OVERLOAD_POLICY == "reject":
+            raise
+        return None
+
+
+async def _wait_llm(
+    llm_task: "asyncio.Future[Optional[dict]]", deadline: Optional[float], patient: bool = False
+) -> Optional[dict]:
+    # Rede de segurança: a própria chamada já respeita o timeout adaptativo. Quem
+    # espera vaga sem prazo (patient) não pode ter a espera na fila contada aqui.
+    timeout = None if patient else current_llm_timeout() + _LLM_WAIT_MARGIN
+    if deadline is not None:
+        remaining = max(0.0, deadline - time.monotonic())
+        timeout = remaining if timeout is None else min(timeout, remaining)
+    with stage("llm_wait"):
+        try:
+            llm = await asyncio.wait_for(llm_task, timeout=timeout)
+        except asyncio.TimeoutError:
+            llm = None
+    # JSON válido que não é objeto (ex.: uma lista) não serve para o merge: fica só com as regras.
+    if not isinstance(llm, dict):
+        llm = None
+    EXTRACT_LLM_RESULT.labels("used" if llm else "fallback").inc()
+    return llm
+
+
+async def _extract_parallel(
+    texto: str, referencia: str, deadline: Optional[float] = None, patient: bool = False
+) -> Tuple[Dict[str, str], Optional[dict]]:
+    # 2) LLM: disparado imediatamente como task para rodar em paralelo às regras
+    llm_task = asyncio.create_task(_guarded_llm(texto, referencia, deadline, patient))
+
+    # 3) Fallback por regras, fora do event loop (thread/process pool)
+    try:
+        with stage("rules"):
+            rb = await run_rules(fallback_extract, texto, referencia)
+    except BaseException:
+        llm_task.cancel()
+        raise
+
+    # 4) Tenta primeiro o LLM (com timeout)
+    llm = await _wait_llm(llm_task, deadline, patient)
+    EXTRACT_ROUTE.labels("llm").inc()
+    return merge_dicts(llm or {}, rb or {}), llm
+
+
+async def _extract_rules_first(
+    texto: str, referencia: str, deadline: Optional[float] = None, patient: bool = False
+) -> Tuple[Dict[str, str], Optional[dict]]:
+    """
+    Regras primeiro: campos com confiança >= RULES_CONFIDENCE_THRESHOLD são aceitos
+    como estão; o LLM só é consultado se algum campo ficou ausente ou incerto.
+    """
+    with stage("rules"):
+        rb, confianca = await run_rules(fallback_extract_scored, texto, referencia)
+    confiaveis = {k: rb[k] for k in FIELDS if rb[k] and confianca[k] >= RULES_CONFIDENCE_THRESHOLD}
+    if len(confiaveis) == len(FIELDS):
+        EXTRACT_ROUTE.labels("rules").inc()
+        return dict(rb), None
+
+    llm_task = asyncio.ensure_future(_guarded_llm(texto, referencia, deadline, patient))
+    llm = await _wait_llm(llm_task, deadline, patient)
+    EXTRACT_ROUTE.labels("llm").inc()
+    # Campos confiáveis das regras prevalecem; o LLM preenche os demais.
+    return merge_dicts({**(llm or {}), **confiaveis}, rb), llm
+
+
+BatchItem = Tuple[int, Union[ExtractionOutcome, Exception]]
+
+
+async def _run_indexed(index: int, item: Union[IncidentRequest, Exception], use_llm: bool) -> BatchItem:
+    # Item que já chegou inválido (ex.: linha malformada na CLI) segue como erro.
+    if isinstance(item, Exception):
+        return index, item
+    # Sem prazo por item: o lote inteiro é trabalho de fundo.
+    try:
+        return index, await run_extraction(item.texto, item.referencia_datahora, use_llm=use_llm)
+    except Exception as exc:  # erro de um item não derruba o lote
+        return index, exc
+
+
+async def extract_many(
+    items: Iterable[Union[IncidentRequest, Exception]], concurrency: int, use_llm: bool = True
+) -> AsyncIterator[BatchItem]:
+    """
+    Executa o pipeline para vários itens com no máximo `concurrency` extrações em
+    andamento, produzindo `(índice, resultado|exceção)` na ordem em que terminam.
+    Os itens são consumidos sob demanda, então `items` pode ser um gerador longo.
+    """
+    source = iter(enumerate(items))
+    pending: Set[asyncio.Task] = set()
+
+    def fill() -> None:
+        while len(pending) < max(1, concurrency):
+            try:
+                index, item = next(source)
+            except StopIteration:
+                return
+            pending.add(asyncio.create_task(_run_indexed(index, item, use_llm)))
+
+    fill()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            pending.difference_update(done)
+            fill()
+            for task in done:
+                yield task.result()
+    finally:
+        # Cliente desconectou ou o consumidor abandonou o gerador.
+        for task in pending:
+            task.cancel()
@@ -1,5 +1,11 @@
 import re
 
+_SPACES_RE = re.compile(r"\s+")
+_HOUR_RE = re.compile(r"(\d{1,2})\s*h\b", re.IGNORECASE)
+_CLOCK_RE = re.compile(r"(\d{1,2})\s*:\s*(\d{2})")
+_SPACE_BEFORE_PUNCT_RE = re.compile(r"\s+([,.;:])")
+_COMMA_NO_SPACE_RE = re.compile(r",(\S)")
+
 def preprocess_text(texto: str) -> str:
     '''
     Normaliza o texto de entrada para reduzir ruído antes do envio ao LLM.
@@ -13,16 +19,16 @@ def preprocess_text(texto: str) -> str:
     t = texto.strip()
 
     # normaliza múltiplos espaços
-    t = re.sub(r"\s+", " ", t)
+    t = _SPACES_RE.sub(" ", t)
 
     # normaliza Horas '14 h' -> '14h', '14 : 30' -> '14:30'
-    t = re.sub(r"(\d{1,2})\s*h\b", r"\1h", t, flags=re.IGNORECASE)
-    t = re.sub(r"(\d{1,2})\s*:\s*(\d{2})", r"\1:\2", t)
+    t = _HOUR_RE.sub(r"\1h", t)
+    t = _CLOCK_RE.sub(r"\1:\2", t)
 
     # remove espaços antes de vírgulas/pontos
-    t = re.sub(r"\s+([,.;:])", r"\1", t)
+    t = _SPACE_BEFORE_PUNCT_RE.sub(r"\1", t)
 
     # corrige vírgula sem espaço após
-    t = re.sub(r",(\S)", r", \1", t)
+    t = _COMMA_NO_SPACE_RE.sub(r", \1", t)
 
     return t
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import itertools
+import pstats
+import random
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from .settings import PROFILE_BUFFER_SIZE, PROFILE_ENABLED, PROFILE_SAMPLE_RATE, PROFILE_TOP_N
+from .tracing import Span
+
+_profiles: Deque[Dict[str, object]] = deque(maxlen=max(1, PROFILE_BUFFER_SIZE))
+_ids = itertools.count(1)
+# O cProfile é um só por interpretador: perfis concorrentes não são possíveis.
+_active = False
+
+
+def should_profile(requested: Optional[str]) -> bool:
+    """Perfila se PROFILE_ENABLED e o cliente pediu (X-Profile: 1) ou a amostragem sorteou."""
+    if not PROFILE_ENABLED:
+        return False
+    if requested and requested.strip().lower() in {"1", "true", "yes", "on"}:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+class RequestProfile:
+    """
+    cProfile de uma requisição. Roda na thread do event loop, então também captura o
+    que outras requisições concorrentes executarem ali no mesmo intervalo; o trabalho
+    das regras no pool aparece só como espera.
+    """
+
+    def __init__(self) -> None:
+        self._profiler: Optional[cProfile.Profile] = None
+        self._start = 0.0
+
+    def start(self) -> bool:
+        global _active
+        if _active:
+            return False
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # outro profiler ativo (ex.: depurador)
+            return False
+        _active = True
+        self._profiler = profiler
+        self._start = time.perf_counter()
+        return True
+
+    def finish(self, path: str, spans: List[Span]) -> Optional[int]:
+        """Encerra a captura e guarda o relatório no buffer; devolve o id do perfil."""
+        global _active
+        if self._profiler is None:
+            return None
+        self._profiler.disable()
+        _active = False
+        duration = time.perf_counter() - self._start
+        out = io.StringIO()
+        pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        self._profiler = None
+        profile_id = next(_ids)
+        _profiles.append(
+            {
+                "id": profile_id,
+                "created": time.time(),
+                "path": path,
+                "duration_ms": round(duration * 1000, 2),
+                "spans": [{"name": name, "dur_ms": round(s * 1000, 2)} for name, s in spans],
+                "report": out.getvalue(),
+            }
+        )
+        return profile_id
+
+
+def list_profiles() -> List[Dict[str, object]]:
+    """Resumo dos perfis guardados, do mais recente ao mais antigo (sem o relatório)."""
+    return [{k: v for k, v in p.items() if k != "report"} for p in reversed(_profiles)]
+
+
+def get_profile(profile_id: int) -> Optional[Dict[str, object]]:
+    return next((p for p in _profiles if p["id"] == profile_id), None)
@@ -0,0 +1,133 @@
+"""
+Janela de relevância para relatos longos: antes de ir ao LLM, o texto já
+pré-processado é quebrado em frases, cada frase é pontuada pelos mesmos sinais
+das regras (data/hora, localidades, termos de tipo de incidente e orações de
+impacto) e só o trecho mais relevante que cabe em LLM_INPUT_TOKEN_BUDGET é
+enviado. O tempo de avaliação do prompt cresce com o tamanho da entrada; as
+regras continuam vendo o texto inteiro.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from typing import List, Set
+
+from prometheus_client import Counter, Histogram
+
+from .extractors import has_datetime_cue, has_impact_cue, has_location_cue
+from .incident_types import get_incident_type_index
+from .localities import get_locality_index
+
+LLM_INPUT_CHARS = Histogram(
+    "incidente_llm_api_llm_input_chars",
+    "Tamanho do texto antes (original) e depois (sent) da janela de relevância",
+    labelnames=("kind",),
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+)
+LLM_INPUT_TRIMMED = Counter(
+    "incidente_llm_api_llm_input_trimmed_total",
+    "Textos cortados pela janela de relevância antes do LLM",
+)
+
+# Estimativa grosseira para português nos tokenizadores dos modelos do Ollama.
+CHARS_PER_TOKEN = 4.0
+
+# Frases: quebra depois de pontuação seguida de espaço (o preprocess já normalizou
+# os espaços), o que preserva "14:00", "2.5" e afins.
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?;])\s+")
+_PERIOD_RE = re.compile(
+    r"\b(?:madrugada|manhã|tarde|noite|semana passada|"
+    r"(?:segunda|terça|quarta|quinta|sexta)(?:-feira)?|sábado|domingo)\b",
+    re.IGNORECASE,
+)
+
+# Pesos dos sinais; o tipo de incidente é o campo mais difícil de recuperar fora de contexto.
+_WEIGHT_DATE = 2.0
+_WEIGHT_LOCAL = 2.0
+_WEIGHT_TYPE = 3.0
+_WEIGHT_IMPACT = 2.0
+
+
+def estimate_tokens(texto: str) -> int:
+    return math.ceil(len(texto) / CHARS_PER_TOKEN)
+
+
+def split_sentences(texto: str) -> List[str]:
+    return [s for s in _SENTENCE_SPLIT_RE.split(texto) if s]
+
+
+def score_sentence(frase: str) -> float:
+    score = 0.0
+    if has_datetime_cue(frase) or _PERIOD_RE.search(frase):
+        score += _WEIGHT_DATE
+    if has_location_cue(frase) or get_locality_index().match(frase):
+        score += _WEIGHT_LOCAL
+    if get_incident_type_index().match(frase):
+        score += _WEIGHT_TYPE
+    if has_impact_cue(frase):
+        score += _WEIGHT_IMPACT
+    return score
+
+
+def _truncate(texto: str, max_chars: int) -> str:
+    if len(texto) <= max_chars:
+        return texto
+    cut = texto[:max_chars]
+    return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+
+def select_relevant(texto: str, budget_tokens: int) -> str:
+    """
+    Devolve o trecho de `texto` que cabe em `budget_tokens`: a janela contígua de
+    frases com maior pontuação total (a mais próxima do início em caso de empate,
+    sem as frases de pontuação zero nas bordas) e, se sobrar orçamento, as demais
+    frases pontuadas, da maior para a menor.
+    As frases escolhidas saem na ordem original. Textos que já cabem voltam intactos.
+    """
+    if budget_tokens <= 0 or estimate_tokens(texto) <= budget_tokens:
+        return texto
+    frases = split_sentences(texto)
+    # +1: o espaço que separa as frases ao juntar.
+    custos = [estimate_tokens(f) + 1 for f in frases]
+    scores = [score_sentence(f) for f in frases]
+
+    best_score, best = -1.0, (0, -1)
+    left, custo, score = 0, 0, 0.0
+    for right in range(len(frases)):
+        custo += custos[right]
+        score += scores[right]
+        while custo > budget_tokens and left <= right:
+            custo -= custos[left]
+            score -= scores[left]
+            left += 1
+        if left <= right and score > best_score:
+            best_score, best = score, (left, right)
+
+    if best[1] < 0:
+        # Nenhuma frase cabe sozinha: corta a mais relevante no limite do orçamento.
+        top = max(range(len(frases)), key=lambda i: (scores[i], -i))
+        return _truncate(frases[top], int(budget_tokens * CHARS_PER_TOKEN))
+
+    # Frases sem sinal nas bordas da janela só gastariam orçamento.
+    left, right = best
+    while left < right and scores[left] <= 0:
+        left += 1
+    while right > left and scores[right] <= 0:
+        right -= 1
+    escolhidas: Set[int] = set(range(left, right + 1))
+    restante = budget_tokens - sum(custos[i] for i in escolhidas)
+    for i in sorted(range(len(frases)), key=lambda i: (-scores[i], i)):
+        if scores[i] <= 0:
+            break
+        if i not in escolhidas and custos[i] <= restante:
+            escolhidas.add(i)
+            restante -= custos[i]
+    return " ".join(frases[i] for i in sorted(escolhidas))
+
+
+def record_llm_input(original: str, enviado: str) -> None:
+    LLM_INPUT_CHARS.labels("original").observe(len(original))
+    LLM_INPUT_CHARS.labels("sent").observe(len(enviado))
+    if len(enviado) < len(original):
+        LLM_INPUT_TRIMMED.inc()
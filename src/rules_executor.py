@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from .settings import RULES_EXECUTOR, RULES_WORKERS
+
+T = TypeVar("T")
+
+_executor: Executor | None = None
+
+
+def build_executor(kind: str = RULES_EXECUTOR, workers: int = RULES_WORKERS) -> Executor:
+    """
+    Cria o pool que executa o fallback por regras. Threads bastam quando o custo é
+    dominado por C (regex); processos evitam o GIL quando o dateparser domina.
+    """
+    workers = max(1, workers)
+    if kind == "process":
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rules")
+
+
+def get_rules_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        _executor = build_executor()
+    return _executor
+
+
+def configure_rules_executor(kind: str, workers: int) -> Executor:
+    """Substitui o pool global (ex.: a CLI usa processos independentemente de RULES_EXECUTOR)."""
+    global _executor
+    shutdown_rules_executor()
+    _executor = build_executor(kind, workers)
+    return _executor
+
+
+def shutdown_rules_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_rules(func: Callable[..., T], *args: Any) -> T:
+    """Executa `func(*args)` no pool de regras sem bloquear o event loop."""
+    loop = asyncio.get_running_loop()
+    executor = get_rules_executor()
+    call = functools.partial(func, *args)
+    if isinstance(executor, ThreadPoolExecutor):
+        # Leva o contexto (ex.: spans do Server-Timing) para a thread do pool.
+        call = functools.partial(contextvars.copy_context().run, call)
+    return await loop.run_in_executor(executor, call)
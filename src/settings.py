@@ -4,7 +4,148 @@ def getenv(key: str, default: str | None = None) -> str | None:
     val = os.getenv(key, default)
     return val
 
+def getenv_int(key: str, default: int) -> int:
+    val = getenv(key)
+    return int(val) if val not in (None, "") else default
+
+def getenv_float(key: str, default: float) -> float:
+    val = getenv(key)
+    return float(val) if val not in (None, "") else default
+
+def getenv_bool(key: str, default: bool = False) -> bool:
+    val = getenv(key)
+    if val in (None, ""):
+        return default
+    return val.strip().lower() in {"1", "true", "yes", "on"}
+
 OLLAMA_HOST = getenv("OLLAMA_HOST", "http://localhost:11434")
 OLLAMA_MODEL = getenv("OLLAMA_MODEL", "llama3.2")
 TZ = getenv("TZ", "America/Sao_Paulo")
 APP_PORT = int(getenv("APP_PORT", "8000") or 8000)
+
+# Cliente HTTP compartilhado com o Ollama (pool de conexões)
+OLLAMA_MAX_CONNECTIONS = getenv_int("OLLAMA_MAX_CONNECTIONS", 100)
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = getenv_int("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", 20)
+OLLAMA_KEEPALIVE_EXPIRY = getenv_float("OLLAMA_KEEPALIVE_EXPIRY", 30.0)
+OLLAMA_HTTP2 = getenv_bool("OLLAMA_HTTP2", False)
+OLLAMA_CONNECT_TIMEOUT = getenv_float("OLLAMA_CONNECT_TIMEOUT", 5.0)
+OLLAMA_READ_TIMEOUT = getenv_float("OLLAMA_READ_TIMEOUT", 30.0)
+
+# Execução das heurísticas (CPU-bound) fora do event loop: "thread" ou "process"
+RULES_EXECUTOR = (getenv("RULES_EXECUTOR", "thread") or "thread").lower()
+RULES_WORKERS = getenv_int("RULES_WORKERS", min(4, os.cpu_count() or 1))
+
+# Cache de extrações (memória LRU + camada opcional em SQLite compartilhada entre workers)
+EXTRACT_CACHE_ENABLED = getenv_bool("EXTRACT_CACHE_ENABLED", True)
+EXTRACT_CACHE_MAX_ENTRIES = getenv_int("EXTRACT_CACHE_MAX_ENTRIES", 2048)
+EXTRACT_CACHE_TTL_SECONDS = getenv_float("EXTRACT_CACHE_TTL_SECONDS", 3600.0)
+EXTRACT_CACHE_SQLITE_PATH = getenv("EXTRACT_CACHE_SQLITE_PATH", "") or ""
+
+# Extração em lote (/extract/batch)
+BATCH_MAX_ITEMS = getenv_int("BATCH_MAX_ITEMS", 1000)
+BATCH_CONCURRENCY = getenv_int("BATCH_CONCURRENCY", 8)
+
+# Circuit breaker do LLM
+LLM_CB_ENABLED = getenv_bool("LLM_CB_ENABLED", True)
+LLM_CB_WINDOW = getenv_int("LLM_CB_WINDOW", 20)
+LLM_CB_MIN_CALLS = getenv_int("LLM_CB_MIN_CALLS", 5)
+LLM_CB_FAILURE_RATE = getenv_float("LLM_CB_FAILURE_RATE", 0.5)
+LLM_CB_SLOW_CALL_SECONDS = getenv_float("LLM_CB_SLOW_CALL_SECONDS", 10.0)
+LLM_CB_OPEN_SECONDS = getenv_float("LLM_CB_OPEN_SECONDS", 30.0)
+LLM_CB_HALF_OPEN_PROBES = getenv_int("LLM_CB_HALF_OPEN_PROBES", 1)
+
+# Roteamento: "parallel" (LLM ∥ regras) ou "rules_first" (LLM só para campos incertos)
+EXTRACT_ROUTING = (getenv("EXTRACT_ROUTING", "parallel") or "parallel").lower()
+RULES_CONFIDENCE_THRESHOLD = getenv_float("RULES_CONFIDENCE_THRESHOLD", 0.8)
+
+# Gazetteer opcional de localidades (JSON ou CSV) somado ao dicionário embutido
+LOCALITIES_GAZETTEER_PATH = getenv("LOCALITIES_GAZETTEER_PATH", "") or ""
+
+# Memoização da resolução de datas (expressão, referência, TZ)
+DATE_CACHE_SIZE = getenv_int("DATE_CACHE_SIZE", 4096)
+
+# Streaming do /api/chat com parada antecipada e teto de tokens gerados (0 = sem teto)
+OLLAMA_STREAM = getenv_bool("OLLAMA_STREAM", False)
+OLLAMA_NUM_PREDICT = getenv_int("OLLAMA_NUM_PREDICT", 256)
+
+# Formato da saída do LLM ("json" ou "schema" = INCIDENT_SCHEMA) e estilo do prompt ("verbose" ou "compact")
+OLLAMA_FORMAT = (getenv("OLLAMA_FORMAT", "json") or "json").lower()
+OLLAMA_PROMPT_STYLE = (getenv("OLLAMA_PROMPT_STYLE", "verbose") or "verbose").lower()
+
+# Micro-batching: várias extrações numa única geração do LLM
+LLM_BATCH_ENABLED = getenv_bool("LLM_BATCH_ENABLED", False)
+LLM_BATCH_WINDOW_MS = getenv_float("LLM_BATCH_WINDOW_MS", 10.0)
+LLM_BATCH_MAX_SIZE = getenv_int("LLM_BATCH_MAX_SIZE", 8)
+
+# Vários backends do Ollama: "url[;model=...][;weight=...]" separados por vírgula.
+# Vazio usa apenas OLLAMA_HOST/OLLAMA_MODEL.
+OLLAMA_BACKENDS = getenv("OLLAMA_BACKENDS", "") or ""
+OLLAMA_BACKEND_EJECT_AFTER = getenv_int("OLLAMA_BACKEND_EJECT_AFTER", 3)
+OLLAMA_HEALTH_INTERVAL = getenv_float("OLLAMA_HEALTH_INTERVAL", 10.0)
+
+# Controle de admissão ao LLM e descarte por prazo (X-Request-Deadline-Ms)
+LLM_MAX_CONCURRENCY = getenv_int("LLM_MAX_CONCURRENCY", 16)
+LLM_MAX_QUEUE = getenv_int("LLM_MAX_QUEUE", 64)
+LLM_QUEUE_TIMEOUT_MS = getenv_float("LLM_QUEUE_TIMEOUT_MS", 10000.0)
+OVERLOAD_POLICY = (getenv("OVERLOAD_POLICY", "fallback") or "fallback").lower()
+OVERLOAD_RETRY_AFTER = getenv_int("OVERLOAD_RETRY_AFTER", 1)
+
+# Timeout adaptativo do LLM (derivado de percentis recentes por backend/modelo) e hedging
+LLM_LATENCY_WINDOW = getenv_int("LLM_LATENCY_WINDOW", 200)
+LLM_TIMEOUT_ADAPTIVE = getenv_bool("LLM_TIMEOUT_ADAPTIVE", True)
+LLM_TIMEOUT_PERCENTILE = getenv_float("LLM_TIMEOUT_PERCENTILE", 0.99)
+LLM_TIMEOUT_MULTIPLIER = getenv_float("LLM_TIMEOUT_MULTIPLIER", 3.0)
+LLM_TIMEOUT_MIN = getenv_float("LLM_TIMEOUT_MIN", 2.0)
+LLM_TIMEOUT_MAX = getenv_float("LLM_TIMEOUT_MAX", OLLAMA_READ_TIMEOUT)
+LLM_TIMEOUT_MIN_SAMPLES = getenv_int("LLM_TIMEOUT_MIN_SAMPLES", 20)
+LLM_HEDGE_ENABLED = getenv_bool("LLM_HEDGE_ENABLED", False)
+LLM_HEDGE_PERCENTILE = getenv_float("LLM_HEDGE_PERCENTILE", 0.95)
+
+# Buckets (s) dos histogramas de latência HTTP e por etapa, separados por vírgula.
+_DEFAULT_LATENCY_BUCKETS = "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30"
+METRICS_LATENCY_BUCKETS = tuple(
+    float(b) for b in (getenv("METRICS_LATENCY_BUCKETS", "") or _DEFAULT_LATENCY_BUCKETS).split(",") if b.strip()
+)
+
+# Vários workers: diretório do modo multiprocesso do prometheus_client (lido por ele no import;
+# deve existir e ser esvaziado antes da subida). O /metrics agrega todos os workers.
+PROMETHEUS_MULTIPROC_DIR = getenv("PROMETHEUS_MULTIPROC_DIR", "") or ""
+
+# Cabeçalho Server-Timing com a duração de cada etapa do /extract
+SERVER_TIMING_ENABLED = getenv_bool("SERVER_TIMING_ENABLED", True)
+
+# Perfilamento sob demanda (X-Profile: 1 ou amostragem), consultável em /debug/profiles
+PROFILE_ENABLED = getenv_bool("PROFILE_ENABLED", False)
+PROFILE_SAMPLE_RATE = getenv_float("PROFILE_SAMPLE_RATE", 0.0)
+PROFILE_BUFFER_SIZE = getenv_int("PROFILE_BUFFER_SIZE", 20)
+PROFILE_TOP_N = getenv_int("PROFILE_TOP_N", 40)
+
+# Logs: formatação/escrita numa thread de fundo e amostragem do log por extração (0 a 1)
+LOG_ASYNC = getenv_bool("LOG_ASYNC", True)
+LOG_EXTRACTION_SAMPLE_RATE = getenv_float("LOG_EXTRACTION_SAMPLE_RATE", 1.0)
+
+# Taxonomia de tipos de incidente (JSON); vazio usa src/data/incident_types.json
+INCIDENT_TYPES_PATH = getenv("INCIDENT_TYPES_PATH", "") or ""
+
+# Aquecimento na subida: modelo do Ollama carregado (keep_alive), dateparser e índices prontos antes do /readyz.
+# WARMUP_ON_IMPORT aquece no import de src.main (gunicorn --preload: estado compartilhado entre workers via fork).
+WARMUP_ENABLED = getenv_bool("WARMUP_ENABLED", True)
+WARMUP_LLM = getenv_bool("WARMUP_LLM", True)
+WARMUP_LLM_TIMEOUT = getenv_float("WARMUP_LLM_TIMEOUT", 120.0)
+WARMUP_ON_IMPORT = getenv_bool("WARMUP_ON_IMPORT", False)
+OLLAMA_KEEP_ALIVE = getenv("OLLAMA_KEEP_ALIVE", "30m") or ""
+
+# Jobs assíncronos (POST /jobs): fila durável em SQLite consumida por workers em background.
+# Desabilitados enquanto JOBS_DB_PATH estiver vazio; em container, aponte para um volume.
+JOBS_DB_PATH = getenv("JOBS_DB_PATH", "") or ""
+JOBS_MAX_ITEMS = getenv_int("JOBS_MAX_ITEMS", 100000)
+JOBS_CONCURRENCY = getenv_int("JOBS_CONCURRENCY", 4)
+JOBS_LEASE_SECONDS = getenv_float("JOBS_LEASE_SECONDS", 300.0)
+JOBS_MAX_ATTEMPTS = getenv_int("JOBS_MAX_ATTEMPTS", 3)
+JOBS_POLL_INTERVAL = getenv_float("JOBS_POLL_INTERVAL", 1.0)
+JOBS_RETENTION_SECONDS = getenv_float("JOBS_RETENTION_SECONDS", 86400.0)
+JOBS_PAGE_SIZE = getenv_int("JOBS_PAGE_SIZE", 100)
+
+# Janela de relevância: relatos longos vão ao LLM só com as frases mais relevantes
+# dentro deste orçamento (tokens estimados, ~4 caracteres cada); 0 envia o texto inteiro
+LLM_INPUT_TOKEN_BUDGET = getenv_int("LLM_INPUT_TOKEN_BUDGET", 384)
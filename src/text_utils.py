@@ -0,0 +1,18 @@
+"""
+Normalização de texto compartilhada pelos índices de localidades e de tipos de
+incidente: ambos casam aliases/sinônimos por tokens sem acento e em minúsculas.
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    """Remove acentos e passa para minúsculas (letras acentuadas viram um único caractere)."""
+    normalized = unicodedata.normalize("NFD", text)
+    normalized = "".join(ch for ch in normalized if unicodedata.category(ch) != "Mn")
+    return normalized.lower()
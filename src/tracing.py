@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+Span = Tuple[str, float]
+
+# Spans da requisição atual. A lista é compartilhada com as tasks criadas durante a
+# requisição (o contexto é copiado por referência), então o LLM em paralelo e as
+# regras no pool de threads registram na mesma lista.
+_current: ContextVar[Optional[List[Span]]] = ContextVar("incidente_trace", default=None)
+
+
+@contextmanager
+def trace() -> Iterator[List[Span]]:
+    """Ativa o registro de spans no contexto atual e devolve a lista preenchida."""
+    spans: List[Span] = []
+    token = _current.set(spans)
+    try:
+        yield spans
+    finally:
+        _current.reset(token)
+
+
+def record(name: str, seconds: float) -> None:
+    spans = _current.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+def lap(name: str, start: float) -> float:
+    """Registra o tempo desde `start` como `name` e devolve o instante atual (para o próximo trecho)."""
+    now = time.perf_counter()
+    record(name, now - start)
+    return now
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def server_timing(spans: List[Span], total: Optional[float] = None) -> str:
+    """Valor do cabeçalho `Server-Timing` (durações em ms)."""
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in spans]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
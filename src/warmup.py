@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import gc
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from prometheus_client import Gauge
+
+from .backends import backend_pool
+from .extractors import fallback_extract, parse_datetime_pt
+from .incident_types import get_incident_type_index
+from .llm_client import preload_model
+from .localities import get_locality_index
+from .rules_executor import get_rules_executor, run_rules
+from .settings import RULES_WORKERS, WARMUP_ENABLED, WARMUP_LLM, WARMUP_LLM_TIMEOUT
+
+logger = logging.getLogger("incidente_llm_api")
+
+STARTUP_SECONDS = Gauge(
+    "incidente_llm_api_startup_seconds",
+    "Tempo do início do lifespan até o fim do aquecimento",
+    multiprocess_mode="max",
+)
+WARMUP_STAGE_SECONDS = Gauge(
+    "incidente_llm_api_warmup_stage_seconds",
+    "Duração de cada etapa do aquecimento",
+    labelnames=("stage",),
+    multiprocess_mode="max",
+)
+FIRST_REQUEST_SECONDS = Gauge(
+    "incidente_llm_api_first_request_seconds",
+    "Latência da primeira extração atendida pelo processo",
+    multiprocess_mode="max",
+)
+READY = Gauge(
+    "incidente_llm_api_ready",
+    "1 quando o aquecimento terminou e o processo está pronto para tráfego",
+)
+
+# Texto de exemplo que passa por todas as heurísticas (datas, local, tipo, impacto).
+_WARMUP_TEXT = (
+    "Ontem às 14h, no escritório de São Paulo, houve uma falha no servidor principal que "
+    "afetou o sistema de faturamento por 2 horas."
+)
+_WARMUP_REF = "2024-08-10T10:00:00-03:00"
+
+_cpu_warm = False
+_ready = False
+_first_request_done = False
+_status: Dict[str, object] = {"stages": {}, "llm": {}}
+
+
+def _timed(stage: str, func) -> None:
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    WARMUP_STAGE_SECONDS.labels(stage).set(elapsed)
+    _status["stages"][stage] = round(elapsed, 4)
+
+
+def warm_cpu_state() -> None:
+    """
+    Constrói no processo atual o estado caro e imutável das regras: índices de
+    localidades e de tipos de incidente e os dados de idioma do dateparser
+    (carregados preguiçosamente no primeiro parse). Idempotente.
+    """
+    global _cpu_warm
+    if _cpu_warm:
+        return
+    _timed("localities", get_locality_index)
+    _timed("incident_types", get_incident_type_index)
+    # Expressão fora dos padrões determinísticos, para forçar o dateparser em português.
+    _timed("dateparser", lambda: parse_datetime_pt("semana passada", _WARMUP_REF))
+    _timed("rules", lambda: fallback_extract(_WARMUP_TEXT, _WARMUP_REF))
+    _cpu_warm = True
+
+
+def warm_before_fork() -> None:
+    """
+    Aquecimento no import do app (WARMUP_ON_IMPORT), para servidores que carregam o
+    app antes do fork (gunicorn --preload): os workers herdam o estado por
+    copy-on-write. O `gc.freeze()` tira esses objetos das coletas, que do contrário
+    tocariam as páginas e forçariam a cópia em cada worker.
+    """
+    warm_cpu_state()
+    gc.collect()
+    gc.freeze()
+
+
+async def _warm_rules_pool() -> None:
+    # Threads compartilham o estado já aquecido; processos têm memória própria.
+    if isinstance(get_rules_executor(), ThreadPoolExecutor):
+        return
+    await asyncio.gather(*(run_rules(warm_cpu_state) for _ in range(max(1, RULES_WORKERS))))
+
+
+async def _preload_llm() -> None:
+    results = await asyncio.gather(*(preload_model(b, WARMUP_LLM_TIMEOUT) for b in backend_pool.backends))
+    _status["llm"] = {b.url: ok for b, ok in zip(backend_pool.backends, results)}
+
+
+async def run_warmup(started: Optional[float] = None) -> None:
+    """
+    Parte assíncrona do aquecimento (pool de processos das regras e modelo no
+    Ollama), rodada em background pelo lifespan depois de `warm_cpu_state()`; ao
+    final o processo passa a responder pronto no /readyz. Falhas (ex.: Ollama fora)
+    são registradas mas não impedem a prontidão: as regras continuam atendendo e o
+    circuit breaker cuida do LLM.
+    """
+    global _ready
+    started = time.perf_counter() if started is None else started
+    if WARMUP_ENABLED:
+        try:
+            start = time.perf_counter()
+            await _warm_rules_pool()
+            WARMUP_STAGE_SECONDS.labels("rules_pool").set(time.perf_counter() - start)
+            if WARMUP_LLM:
+                start = time.perf_counter()
+                await _preload_llm()
+                WARMUP_STAGE_SECONDS.labels("llm_preload").set(time.perf_counter() - start)
+        except Exception as exc:  # aquecimento é otimização, nunca motivo para não subir
+            logger.warning("warmup_failed", extra={"error": repr(exc)})
+    elapsed = time.perf_counter() - started
+    STARTUP_SECONDS.set(elapsed)
+    _ready = True
+    READY.set(1)
+    logger.info("warmup_completed", extra={"startup_seconds": round(elapsed, 3), **_status})
+
+
+def is_ready() -> bool:
+    return _ready
+
+
+def warmup_status() -> Dict[str, object]:
+    return {"ready": _ready, **_status}
+
+
+def record_first_request(seconds: float) -> None:
+    global _first_request_done
+    if not _first_request_done:
+        _first_request_done = True
+        FIRST_REQUEST_SECONDS.set(seconds)
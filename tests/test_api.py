@@ -1,3 +1,5 @@
+import json
+
 from fastapi.testclient import TestClient
 from src.main import app
 
@@ -24,3 +26,75 @@ def test_extract_respects_relative_day_with_time():
     data = r.json()
     # Ontem relativo à referência 2024-08-10 deve ser 2024-08-09.
     assert data["data_ocorrencia"] == "2024-08-09 14:00"
+
+
+def test_extract_batch_returns_results_in_input_order():
+    payload = {
+        "items": [
+            {"texto": "Hoje houve queda de energia em Recife.", "referencia_datahora": "2024-08-10T10:00:00-03:00"},
+            {"texto": "Ontem às 14h houve falha no servidor que afetou o ERP.", "referencia_datahora": "2024-08-10T10:00:00-03:00"},
+        ]
+    }
+    r = client.post("/extract/batch", json=payload)
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [item["index"] for item in results] == [0, 1]
+    assert results[0]["result"]["local"] == "Recife (PE)"
+    assert results[1]["result"]["data_ocorrencia"] == "2024-08-09 14:00"
+
+
+def test_extract_batch_stream_emits_one_ndjson_line_per_item():
+    payload = {"items": [{"texto": "Hoje houve queda de energia."} for _ in range(3)]}
+    r = client.post("/extract/batch/stream", json=payload)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines() if line]
+    assert sorted(item["index"] for item in lines) == [0, 1, 2]
+    assert all(item["error"] is None for item in lines)
+
+
+def test_metrics_exposes_stage_latency_after_extract():
+    client.post("/extract", json={"texto": "Hoje houve queda de energia em Recife."})
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    for stage in ("preprocess", "rules", "llm_wait", "validation", "serialization"):
+        assert f'incidente_llm_api_extract_stage_seconds_count{{stage="{stage}"}}' in r.text
+    assert 'incidente_llm_api_extract_llm_result_total{result="fallback"}' in r.text
+
+
+def test_extract_reports_server_timing_per_stage():
+    r = client.post("/extract", json={"texto": "Ontem às 14h houve queda de energia em Recife."})
+    assert r.status_code == 200
+    names = {part.split(";")[0].strip() for part in r.headers["Server-Timing"].split(",")}
+    assert {"preprocess", "rules", "rules_date", "rules_locality", "llm_wait", "serialization", "total"} <= names
+
+
+def test_profiled_request_is_retrievable_from_debug_endpoint(monkeypatch):
+    import src.main
+    import src.profiling
+
+    monkeypatch.setattr(src.profiling, "PROFILE_ENABLED", True)
+    monkeypatch.setattr(src.main, "PROFILE_ENABLED", True)
+    r = client.post("/extract", json={"texto": "Hoje houve falha no servidor."}, headers={"X-Profile": "1"})
+    profile_id = r.headers["X-Profile-Id"]
+
+    listed = client.get("/debug/profiles").json()["profiles"]
+    assert listed[0]["id"] == int(profile_id)
+    report = client.get(f"/debug/profiles/{profile_id}")
+    assert report.status_code == 200
+    assert "function calls" in report.text
+
+
+def test_debug_profiles_is_hidden_when_disabled():
+    assert client.get("/debug/profiles").status_code == 404
+
+
+def test_request_metrics_use_route_template_and_fixed_label_for_unknown_paths():
+    client.get("/nao-existe/123")
+    client.get("/debug/profiles/42")
+    text = client.get("/metrics").text
+    assert 'path="<unmatched>",status="404"' in text
+    assert 'path="/debug/profiles/{profile_id}"' in text
+    assert "/nao-existe/123" not in text
+    assert 'incidente_llm_api_request_ttfb_seconds_count{method="GET",path="<unmatched>"}' in text
@@ -0,0 +1,37 @@
+import asyncio
+
+import httpx
+
+from benchmarks._baseline import regressions
+from benchmarks.fake_ollama import INCIDENT, FakeOllamaConfig, create_app
+from src import llm_client
+
+REF = "2024-08-10T10:00:00-03:00"
+
+
+def _use_fake_ollama(monkeypatch, **config):
+    app = create_app(FakeOllamaConfig(latency_ms=1, jitter=0, seed=1, **config))
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+    monkeypatch.setattr(llm_client, "get_client", lambda: client)
+    monkeypatch.setattr(llm_client, "llm_breaker", None)
+
+
+def test_fake_ollama_speaks_the_chat_protocol(monkeypatch):
+    _use_fake_ollama(monkeypatch)
+    assert asyncio.run(llm_client._extract_single("Houve falha no servidor.", REF)) == INCIDENT
+
+    monkeypatch.setattr(llm_client, "OLLAMA_STREAM", True)
+    _use_fake_ollama(monkeypatch, eval_tokens=8)
+    assert asyncio.run(llm_client._extract_single("Houve falha no servidor.", REF)) == INCIDENT
+
+
+def test_fake_ollama_failure_rate(monkeypatch):
+    _use_fake_ollama(monkeypatch, failure_rate=1.0)
+    assert asyncio.run(llm_client._extract_single("Houve falha no servidor.", REF)) is None
+
+
+def test_regressions_respect_direction_and_tolerance():
+    baseline = {"fallback_extract": 100.0, "throughput_rps": 50.0}
+    assert regressions({"fallback_extract": 125.0, "throughput_rps": 40.0}, baseline, 1.3, {"throughput_rps"}) == []
+    failed = regressions({"fallback_extract": 140.0, "throughput_rps": 30.0}, baseline, 1.3, {"throughput_rps"})
+    assert [line.split(":")[0] for line in failed] == ["fallback_extract", "throughput_rps"]
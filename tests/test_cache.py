@@ -0,0 +1,48 @@
+import asyncio
+
+from src.cache import ExtractionCache, make_cache_key
+
+PAYLOAD = {"data_ocorrencia": "", "local": "Recife (PE)", "tipo_incidente": "Queda de energia", "impacto": ""}
+
+
+def test_cache_key_depends_on_text_reference_and_model():
+    base = make_cache_key("texto", "2024-08-10T10:00:00-03:00", "llama3.2")
+    assert base == make_cache_key("texto", "2024-08-10T10:00:00-03:00", "llama3.2")
+    assert base != make_cache_key("texto", "2024-08-11T10:00:00-03:00", "llama3.2")
+    assert base != make_cache_key("texto", "2024-08-10T10:00:00-03:00", "tinyllama")
+
+
+def test_memory_cache_evicts_least_recently_used():
+    async def run():
+        cache = ExtractionCache(max_entries=2, ttl_seconds=60)
+        await cache.set("a", PAYLOAD)
+        await cache.set("b", PAYLOAD)
+        assert await cache.get("a") == PAYLOAD  # "a" passa a ser o mais recente
+        await cache.set("c", PAYLOAD)
+        assert await cache.get("b") is None
+        assert await cache.get("a") == PAYLOAD
+
+    asyncio.run(run())
+
+
+def test_expired_entries_are_not_returned():
+    async def run():
+        cache = ExtractionCache(max_entries=2, ttl_seconds=0)
+        await cache.set("a", PAYLOAD)
+        assert await cache.get("a") is None
+
+    asyncio.run(run())
+
+
+def test_sqlite_tier_survives_new_instance(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+
+    async def run():
+        first = ExtractionCache(max_entries=2, ttl_seconds=60, sqlite_path=path)
+        await first.set("k", PAYLOAD)
+        first.close()
+        second = ExtractionCache(max_entries=2, ttl_seconds=60, sqlite_path=path)
+        assert await second.get("k") == PAYLOAD
+        second.close()
+
+    asyncio.run(run())
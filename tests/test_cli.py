@@ -0,0 +1,68 @@
+import json
+
+from src import cli
+
+REF = "2024-08-10T10:00:00-03:00"
+
+
+def _write_input(path, n):
+    with open(path, "w", encoding="utf-8") as fh:
+        for i in range(n):
+            fh.write(json.dumps({"id": i, "texto": f"Ontem às 14h houve queda de energia em Recife. Caso {i}.", "referencia_datahora": REF}) + "\n")
+        fh.write("{quebrado\n")
+
+
+def _indexes(path):
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line)["index"] for line in fh]
+
+
+def test_cli_writes_ordered_results_and_reports_bad_lines(tmp_path):
+    src, out = tmp_path / "in.ndjson", tmp_path / "out.ndjson"
+    _write_input(src, 30)
+    args = [str(src), "-o", str(out), "--no-llm", "--rules-executor", "thread", "--workers", "2", "--stats-interval", "0"]
+    assert cli.main(args) == 0
+
+    lines = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert [line["index"] for line in lines] == list(range(31))
+    assert lines[5]["id"] == 5 and lines[5]["result"]["data_ocorrencia"] == "2024-08-09 14:00"
+    assert lines[-1]["result"] is None and "JSON inválido" in lines[-1]["error"]
+
+
+def test_cli_resumes_from_checkpoint_without_duplicates(tmp_path):
+    src, out, ckpt = tmp_path / "in.ndjson", tmp_path / "out.ndjson", tmp_path / "run.ckpt"
+    _write_input(src, 25)
+    args = [
+        str(src), "-o", str(out), "--checkpoint", str(ckpt), "--checkpoint-every", "10",
+        "--no-llm", "--rules-executor", "thread", "--workers", "2", "--stats-interval", "0",
+    ]
+    assert cli.main(args) == 0
+
+    # Simula uma interrupção logo após o checkpoint do item 10, com uma linha parcial escrita depois.
+    first_ten = b"".join(out.read_bytes().splitlines(keepends=True)[:10])
+    cli.save_checkpoint(str(ckpt), 10, len(first_ten))
+    out.write_bytes(first_ten + b'{"index": 10, "res')
+
+    assert cli.main(args) == 0
+    assert _indexes(out) == list(range(26))
+    assert json.loads(ckpt.read_text())["done"] == 26
+
+    # Retomar um checkpoint já completo (duas vezes) só descarta o lixo depois do
+    # offset, sem deslocá-lo nem preencher o arquivo com NULs.
+    complete = out.read_bytes()
+    out.write_bytes(complete + b'{"index": 26, "res')
+    for _ in range(2):
+        assert cli.main(args) == 0
+        assert out.read_bytes() == complete
+        assert json.loads(ckpt.read_text())["output_offset"] == len(complete)
+
+
+def test_read_records_accepts_csv_and_plain_text(tmp_path):
+    csv_path = tmp_path / "in.csv"
+    csv_path.write_text("id,descricao\nA,Houve incêndio em Manaus\n", encoding="utf-8")
+    txt_path = tmp_path / "in.txt"
+    txt_path.write_text("Houve falha no servidor\n\nHoje houve vazamento\n", encoding="utf-8")
+
+    records = list(cli.read_records([str(csv_path)], text_column="descricao"))
+    assert records[0][0] == "A" and records[0][1].texto == "Houve incêndio em Manaus"
+    assert [r[1].texto for r in cli.read_records([str(txt_path)])] == ["Houve falha no servidor", "Hoje houve vazamento"]
@@ -0,0 +1,70 @@
+from src.localities import build_locality_index, detect_localidade
+
+
+def test_locality_index_prefers_longest_alias():
+    assert detect_localidade("Falha em Sampa e no Rio de Janeiro") == "Rio de Janeiro (RJ)"
+    assert detect_localidade("queda no escritório de BH") == "Belo Horizonte (MG)"
+
+
+def test_locality_index_loads_gazetteer_csv(tmp_path):
+    path = tmp_path / "municipios.csv"
+    path.write_text(
+        "nome,uf,aliases\n"
+        "São José dos Campos,SP,sjc\n"
+        "Data Center Tamboré,,dc tambore|tambore\n",
+        encoding="utf-8",
+    )
+    index = build_locality_index(str(path))
+    assert index.match("pane elétrica em sao jose dos campos") == "São José dos Campos (SP)"
+    assert index.match("Queda de energia no DC Tamboré") == "Data Center Tamboré"
+    # o dicionário embutido continua valendo
+    assert index.match("falha em Curitiba") == "Curitiba (PR)"
+
+
+REF = "2024-08-10T10:00:00-03:00"
+
+
+def test_short_relative_expressions_resolve_without_dateparser(monkeypatch):
+    from src import extractors
+
+    def boom(*args, **kwargs):
+        raise AssertionError("dateparser não deveria ser chamado")
+
+    monkeypatch.setattr(extractors.dateparser, "parse", boom)
+    extractors._parse_datetime_cached.cache_clear()
+    assert extractors.normalize_dt(extractors.parse_datetime_pt("ontem às 14h", REF)) == "2024-08-09 14:00"
+    assert extractors.normalize_dt(extractors.parse_datetime_pt("anteontem 09:30", REF)) == "2024-08-08 09:30"
+    assert extractors.normalize_dt(extractors.parse_datetime_pt("hoje", REF)) == "2024-08-10 10:00"
+
+
+def test_fallback_resolves_explicit_dates_and_month_names():
+    from src.extractors import fallback_extract
+
+    assert fallback_extract("Em 12/08/2024 às 10:30 houve queda de energia.", REF)["data_ocorrencia"] == "2024-08-12 10:30"
+    assert fallback_extract("Em 5 de agosto às 9h45 houve pane elétrica.", REF)["data_ocorrencia"] == "2024-08-05 09:45"
+    assert fallback_extract("Anteontem houve falha geral.", REF)["data_ocorrencia"] == "2024-08-08 10:00"
+
+
+def test_incident_types_pick_highest_priority_regardless_of_accents():
+    from src.incident_types import build_incident_type_index
+
+    index = build_incident_type_index()
+    assert index.match("Houve falha no servidor principal") == "Falha no servidor"
+    assert index.match("Houve INDISPONIBILIDADE após o INCENDIO no prédio") == "Incêndio"
+    assert index.match("Detectamos vazamento de dados de clientes") == "Vazamento de dados"
+    assert index.match("Usuários receberam erro 503 no portal") == "Erro de aplicação"
+    assert index.match("Reunião de rotina sem ocorrências") is None
+
+
+def test_incident_types_load_custom_taxonomy(tmp_path):
+    import json
+    from src.incident_types import build_incident_type_index
+
+    path = tmp_path / "tipos.json"
+    path.write_text(json.dumps({"tipos": [
+        {"tipo": "Falha de catraca", "prioridade": 10, "sinonimos": ["catraca travada"]},
+        {"tipo": "Falha de elevador", "prioridade": 20, "sinonimos": ["elevador parado"], "padroes": [r"\belevador \d+ parou\b"]},
+    ]}), encoding="utf-8")
+    index = build_incident_type_index(str(path))
+    assert index.match("A catraca travada e o elevador 3 parou") == "Falha de elevador"
+    assert index.match("Catraca travada na portaria") == "Falha de catraca"
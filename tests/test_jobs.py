@@ -0,0 +1,135 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+from fastapi.testclient import TestClient
+
+from src import jobs, main, pipeline
+from src.main import app
+from src.models import JobItem
+from src.pipeline import ExtractionOutcome
+
+REF = "2024-08-10T10:00:00-03:00"
+
+
+async def _no_llm(*args, **kwargs):
+    return None
+
+
+def _wait_completed(client, job_id, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        body = client.get(f"/jobs/{job_id}", params={"limit": 0}).json()
+        if body["status"] == "completed":
+            return body
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} não terminou: {body}")
+
+
+def test_jobs_accept_ndjson_and_serve_paginated_results(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_DB_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(pipeline, "extract_with_llm", _no_llm)
+    lines = [
+        json.dumps({"id": f"inc-{i}", "texto": f"Ontem às 14h houve queda de energia em Recife. Caso {i}.",
+                    "referencia_datahora": REF})
+        for i in range(12)
+    ]
+    with TestClient(app) as client:
+        r = client.post("/jobs", content="\n".join(lines), headers={"Content-Type": "application/x-ndjson"})
+        assert r.status_code == 202
+        job_id = r.json()["id"]
+        assert r.headers["Location"] == f"/jobs/{job_id}"
+
+        body = _wait_completed(client, job_id)
+        assert (body["total"], body["done"], body["failed"]) == (12, 12, 0)
+
+        page = client.get(f"/jobs/{job_id}", params={"offset": 5, "limit": 5}).json()
+        assert [item["index"] for item in page["results"]] == [5, 6, 7, 8, 9]
+        assert page["results"][0]["id"] == "inc-5"
+        assert page["results"][0]["result"]["data_ocorrencia"] == "2024-08-09 14:00"
+        assert page["next_offset"] == 10
+
+        streamed = client.get(f"/jobs/{job_id}/results").text.splitlines()
+        assert [json.loads(line)["index"] for line in streamed] == list(range(12))
+
+        assert client.post("/jobs", content='{"texto": "ok"}\n{quebrado', headers={"Content-Type": "application/x-ndjson"}).status_code == 422
+        assert client.post("/jobs", json={"items": []}).status_code == 422
+        monkeypatch.setattr(main, "JOBS_MAX_ITEMS", 5)
+        assert client.post("/jobs", content="\n".join(lines), headers={"Content-Type": "application/x-ndjson"}).status_code == 413
+        assert client.post("/jobs", json={"items": [{"texto": "x"}] * 6}).status_code == 413
+        assert client.get("/jobs/inexistente").status_code == 404
+
+
+def test_job_store_requeues_expired_leases_and_gives_up_after_max_attempts(tmp_path):
+    store = jobs.JobStore(str(tmp_path / "jobs.sqlite3"))
+    job = store.create_job([JobItem(texto="Houve falha no servidor")])
+
+    rowid, texto, _ = store.claim(lease_seconds=-1, max_attempts=2)  # lease já vencido: simula worker morto
+    assert texto == "Houve falha no servidor"
+    assert store.claim(lease_seconds=60, max_attempts=2)[0] == rowid
+    assert store.claim(lease_seconds=60, max_attempts=2) is None
+
+    store.complete(rowid, {"tipo_incidente": "Falha de servidor"})
+    assert jobs.job_status(store.get_job(job["id"])) == "completed"
+
+    other = store.create_job([JobItem(texto="Houve incêndio")])
+    store.claim(lease_seconds=-1, max_attempts=1)
+    assert store.claim(lease_seconds=60, max_attempts=1) is None
+    assert store.results(other["id"])[0]["error"] == "Tentativas esgotadas"
+    store.close()
+
+
+def test_worker_survives_queue_errors(tmp_path, monkeypatch):
+    store = jobs.JobStore(str(tmp_path / "jobs.sqlite3"))
+    job = store.create_job([JobItem(texto="Houve falha no servidor")])
+    claim, calls = store.claim, []
+
+    def flaky_claim(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return claim(*args)
+
+    async def fake_run(texto, referencia, patient=False):
+        return ExtractionOutcome({"tipo_incidente": "Falha de servidor"}, has_llm=True)
+
+    monkeypatch.setattr(store, "claim", flaky_claim)
+    monkeypatch.setattr(jobs, "run_extraction", fake_run)
+    monkeypatch.setattr(jobs, "JOBS_POLL_INTERVAL", 0.01)
+
+    async def run():
+        workers = jobs.JobWorkers(store, concurrency=1)
+        workers.start()
+        for _ in range(200):
+            if jobs.job_status(store.get_job(job["id"])) == "completed":
+                break
+            await asyncio.sleep(0.01)
+        await workers.stop()
+
+    asyncio.run(run())
+    assert store.results(job["id"])[0]["result"] == {"tipo_incidente": "Falha de servidor"}
+    store.close()
+
+
+def test_lease_is_renewed_while_item_waits(tmp_path, monkeypatch):
+    store = jobs.JobStore(str(tmp_path / "jobs.sqlite3"))
+    job = store.create_job([JobItem(texto="Houve falha no servidor")])
+    monkeypatch.setattr(jobs, "JOBS_LEASE_SECONDS", 0.06)
+    reclaimed = []
+
+    async def slow_run(texto, referencia, patient=False):
+        await asyncio.sleep(0.3)  # esperando vaga no LLM por bem mais que o lease
+        reclaimed.append(await asyncio.to_thread(store.claim, 0.06, 3))
+        return ExtractionOutcome({"tipo_incidente": "Falha de servidor"}, has_llm=True)
+
+    monkeypatch.setattr(jobs, "run_extraction", slow_run)
+
+    async def run():
+        rowid, texto, referencia = store.claim(jobs.JOBS_LEASE_SECONDS, 3)
+        await jobs.JobWorkers(store)._process(rowid, texto, referencia)
+
+    asyncio.run(run())
+    assert reclaimed == [None]
+    assert jobs.job_status(store.get_job(job["id"])) == "completed"
+    store.close()
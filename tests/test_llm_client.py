@@ -0,0 +1,309 @@
+import asyncio
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+from src import llm_client, pipeline
+from src.backends import BackendPool, parse_backends
+from src.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from src.main import app
+from src.schema import INCIDENT_SCHEMA
+
+REF = "2024-08-10T10:00:00-03:00"
+
+
+def test_shared_client_is_reused_and_closed_by_app_lifespan():
+    async def twice():
+        pair = llm_client.get_client(), llm_client.get_client()
+        await llm_client.close_client()
+        return pair
+
+    first, second = asyncio.run(twice())
+    assert first is second
+
+    with TestClient(app) as client:
+        # Chamadas no loop do app reutilizam o cliente aberto pelo lifespan.
+        shared = client.portal.call(llm_client.get_client)
+        assert client.portal.call(llm_client.get_client) is shared
+        assert not shared.is_closed
+    assert shared.is_closed
+
+
+def test_identical_concurrent_calls_share_one_llm_request(monkeypatch):
+    calls = []
+
+    async def fake_extract(texto, ref):
+        calls.append((texto, ref))
+        await asyncio.sleep(0.05)
+        return {"local": "Recife (PE)"}
+
+    monkeypatch.setattr(llm_client, "_extract_uncoalesced", fake_extract)
+
+    async def run():
+        return await asyncio.gather(
+            *[llm_client.extract_with_llm("queda de energia em Recife", REF) for _ in range(5)],
+            llm_client.extract_with_llm("outro texto", REF),
+        )
+
+    results = asyncio.run(run())
+    assert len(calls) == 2
+    assert all(r == {"local": "Recife (PE)"} for r in results)
+    assert llm_client._inflight == {}
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call(monkeypatch):
+    async def fake_extract(texto, ref):
+        await asyncio.sleep(0.05)
+        return {"local": "Recife (PE)"}
+
+    monkeypatch.setattr(llm_client, "_extract_uncoalesced", fake_extract)
+
+    async def run():
+        impatient = asyncio.create_task(llm_client.extract_with_llm("texto", REF))
+        patient = asyncio.create_task(llm_client.extract_with_llm("texto", REF))
+        await asyncio.sleep(0.01)
+        impatient.cancel()
+        return await patient
+
+    assert asyncio.run(run()) == {"local": "Recife (PE)"}
+
+
+def test_circuit_breaker_opens_and_recovers_through_half_open_probe():
+    now = [0.0]
+    breaker = CircuitBreaker("test", window=4, min_calls=2, failure_rate=0.5, open_seconds=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+    now[0] = 11.0
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()  # apenas uma sondagem por vez
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker("slow", window=2, min_calls=2, slow_call_seconds=1.0)
+    breaker.record_success(5.0)
+    breaker.record_success(5.0)
+    assert breaker.state == OPEN
+
+
+def _mock_client(monkeypatch, handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(llm_client, "get_client", lambda: client)
+    monkeypatch.setattr(llm_client, "llm_breaker", None)
+    return client
+
+
+def test_streaming_stops_as_soon_as_json_object_closes(monkeypatch):
+    pieces = ['{"data_ocorrencia": "", "local": "Re', 'cife {PE}", "tipo_incidente": "Queda",', ' "impacto": "\\"}\\""}', " Obs: texto extra", " que nunca acaba"]
+    sent = []
+
+    async def lines():
+        for piece in pieces:
+            sent.append(piece)
+            yield (json.dumps({"message": {"content": piece}, "done": False}) + "\n").encode()
+
+    def handler(request):
+        body = json.loads(request.content)
+        assert body["stream"] is True and body["options"]["num_predict"] > 0
+        return httpx.Response(200, content=lines())
+
+    _mock_client(monkeypatch, handler)
+    monkeypatch.setattr(llm_client, "OLLAMA_STREAM", True)
+    result = asyncio.run(llm_client._extract_uncoalesced("texto", REF))
+    assert result == {"data_ocorrencia": "", "local": "Recife {PE}", "tipo_incidente": "Queda", "impacto": '"}"'}
+    assert len(sent) == 3
+
+
+def test_compact_prompt_with_schema_format_keeps_stable_prefix(monkeypatch):
+    monkeypatch.setattr(llm_client, "OLLAMA_PROMPT_STYLE", "compact")
+    monkeypatch.setattr(llm_client, "OLLAMA_FORMAT", "schema")
+    first = llm_client._build_payload("queda de energia", REF)
+    second = llm_client._build_payload("falha no servidor", "2024-08-11T10:00:00-03:00")
+    assert first["format"] == INCIDENT_SCHEMA
+    assert first["messages"][0] == second["messages"][0]
+    assert first["messages"][1]["content"].endswith("queda de energia")
+
+
+def test_micro_batcher_sends_one_generation_and_retries_invalid_items(monkeypatch):
+    item = {"data_ocorrencia": "", "local": "Recife (PE)", "tipo_incidente": "Queda de energia", "impacto": ""}
+    requests = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        requests.append(body)
+        if body["messages"][0]["content"] == llm_client.SYS_PROMPT_BATCH:
+            content = {"resultados": [item, {"local": "sem as outras chaves"}, item]}
+        else:
+            content = dict(item, local="Refeito")
+        return httpx.Response(200, json={"message": {"content": json.dumps(content)}})
+
+    _mock_client(monkeypatch, handler)
+    monkeypatch.setattr(llm_client, "LLM_BATCH_ENABLED", True)
+    monkeypatch.setattr(llm_client, "_batcher", None)
+
+    async def run():
+        return await asyncio.gather(*(llm_client.extract_with_llm(f"texto {i}", REF) for i in range(3)))
+
+    results = asyncio.run(run())
+    assert len(requests) == 2  # um lote + um refeito individualmente
+    assert [r["local"] for r in results] == ["Recife (PE)", "Refeito", "Recife (PE)"]
+
+
+def test_backend_pool_routes_to_least_loaded_healthy_backend():
+    backends = parse_backends("http://a:11434;weight=2, http://b:11434;model=tinyllama", "http://x", "llama3.2")
+    assert [(b.url, b.model, b.weight) for b in backends] == [
+        ("http://a:11434", "llama3.2", 2.0),
+        ("http://b:11434", "tinyllama", 1.0),
+    ]
+    pool = BackendPool(backends, eject_after=1)
+    a, b = backends
+    pool.acquire(a)
+    assert pool.choose() is a  # peso 2: (1+1)/2 == (0+1)/1, empate fica com o primeiro
+    pool.acquire(a)
+    assert pool.choose() is b
+
+    started = pool.acquire(b)
+    pool.release(b, started, ok=False)
+    assert not b.healthy
+    assert pool.choose() is a
+    assert pool.choose(exclude=[a]) is b  # ejetado, mas é o único restante
+
+
+def _two_backend_pool(monkeypatch):
+    pool = BackendPool(parse_backends("http://lento:11434,http://rapido:11434", "http://x", "llama3.2"))
+    for backend in pool.backends:
+        for _ in range(20):
+            pool.latency.record(backend.key, 0.02)
+    monkeypatch.setattr(llm_client, "backend_pool", pool)
+    return pool
+
+
+def test_timeout_is_derived_from_recent_latency(monkeypatch):
+    pool = _two_backend_pool(monkeypatch)
+    monkeypatch.setattr(llm_client, "LLM_TIMEOUT_MIN", 0.01)
+    assert llm_client.llm_timeout(pool.backends[0]) == 0.02 * llm_client.LLM_TIMEOUT_MULTIPLIER
+    pool.latency.record(pool.backends[0].key, 60.0)
+    assert llm_client.llm_timeout(pool.backends[0]) == llm_client.LLM_TIMEOUT_MAX
+
+
+def test_hedged_request_goes_to_second_backend_when_first_is_slow(monkeypatch):
+    _two_backend_pool(monkeypatch)
+    monkeypatch.setattr(llm_client, "LLM_HEDGE_ENABLED", True)
+    hosts = []
+
+    async def handler(request):
+        hosts.append(request.url.host)
+        if request.url.host == "lento":
+            await asyncio.sleep(1.0)
+        content = {"data_ocorrencia": "", "local": request.url.host, "tipo_incidente": "", "impacto": ""}
+        return httpx.Response(200, json={"message": {"content": json.dumps(content)}})
+
+    _mock_client(monkeypatch, handler)
+    result = asyncio.run(llm_client._extract_single("texto", REF))
+    assert hosts == ["lento", "rapido"]
+    assert result["local"] == "rapido"
+
+
+def test_batch_call_scales_timeout_and_stays_out_of_latency_window(monkeypatch):
+    pool = _two_backend_pool(monkeypatch)
+    monkeypatch.setattr(llm_client, "LLM_TIMEOUT_MIN", 0.01)  # timeout individual: 0.06s
+
+    async def handler(request):
+        await asyncio.sleep(0.1)
+        return httpx.Response(200, json={"message": {"content": "{}"}})
+
+    _mock_client(monkeypatch, handler)
+    breaker = CircuitBreaker("teste", min_calls=1, slow_call_seconds=0.05)
+    monkeypatch.setattr(llm_client, "llm_breaker", breaker)
+
+    payload = llm_client._build_batch_payload([("a", REF), ("b", REF), ("c", REF)])
+    assert asyncio.run(llm_client._call_llm(payload, batch_size=3)) is not None
+    assert breaker.state == "closed"  # 0.1s para 3 itens não é chamada lenta
+    assert [pool.latency.count(b.key) for b in pool.backends] == [20, 20]
+
+    assert asyncio.run(llm_client._call_llm(llm_client._build_payload("a", REF))) is None
+    assert breaker.state == "open"
+
+
+def test_cancelled_slow_call_counts_as_breaker_failure(monkeypatch):
+    async def handler(request):
+        await asyncio.sleep(1.0)  # Ollama travado
+        return httpx.Response(200, json={"message": {"content": "{}"}})
+
+    _mock_client(monkeypatch, handler)
+    breaker = CircuitBreaker("teste", min_calls=2, slow_call_seconds=0.05)
+    monkeypatch.setattr(llm_client, "llm_breaker", breaker)
+
+    async def call(deadline):
+        try:
+            await asyncio.wait_for(llm_client._call_llm(llm_client._build_payload("a", REF)), deadline)
+        except asyncio.TimeoutError:
+            pass
+
+    asyncio.run(call(0.01))  # cancelada antes do limite: não conta
+    asyncio.run(call(0.01))
+    assert breaker.state == "closed"
+    asyncio.run(call(0.1))
+    asyncio.run(call(0.1))
+    assert breaker.state == "open"
+
+
+def test_batch_slower_than_single_call_timeout_still_returns_results(monkeypatch):
+    _two_backend_pool(monkeypatch)
+    monkeypatch.setattr(llm_client, "LLM_TIMEOUT_MIN", 0.01)  # timeout individual: 0.06s
+    monkeypatch.setattr(llm_client, "LLM_BATCH_ENABLED", True)
+    monkeypatch.setattr(llm_client, "_batcher", None)
+    monkeypatch.setattr(pipeline, "_LLM_WAIT_MARGIN", 0.0)
+    monkeypatch.setattr(pipeline, "get_extraction_cache", lambda: None)
+    item = {"data_ocorrencia": "", "local": "Data center Norte", "tipo_incidente": "", "impacto": ""}
+
+    async def handler(request):
+        await asyncio.sleep(0.1)
+        return httpx.Response(200, json={"message": {"content": json.dumps({"resultados": [item, item]})}})
+
+    _mock_client(monkeypatch, handler)
+
+    async def run():
+        return await asyncio.gather(
+            pipeline.run_extraction("Houve uma pane ontem.", REF),
+            pipeline.run_extraction("Houve outra pane hoje.", REF),
+        )
+
+    outcomes = asyncio.run(run())
+    assert all(o.has_llm and o.payload["local"] == "Data center Norte" for o in outcomes)
+
+
+def test_batch_generation_is_cancelled_when_every_waiter_gives_up(monkeypatch):
+    cancelled = []
+
+    async def handler(request):
+        try:
+            await asyncio.sleep(1.0)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return httpx.Response(200, json={"message": {"content": "{}"}})
+
+    _mock_client(monkeypatch, handler)
+    monkeypatch.setattr(llm_client, "LLM_BATCH_ENABLED", True)
+    monkeypatch.setattr(llm_client, "_batcher", None)
+
+    tasks = []
+
+    async def run():
+        tasks.extend(asyncio.ensure_future(llm_client.extract_with_llm(f"texto {i}", REF)) for i in range(2))
+        await asyncio.sleep(0.1)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        return list(cancelled)  # antes do encerramento do loop, que cancela o que sobrar
+
+    assert asyncio.run(run()) == [True]
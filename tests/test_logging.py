@@ -0,0 +1,46 @@
+import io
+import json
+import logging
+import logging.handlers
+import queue
+
+from src.logging_utils import JSONFormatter, _DeferredQueueHandler
+
+
+def _record(**extra):
+    record = logging.LogRecord("incidente_llm_api", logging.INFO, __file__, 1, "evento %s", ("x",), None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_keeps_only_extra_fields():
+    out = json.loads(JSONFormatter().format(_record(path="/extract", status=200)))
+    assert out["message"] == "evento x"
+    assert out["path"] == "/extract" and out["status"] == 200
+    assert not {"args", "msg", "lineno", "taskName", "thread"} & out.keys()
+
+
+def test_json_formatter_tolerates_non_serializable_extra():
+    out = json.loads(JSONFormatter().format(_record(obj=object())))
+    assert out["obj"].startswith("<object")
+
+
+def test_queue_handler_formats_on_listener_thread():
+    stream = io.StringIO()
+    target = logging.StreamHandler(stream)
+    target.setFormatter(JSONFormatter())
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, target)
+
+    logger = logging.getLogger("test_queue_handler")
+    logger.propagate = False
+    logger.addHandler(_DeferredQueueHandler(log_queue))
+    listener.start()
+    try:
+        logger.warning("evento %s", "assíncrono", extra={"cached": True})
+    finally:
+        listener.stop()
+
+    out = json.loads(stream.getvalue())
+    assert out["message"] == "evento assíncrono"
+    assert out["cached"] is True
@@ -0,0 +1,120 @@
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Um "worker": define as métricas e atualiza com os valores recebidos na linha de comando.
+WORKER = """
+import os, sys
+from prometheus_client import Counter, Gauge, Histogram
+jobs, active, wait = (float(v) for v in sys.argv[1:])
+Counter("app_jobs_total", "Jobs", labelnames=("kind",)).labels("a").inc(jobs)
+Gauge("app_active", "Ativos", multiprocess_mode="livesum").set(active)
+Histogram("app_wait_seconds", "Espera", buckets=(1.0,)).observe(wait)
+print(os.getpid())
+"""
+
+
+def test_exposition_format_for_counter_and_histogram():
+    registry = CollectorRegistry()
+    requests = Counter("app_requests_total", "Requisições", labelnames=("path",), registry=registry)
+    latency = Histogram("app_latency_seconds", "Latência", buckets=(0.1, 1.0), registry=registry)
+    requests.labels("/extract").inc()
+    requests.labels(path="/extract").inc(2)
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(3)
+
+    text = generate_latest(registry).decode()
+    assert 'app_requests_total{path="/extract"} 3.0' in text
+    assert 'app_latency_seconds_bucket{le="0.1"} 1.0' in text
+    assert 'app_latency_seconds_bucket{le="1.0"} 2.0' in text
+    assert 'app_latency_seconds_bucket{le="+Inf"} 3.0' in text
+    assert "app_latency_seconds_count 3.0" in text
+    assert "app_latency_seconds_sum 3.55" in text
+
+
+def test_counter_is_thread_safe():
+    registry = CollectorRegistry()
+    counter = Counter("app_hits_total", "Hits", registry=registry)
+
+    def bump(_):
+        for _ in range(1000):
+            counter.inc()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(bump, range(8)))
+    assert "app_hits_total 8000.0" in generate_latest(registry).decode()
+
+
+def test_multiprocess_collector_aggregates_workers(tmp_path):
+    pythonpath = os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path), PYTHONPATH=pythonpath)
+
+    def worker(*values):
+        out = subprocess.run([sys.executable, "-c", WORKER, *map(str, values)], env=env, check=True,
+                             capture_output=True, text=True)
+        return int(out.stdout)
+
+    first = worker(1, 2, 0.5)
+    worker(4, 3, 2.0)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=str(tmp_path))
+    text = generate_latest(registry).decode()
+    assert 'app_jobs_total{kind="a"} 5.0' in text
+    assert "app_active 5.0" in text
+    assert 'app_wait_seconds_bucket{le="1.0"} 1.0' in text
+    assert "app_wait_seconds_count 2.0" in text
+
+    # Worker encerrado: sai dos gauges "live*", mas os contadores não regridem.
+    multiprocess.mark_process_dead(first, str(tmp_path))
+    text = generate_latest(registry).decode()
+    assert "app_active 3.0" in text
+    assert 'app_jobs_total{kind="a"} 5.0' in text
+
+
+# Atualiza métricas num laço com `open`/`os.replace` espionados na thread principal.
+HOT_PATH = """
+import builtins, io, os, threading
+from prometheus_client import Counter, Histogram
+hits = Counter("app_hot_total", "Hits", labelnames=("kind",)).labels("a")
+wait = Histogram("app_hot_seconds", "Espera", buckets=(1.0,))
+hits.inc()
+wait.observe(0.5)
+
+main, calls = threading.get_ident(), []
+def spy(real):
+    def wrapper(*args, **kwargs):
+        if threading.get_ident() == main:
+            calls.append(args[0])
+        return real(*args, **kwargs)
+    return wrapper
+real_open, real_replace = builtins.open, os.replace
+builtins.open = io.open = spy(real_open)
+os.replace = spy(real_replace)
+for _ in range(1000):
+    hits.inc()
+    wait.observe(0.5)
+builtins.open = io.open = real_open
+os.replace = real_replace
+print(len(calls))
+"""
+
+
+def test_multiprocess_updates_do_no_file_io(tmp_path):
+    pythonpath = os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path), PYTHONPATH=pythonpath)
+    out = subprocess.run([sys.executable, "-c", HOT_PATH], env=env, check=True, capture_output=True, text=True)
+    assert out.stdout.strip() == "0"
+
+    # Os valores chegam ao diretório mesmo assim (na saída do processo, no mínimo).
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=str(tmp_path))
+    text = generate_latest(registry).decode()
+    assert 'app_hot_total{kind="a"} 1001.0' in text
+    assert "app_hot_seconds_count 1001.0" in text
@@ -0,0 +1,204 @@
+import asyncio
+import threading
+import time
+
+from src import pipeline
+
+REF = "2024-08-10T10:00:00-03:00"
+TEXTO_COMPLETO = (
+    "Ontem às 14h, no escritório de São Paulo, houve uma falha no servidor principal que "
+    "afetou o sistema de faturamento por 2 horas."
+)
+
+
+def _fake_llm(calls, result):
+    async def fake(texto, referencia=None):
+        calls.append(texto)
+        return result
+
+    return fake
+
+
+def test_rules_first_skips_llm_when_all_fields_are_confident(monkeypatch):
+    calls = []
+    monkeypatch.setattr(pipeline, "EXTRACT_ROUTING", "rules_first")
+    monkeypatch.setattr(pipeline, "extract_with_llm", _fake_llm(calls, {"local": "Outro"}))
+
+    outcome = asyncio.run(pipeline.run_extraction(TEXTO_COMPLETO, REF))
+    assert calls == []
+    assert not outcome.has_llm
+    assert outcome.payload["local"] == "São Paulo (SP)"
+    assert outcome.payload["data_ocorrencia"] == "2024-08-09 14:00"
+
+
+def test_rules_first_uses_llm_only_for_uncertain_fields(monkeypatch):
+    calls = []
+    llm = {"data_ocorrencia": "2000-01-01 00:00", "local": "Data center Norte", "tipo_incidente": "x", "impacto": "y"}
+    monkeypatch.setattr(pipeline, "EXTRACT_ROUTING", "rules_first")
+    monkeypatch.setattr(pipeline, "extract_with_llm", _fake_llm(calls, llm))
+    monkeypatch.setattr(pipeline, "get_extraction_cache", lambda: None)
+
+    texto = "Ontem às 14h houve falha no servidor principal que impactou clientes corporativos."
+    outcome = asyncio.run(pipeline.run_extraction(texto, REF))
+    assert len(calls) == 1
+    # local veio de uma palavra capitalizada qualquer ("Ontem"): vale o LLM
+    assert outcome.payload["local"] == "Data center Norte"
+    # campos confiáveis das regras prevalecem sobre o LLM
+    assert outcome.payload["data_ocorrencia"] == "2024-08-09 14:00"
+    assert outcome.payload["tipo_incidente"] == "Falha no servidor"
+
+
+def test_llm_json_that_is_not_an_object_falls_back_to_rules(monkeypatch):
+    monkeypatch.setattr(pipeline, "get_extraction_cache", lambda: None)
+    for routing in ("rules_first", "parallel"):
+        calls = []
+        monkeypatch.setattr(pipeline, "EXTRACT_ROUTING", routing)
+        monkeypatch.setattr(pipeline, "extract_with_llm", _fake_llm(calls, [{"local": "Lista"}]))
+
+        texto = "Ontem às 14h houve falha no servidor principal que impactou clientes corporativos."
+        outcome = asyncio.run(pipeline.run_extraction(texto, REF))
+        assert len(calls) == 1
+        assert not outcome.has_llm
+        assert outcome.payload["tipo_incidente"] == "Falha no servidor"
+
+
+def test_admission_sheds_when_queue_is_full_or_deadline_passes():
+    import time
+
+    import pytest
+
+    from src.admission import AdmissionController, Overloaded
+
+    async def run():
+        controller = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=1.0)
+        liberar = asyncio.Event()
+
+        async def ocupa():
+            async with controller.slot():
+                await liberar.wait()
+
+        dono = asyncio.create_task(ocupa())
+        await asyncio.sleep(0)
+        na_fila = asyncio.create_task(ocupa())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as cheio:
+            async with controller.slot():
+                pass
+        assert cheio.value.reason == "queue_full"
+        with pytest.raises(Overloaded) as prazo:
+            async with controller.slot(deadline=time.monotonic() - 1):
+                pass
+        assert prazo.value.reason == "deadline"
+
+        # Trabalho de fundo espera fora do limite da fila e sem prazo.
+        async def paciente():
+            async with controller.slot(deadline=time.monotonic() - 1, patient=True):
+                return True
+
+        fundo = asyncio.create_task(paciente())
+        await asyncio.sleep(0)
+        assert not fundo.done()
+        liberar.set()
+        await asyncio.gather(dono, na_fila)
+        assert await fundo
+
+    asyncio.run(run())
+
+
+def test_overloaded_request_falls_back_to_rules_or_gets_503(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from src.admission import Overloaded
+    from src.main import app
+
+    class Lotado:
+        def slot(self, deadline=None, patient=False):
+            raise Overloaded("queue_full")
+
+    calls = []
+    monkeypatch.setattr(pipeline, "get_admission_controller", lambda: Lotado())
+    monkeypatch.setattr(pipeline, "extract_with_llm", _fake_llm(calls, {}))
+    client = TestClient(app)
+    body = {"texto": TEXTO_COMPLETO, "referencia_datahora": REF}
+
+    r = client.post("/extract", json=body)
+    assert r.status_code == 200 and r.json()["local"] == "São Paulo (SP)"
+
+    monkeypatch.setattr(pipeline, "OVERLOAD_POLICY", "reject")
+    r = client.post("/extract", json=body, headers={"X-Request-Deadline-Ms": "50"})
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "1"
+    assert calls == []
+
+
+def test_long_reports_send_only_the_relevance_window_to_the_llm(monkeypatch):
+    calls = []
+    monkeypatch.setattr(pipeline, "extract_with_llm", _fake_llm(calls, None))
+    monkeypatch.setattr(pipeline, "get_extraction_cache", lambda: None)
+    monkeypatch.setattr(pipeline, "LLM_INPUT_TOKEN_BUDGET", 64)
+
+    filler = "A equipe revisou o histórico de mudanças e discutiu melhorias de processo na retrospectiva. " * 20
+    outcome = asyncio.run(pipeline.run_extraction(filler + TEXTO_COMPLETO + " " + filler, REF))
+
+    assert calls == [TEXTO_COMPLETO]
+    assert outcome.payload["local"] == "São Paulo (SP)"
+
+
+def test_relevance_window_keeps_order_and_fills_the_budget():
+    from src.relevance import estimate_tokens, select_relevant
+
+    texto = (
+        "Ontem às 22h o monitoramento disparou alertas. " + "Reunião de alinhamento sem novidades. " * 30
+        + "Houve queda de energia em Recife que afetou o call center."
+    )
+    trecho = select_relevant(texto, 48)
+    assert trecho == "Ontem às 22h o monitoramento disparou alertas. Houve queda de energia em Recife que afetou o call center."
+    assert estimate_tokens(trecho) <= 48
+    assert select_relevant("Texto curto.", 48) == "Texto curto."
+
+
+def test_parallel_route_overlaps_llm_with_rules_off_the_event_loop(monkeypatch):
+    events = []
+    fallback_extract = pipeline.fallback_extract
+
+    def slow_rules(texto, referencia):
+        events.append(("rules_start", time.perf_counter(), threading.get_ident()))
+        time.sleep(0.2)
+        events.append(("rules_end", time.perf_counter(), threading.get_ident()))
+        return fallback_extract(texto, referencia)
+
+    async def slow_llm(texto, referencia=None):
+        events.append(("llm_start", time.perf_counter(), threading.get_ident()))
+        await asyncio.sleep(0.2)
+        return None
+
+    monkeypatch.setattr(pipeline, "EXTRACT_ROUTING", "parallel")
+    monkeypatch.setattr(pipeline, "fallback_extract", slow_rules)
+    monkeypatch.setattr(pipeline, "extract_with_llm", slow_llm)
+    monkeypatch.setattr(pipeline, "get_extraction_cache", lambda: None)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        outcome = await pipeline.run_extraction(TEXTO_COMPLETO, REF)
+        elapsed = time.perf_counter() - started
+        task.cancel()
+        return outcome, elapsed, ticks, threading.get_ident()
+
+    outcome, elapsed, ticks, loop_thread = asyncio.run(run())
+    when = {name: (t, thread) for name, t, thread in events}
+    # O LLM começa enquanto as regras ainda rodam: os dois tempos se sobrepõem.
+    assert when["llm_start"][0] < when["rules_end"][0]
+    assert elapsed < 0.35
+    # As regras rodam numa thread do pool e o event loop segue atendendo outras corrotinas.
+    assert when["rules_start"][1] != loop_thread
+    assert ticks >= 10
+    assert outcome.payload["local"] == "São Paulo (SP)"
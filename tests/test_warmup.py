@@ -0,0 +1,52 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from src import warmup
+from src.main import app
+
+
+def test_readyz_reports_ready_only_after_warmup(monkeypatch):
+    preloaded = []
+
+    async def fake_preload(backend, timeout):
+        preloaded.append(backend.url)
+        return True
+
+    monkeypatch.setattr(warmup, "preload_model", fake_preload)
+    monkeypatch.setattr(warmup, "_ready", False)
+    assert TestClient(app).get("/readyz").status_code == 503
+
+    with TestClient(app) as client:
+        deadline = time.monotonic() + 5
+        while client.get("/readyz").status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        body = client.get("/readyz").json()
+        assert body["ready"] is True
+        assert set(body["stages"]) >= {"localities", "incident_types", "dateparser"}
+        assert preloaded and all(body["llm"].values())
+
+        client.post("/extract", json={"texto": "Hoje houve queda de energia em Recife."})
+        metrics = client.get("/metrics").text
+    assert "incidente_llm_api_startup_seconds " in metrics
+    assert "incidente_llm_api_first_request_seconds " in metrics
+    assert 'incidente_llm_api_warmup_stage_seconds{stage="dateparser"}' in metrics
+
+
+def test_preload_payload_requests_keep_alive(monkeypatch):
+    import asyncio
+    import httpx
+    import json
+    from src import llm_client
+    from src.backends import Backend
+
+    seen = {}
+
+    def handler(request):
+        seen.update(json.loads(request.content))
+        return httpx.Response(200, json={"done": True})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(llm_client, "get_client", lambda: client)
+    assert asyncio.run(llm_client.preload_model(Backend("http://ollama:11434", "llama3.2"), 1.0))
+    assert seen == {"model": "llama3.2", "messages": [], "keep_alive": llm_client.OLLAMA_KEEP_ALIVE}